@@ -0,0 +1,496 @@
+from datetime import datetime
+import time
+import uuid
+from config import Config
+from MessagePipeline import MessagePipeline
+from Tracing import Tracer, NULL_TRACE
+
+class ChatService:
+    """Socket event logic shared by the threading (app.py) and asyncio (async_app.py) servers.
+
+    Handlers take the caller's sid and verified username and send everything
+    through `transport` (Emit, EnterRoom, LeaveRoom, Disconnect), so they do
+    not depend on a request context. They block on SQLite and Fernet; the
+    asyncio server calls them from an executor.
+
+    Sessions, active chats and chat requests live in `state` (MemoryState for
+    one process, SQLiteState shared by several workers), never in this object.
+    Sampled messages are traced by `tracer` from send_message to the emit.
+    """
+
+    def __init__(self, db, state, presence, hot_chats, moderator, fernet, transport=None, worker=None, tracer=None):
+        self.db = db
+        self.tracer = tracer or Tracer()
+        self.state = state
+        self.worker = worker
+        self.presence = presence
+        self.hot_chats = hot_chats
+        self.fernet = fernet
+        self.transport = transport
+        self.pipeline = MessagePipeline(moderator, self.FinishMessage,
+                                        workers=Config.MESSAGE_WORKERS,
+                                        max_pending=Config.MESSAGE_MAX_PENDING,
+                                        max_pending_per_chat=Config.MESSAGE_MAX_PENDING_PER_CHAT)
+
+    def Error(self, sid, message):
+        self.transport.Emit('error', {'message': message}, room=sid)
+
+    def Connect(self, sid, username):
+        # Store user's session data
+        old_sid = self.state.SetSession(username, sid, self.worker)
+
+        # Check if user is already connected
+        if old_sid is not None and old_sid != sid:
+            # Disconnect old session if it exists (on any worker)
+            self.transport.Disconnect(old_sid)
+            print(f"Disconnecting old session for {username}")
+
+        # Clean up any stale chat data for this user (and the other user's side)
+        other_user = self.state.ReleaseChat(username)
+        if other_user is not None:
+            print(f"Cleaning up stale chat data for {username} with {other_user}")
+
+        # Update user status to idle when connecting
+        self.presence.Set(username, 'idle')
+
+        # Join user to their personal room using their socket ID
+        self.transport.EnterRoom(sid, sid)
+
+        print(f"User {username} connected with sid {sid}")
+
+        # Send the full user list to this client only; everyone else gets the presence delta
+        self.RequestUserList(sid)
+
+    def Disconnect(self, sid, username):
+        # Only handle disconnect if this is the current session
+        if self.state.SetDisconnected(username, sid):
+            print(f"User {username} disconnected (sid: {sid})")
+            self._Offline(username)
+        else:
+            print(f"Ignoring disconnect for old session of {username}")
+
+    # Bağlantısı kopan (ya da worker'ı ölen) kullanıcının chat'i kapatılır, durumu offline olur
+    def _Offline(self, username):
+        # Clean up any active chat
+        chat = self.state.GetChat(username)
+        if chat is not None:
+            other_user = chat['other_user']
+
+            # Clean up database
+            self._DeleteChat(username, other_user)
+
+            # Clean up both users' chat data
+            self.state.ReleaseChat(username)
+
+            # Notify other user if they're connected
+            self._EmitToUser(other_user, 'force_close_chat', {
+                'username': username
+            })
+
+        # Update user status to offline (broadcast as a presence delta)
+        self.presence.Set(username, 'offline')
+
+    # Kullanıcı bağlıysa (hangi worker'da olursa olsun) oturumuna gönderir
+    def _EmitToUser(self, username, event, data):
+        session = self.state.GetSession(username)
+        if session is not None and session['connected']:
+            self.transport.Emit(event, data, room=session['sid'])
+            return True
+        return False
+
+    def UpdateStatus(self, sid, username, data):
+        try:
+            # Update user status (broadcast as a presence delta)
+            self.presence.Set(username, data['status'])
+        except Exception as e:
+            self.Error(sid, str(e))
+
+    # İstemci delta versiyonunda boşluk görürse tam listeyi ister
+    def RequestUserList(self, sid):
+        version, users = self.presence.Snapshot()
+        self.transport.Emit('userList', {'users': users, 'version': version}, room=sid)
+
+    def JoinChat(self, sid, username, data):
+        try:
+            other_user = data['other_user']
+
+            # First check if there's an active chat
+            chat = self.state.GetChat(username)
+            if chat is not None and chat['other_user'] == other_user:
+                chat_id = chat['chat_id']
+            else:
+                # If no active chat, check database
+                chat_id = self.db.GetChatID(username, other_user)
+
+                if not chat_id:
+                    # Create new chat if it doesn't exist
+                    chat_id = self.db.NewChat(username, other_user)
+                    self.hot_chats.Start(chat_id)
+
+                # Store in active chats
+                self.state.SetChat(username, chat_id, other_user)
+                if self.state.GetSession(other_user) is not None:
+                    self.state.SetChat(other_user, chat_id, username)
+
+            # Join both users to the chat room
+            self.transport.EnterRoom(sid, str(chat_id))
+
+            # Sadece en yeni sayfa çözülüp gönderilir; eskiler load_older_messages ile gelir
+            self.transport.Emit('chat_started', {
+                'chat_id': str(chat_id),
+                'other_user': other_user,
+                **self.HistoryPage(chat_id)
+            }, room=sid)
+
+        except Exception as e:
+            print(f"Error in join_chat: {str(e)}")
+            self.Error(sid, str(e))
+
+    # Bir sayfa geçmiş: before'dan eski en fazla HISTORY_PAGE_SIZE mesaj, ekranda gösterim sırasıyla (eskiden yeniye).
+    # Önce bellekteki son mesajlara bakılır; kapsanmıyorsa DB'den okunup sadece bu sayfa çözülür.
+    def HistoryPage(self, chat_id, before=None):
+        limit = Config.HISTORY_PAGE_SIZE
+        messages = self.hot_chats.Page(chat_id, before, limit + 1)
+        if messages is None:
+            rows = self.db.GetMessagesPage(chat_id, before, limit + 1)
+            messages = []
+            for seq, sent_at, sender, encoded in reversed(rows):
+                try:
+                    messages.append({
+                        'seq': seq,
+                        'time': sent_at,
+                        'sender': sender,
+                        'message': self.fernet.decrypt(encoded).decode()
+                    })
+                except Exception:
+                    continue
+            if before is None:
+                self.hot_chats.Seed(chat_id, messages, complete=len(rows) <= limit)
+        has_more = len(messages) > limit
+        messages = messages[-limit:]
+        return {
+            'messages': messages,
+            'cursor': messages[0]['seq'] if messages else None,
+            'has_more': has_more
+        }
+
+    def LoadOlderMessages(self, sid, username, data):
+        try:
+            other_user = data['other_user']
+            before = int(data['before'])
+
+            chat_id = self._ChatWith(username, other_user)
+            self.transport.Emit('older_messages', {
+                'chat_id': chat_id,
+                'other_user': other_user,
+                **self.HistoryPage(chat_id, before)
+            }, room=sid)
+
+        except Exception as e:
+            print(f"Error in load_older_messages: {str(e)}")
+            self.Error(sid, str(e))
+
+    def SendMessage(self, sid, username, data):
+        try:
+            trace = self.tracer.Start('send_message', sender=username)
+            other_user = data['other_user']
+            message = data['message']
+            if not isinstance(message, str) or not message.strip():
+                raise Exception("Message must be non-empty text")
+
+            # Get chat ID from active chats
+            chat_id = self._ChatWith(username, other_user)
+            trace.Lap('handler')
+
+            # Moderasyon worker'larda yapılır, handler hemen döner
+            accepted = self.pipeline.Submit(chat_id, message, {
+                'chat_id': chat_id,
+                'sender': username,
+                'sid': sid,
+                'message': message,
+                'trace': trace
+            })
+            if not accepted:
+                self.Error(sid, 'Server is busy, please try again')
+
+        except Exception as e:
+            print(f"Error in send_message: {str(e)}")
+            self.Error(sid, str(e))
+
+    def _ChatWith(self, username, other_user):
+        chat = self.state.GetChat(username)
+        if chat is None or chat['other_user'] != other_user:
+            raise Exception("Chat room not found")
+        return chat['chat_id']
+
+    # Moderasyon bitince (aynı chat içinde gönderim sırasıyla) çağrılır
+    def FinishMessage(self, job, is_bad, error):
+        trace = job.get('trace', NULL_TRACE)
+        try:
+            self._FinishMessage(job, is_bad, error, trace)
+        finally:
+            self.tracer.Finish(trace)
+
+    def _FinishMessage(self, job, is_bad, error, trace):
+        if error is not None:
+            print(f"Error moderating message: {str(error)}")
+            self.Error(job['sid'], 'Message could not be checked')
+            return
+
+        message = job['message']
+        if (is_bad):
+            message = "Bu düşünce spam veya kötü mesaj içeriyor!"
+
+        try:
+            # Encrypt message before storing
+            encrypted_msg = self.fernet.encrypt(message.encode())
+            trace.Lap('encrypt')
+
+            # Store message in database
+            seq = self.db.AddMessage(int(job['chat_id']), job['sender'], encrypted_msg)
+            new_message = {
+                'seq': seq,
+                'sender': job['sender'],
+                'message': message,
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            self.hot_chats.Append(job['chat_id'], new_message)
+            trace.Lap('store')
+
+            # Broadcast to chat room (including sender for confirmation)
+            self.transport.Emit('new_message', new_message, room=str(job['chat_id']))
+            # asyncio sunucusunda Emit sadece kuyruğa ekler; span o süreyi gösterir
+            trace.Lap('emit')
+        except Exception as e:
+            print(f"Error in send_message: {str(e)}")
+            self.Error(job['sid'], str(e))
+
+    def LeaveChat(self, sid, username, data):
+        try:
+            chat_id = data['chat_id']
+
+            # Sadece bu sid'in içinde olduğu chat bırakılabilir
+            chat = self.state.ChatOfSid(sid)
+            if chat is None or chat['chat_id'] != str(chat_id):
+                raise Exception("Chat room not found")
+
+            self.transport.LeaveRoom(sid, str(chat_id))
+            self.db.DeleteChat(int(chat_id))
+            self.hot_chats.Drop(chat_id)
+
+            self.transport.Emit('chat_ended', {'chat_id': chat_id}, room=str(chat_id))
+        except Exception as e:
+            self.Error(sid, str(e))
+
+    def ChatRequest(self, sid, sender_username, data):
+        try:
+            target_username = data['targetUsername']
+
+            # Check if either user is in a chat
+            sender_in_chat = self.state.GetChat(sender_username) is not None
+            target_in_chat = self.state.GetChat(target_username) is not None
+
+            if sender_in_chat or target_in_chat:
+                print(f"Cannot create chat request: User already in chat (sender: {sender_in_chat}, target: {target_in_chat})")
+                self.Error(sid, 'One of the users is already in a chat')
+                return
+
+            # Check if target user is connected
+            target_session = self.state.GetSession(target_username)
+            if target_session is None or not target_session['connected']:
+                self.Error(sid, 'User is not online')
+                return
+
+            # Generate unique request ID
+            request_id = str(uuid.uuid4())
+
+            # Store request data
+            self.state.AddRequest(request_id, sender_username, target_username, time.time() + Config.CHAT_REQUEST_TTL)
+
+            # Get sender user data with default avatar
+            sender_user = self.db.GetUser(sender_username)
+            sender_avatar = sender_user.get('avatar', '/assets/Uzaylı_1.png')
+
+            print(f"Sending chat request: {sender_username} -> {target_username}")
+
+            # Send request to target user's room using their socket ID
+            self.transport.Emit('chat_request_received', {
+                'requestId': request_id,
+                'senderUsername': sender_username,
+                'senderAvatar': sender_avatar
+            }, room=target_session['sid'])
+
+        except Exception as e:
+            print(f"Chat request error: {str(e)}")
+            self.Error(sid, str(e))
+
+    def ChatRequestResponse(self, sid, responder_username, data):
+        try:
+            request_id = data['requestId']
+            accepted = data['accepted']
+
+            # Get request data; only the target can take it, and only once (even across workers)
+            request_data = self.state.TakeRequest(request_id, responder_username)
+            if not request_data:
+                print(f"Warning: Request {request_id} not found for responder {responder_username}")
+                return
+            sender_username = request_data['sender']
+
+            # Get responder user data with default avatar
+            responder_user = self.db.GetUser(responder_username)
+            responder_avatar = responder_user.get('avatar', '/assets/Uzaylı_1.png')
+
+            # Get sender user data with default avatar
+            sender_user = self.db.GetUser(sender_username)
+            sender_avatar = sender_user.get('avatar', '/assets/Uzaylı_1.png')
+
+            if accepted:
+                # Create chat in database first
+                chat_id = self.db.NewChat(sender_username, responder_username)
+
+                # "Zihin meşgul" kilidi: iki kullanıcı da hâlâ boştaysa ikisi birden alınır
+                if not self.state.ClaimChat(sender_username, responder_username, chat_id):
+                    self.db.DeleteChat(chat_id)
+                    print(f"Chat request failed, a user is already in a chat: {sender_username} -> {responder_username}")
+                    self.Error(sid, 'One of the users is already in a chat')
+                    accepted = False
+                else:
+                    print(f"Chat request accepted: {sender_username} -> {responder_username}")
+                    self.hot_chats.Start(chat_id)
+
+                    # Update both users' status to busy
+                    self.presence.Set(sender_username, 'busy')
+                    self.presence.Set(responder_username, 'busy')
+
+                    # Join both users to the chat room (their sockets may be on other workers)
+                    sender_session = self.state.GetSession(sender_username)
+                    if sender_session is not None:
+                        self.transport.EnterRoom(sender_session['sid'], str(chat_id))
+                    self.transport.EnterRoom(sid, str(chat_id))
+
+                    # Send response to sender's room
+                    self._EmitToUser(sender_username, 'chat_request_response', {
+                        'accepted': True,
+                        'targetUsername': responder_username,
+                        'targetAvatar': responder_avatar,
+                        'chatId': chat_id
+                    })
+
+                    # Send chat window open event to responder
+                    self.transport.Emit('open_chat_window', {
+                        'username': sender_username,
+                        'avatar': sender_avatar,
+                        'chatId': chat_id
+                    }, room=sid)
+
+                    print(f"Chat room {chat_id} created for {sender_username} and {responder_username}")
+
+            if not accepted:
+                print(f"Chat request rejected: {sender_username} -> {responder_username}")
+                # Send rejection response to sender's room
+                self._EmitToUser(sender_username, 'chat_request_response', {
+                    'accepted': False,
+                    'targetUsername': responder_username,
+                    'targetAvatar': responder_avatar
+                })
+
+        except Exception as e:
+            print(f"Error in chat_request_response: {str(e)}")
+            self.Error(sid, str(e))
+
+    def CloseChat(self, sid, current_username, data):
+        try:
+            other_username = data['otherUsername']
+
+            print(f"Closing chat between {current_username} and {other_username}")
+
+            # Get chat ID from active chats
+            chat_data = self.state.GetChat(current_username)
+            if chat_data and chat_data['other_user'] == other_username:
+                chat_id = chat_data['chat_id']
+
+                # Clean up database
+                self._DeleteChat(current_username, other_username)
+
+                # Update both users' status to idle
+                self.presence.Set(current_username, 'idle')
+                self.presence.Set(other_username, 'idle')
+
+                # Remove chat data
+                self.state.ReleaseChat(current_username)
+
+                # Leave chat room
+                self.transport.LeaveRoom(sid, str(chat_id))
+
+                # Notify other user about chat closure
+                self._EmitToUser(other_username, 'force_close_chat', {
+                    'username': current_username
+                })
+
+                print(f"Chat closed successfully between {current_username} and {other_username}")
+            else:
+                print(f"No active chat found between {current_username} and {other_username}")
+
+        except Exception as e:
+            print(f"Error in close_chat: {str(e)}")
+            self.Error(sid, str(e))
+
+    def EndChat(self, sid, current_username, data):
+        try:
+            other_username = data['other_user']
+
+            # Get chat ID
+            chat_id = self.db.GetChatID(current_username, other_username)
+
+            if chat_id:
+                # Delete chat messages and chat entry
+                self.db.DeleteChat(chat_id)
+                self.hot_chats.Drop(chat_id)
+
+                # Leave the chat room
+                self.transport.LeaveRoom(sid, str(chat_id))
+
+                # Update both users' status to idle
+                self.presence.Set(current_username, 'idle')
+                self.presence.Set(other_username, 'idle')
+
+                # Notify other user about chat closure
+                self.transport.Emit('chat_ended', {
+                    'username': current_username
+                }, room=other_username)
+
+        except Exception as e:
+            self.Error(sid, str(e))
+
+    # Chat kaydı ve mesajları silinir; hata olursa oturum temizliği yine de devam eder
+    def _DeleteChat(self, username, other_user):
+        try:
+            db_chat_id = self.db.GetChatID(username, other_user)
+
+            if db_chat_id:
+                print(f"Deleting chat {db_chat_id} from database")
+                self.db.DeleteChat(db_chat_id)
+                self.hot_chats.Drop(db_chat_id)
+        except Exception as e:
+            print(f"Error deleting chat from database: {str(e)}")
+
+    # Süresi dolan istekler en yakın son tarihte düşürülür. Bu süreçte eklenen daha erken istek
+    # beklemeyi keser; başka bir worker'ın eklediği istek en geç max_wait sonra görülür.
+    def ExpireRequestsForever(self, max_wait=Config.WORKER_HEARTBEAT):
+        while True:
+            try:
+                self.state.ExpireRequests(time.time())
+                self.state.WaitForRequests(max_wait)
+            except Exception as e:
+                print(f"Error expiring chat requests: {str(e)}")
+                time.sleep(max_wait)
+
+    # Heartbeat'i kesilen worker'ların kullanıcıları kopmuş sayılır (tek süreçte hiç olmaz)
+    def ReapDeadWorkers(self, ttl=Config.WORKER_TTL):
+        while True:
+            worker, usernames = self.state.TakeDeadWorker(ttl)
+            if worker is None:
+                return
+            print(f"Worker {worker} stopped responding, disconnecting {len(usernames)} user(s)")
+            for username in usernames:
+                self._Offline(username)
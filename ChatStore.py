@@ -0,0 +1,109 @@
+from collections import deque
+from datetime import datetime
+import itertools
+import threading
+
+# Mesaj başına sabit ek yük tahmini (tuple, zaman damgası, deque slotu)
+MESSAGE_OVERHEAD = 120
+
+class MemoryChatStore:
+    """Chats kept only in process memory, with the same interface as SQLiteChatStore.
+
+    Messages stay Fernet-encrypted. Each chat keeps at most
+    `max_messages_per_chat` messages (the oldest are dropped). Once the stored
+    messages of all chats reach `max_bytes`, AddMessage refuses new messages.
+    """
+
+    def __init__(self, max_messages_per_chat=10000, max_bytes=256 * 1024 * 1024):
+        self.max_messages_per_chat = max(1, max_messages_per_chat)
+        self.max_bytes = max_bytes
+        self.chats = {}   # chat_id -> _Chat
+        self.pairs = {}   # (low, high) -> chat_id
+        self.ids = itertools.count(1)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def CreateChat(self, chat_id):
+        pass
+
+    def NewChat(self, main_user, connection_user):
+        with self.lock:
+            chat_id = next(self.ids)
+            self.chats[chat_id] = _Chat(main_user, connection_user, self.max_messages_per_chat)
+            self.pairs[tuple(sorted((main_user, connection_user)))] = chat_id
+        return chat_id
+
+    def AddMessage(self, chat_id, sender, encoded_msg):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        size = MESSAGE_OVERHEAD + len(sender) + len(encoded_msg)
+        with self.lock:
+            chat = self.chats.get(int(chat_id))
+            if chat is None:
+                raise KeyError(f"Chat {chat_id} not found")
+            # Chat doluysa en eski mesajı halkadan düşer, yeri ona göre hesaplanır
+            freed = chat.messages[0][4] if len(chat.messages) == chat.messages.maxlen else 0
+            if self.bytes - freed + size > self.max_bytes:
+                raise RuntimeError("Chat storage is full")
+            chat.last_seq += 1
+            self.bytes -= freed
+            chat.messages.append((chat.last_seq, now, sender, encoded_msg, size))
+            self.bytes += size
+            return chat.last_seq
+
+    def GetMessages(self, chat_id):
+        with self.lock:
+            chat = self.chats.get(int(chat_id))
+            if chat is None:
+                return []
+            return [(t, sender, msg) for _, t, sender, msg, _ in chat.messages]
+
+    # SQLiteChatStore ile aynı: before_seq'ten küçük en yeni `limit` mesaj, yeniden eskiye
+    def GetMessagesPage(self, chat_id, before_seq=None, limit=50):
+        with self.lock:
+            chat = self.chats.get(int(chat_id))
+            if chat is None:
+                return []
+            page = []
+            for seq, t, sender, msg, _ in reversed(chat.messages):
+                if before_seq is not None and seq >= before_seq:
+                    continue
+                page.append((seq, t, sender, msg))
+                if len(page) >= limit:
+                    break
+            return page
+
+    def DeleteChat(self, chat_id):
+        with self.lock:
+            chat = self.chats.pop(int(chat_id), None)
+            if chat is None:
+                return
+            self.bytes -= sum(m[4] for m in chat.messages)
+            pair = tuple(sorted((chat.main_user, chat.connection_user)))
+            if self.pairs.get(pair) == int(chat_id):
+                del self.pairs[pair]
+
+    def GetChatID(self, user1, user2):
+        with self.lock:
+            return self.pairs.get(tuple(sorted((user1, user2))))
+
+    def GetActiveChats(self, username):
+        with self.lock:
+            return [{
+                'chat_id': chat_id,
+                'other_user': chat.connection_user if chat.main_user == username else chat.main_user
+            } for chat_id, chat in self.chats.items() if username in (chat.main_user, chat.connection_user)]
+
+    def Close(self):
+        with self.lock:
+            self.chats.clear()
+            self.pairs.clear()
+            self.bytes = 0
+
+class _Chat:
+    __slots__ = ('main_user', 'connection_user', 'messages', 'last_seq')
+
+    def __init__(self, main_user, connection_user, max_messages):
+        self.main_user = main_user
+        self.connection_user = connection_user
+        self.messages = deque(maxlen=max_messages)  # (Seq, Time, Sender, EncodedMessage, boyut)
+        self.last_seq = 0
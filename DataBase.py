@@ -1,87 +1,464 @@
 import sqlite3
+import threading
+import queue
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from config import Config
 import bcrypt  # Add this import for password hashing
+from ChatStore import MemoryChatStore
+from Metrics import DB_CALL_SECONDS, DB_WRITE_FAILURES, Timed
 
-class DB:
-    def __init__(self):
-        self.conn = sqlite3.connect("NeuralNetworks.db", check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.CreateDb()
+# Kullanıcı adından türetilen avatar
+def UserAvatar(username):
+    return f'../../assets/Uzaylı_{(hash(username) % 4) + 1}.png'
 
-    def CreateDb(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Users (
-                UserName TEXT PRIMARY KEY,
-                Password TEXT,
-                Status TEXT
-            )
-        """)
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Connections (
-                MainUser TEXT,
-                ConnectionUser TEXT,
-                PRIMARY KEY (MainUser, ConnectionUser),
-                FOREIGN KEY (MainUser) REFERENCES Users(UserName),
-                FOREIGN KEY (ConnectionUser) REFERENCES Users(UserName)
-            )
-        """)
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS All_messages (
-                MainUser TEXT,
-                ConnectionUser TEXT,
-                ChatID INTEGER PRIMARY KEY AUTOINCREMENT,
-                FOREIGN KEY (MainUser) REFERENCES Users(UserName),
-                FOREIGN KEY (ConnectionUser) REFERENCES Users(UserName)
-            )
-        """)
-
-        self.conn.commit()
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by the handler threads."""
 
-    def CreateChat(self, chat_id):
-        query = f"""
-        CREATE TABLE IF NOT EXISTS Chat_{chat_id} (
-            Time DATETIME PRIMARY KEY,
-            Sender TEXT,
-            EncodedMessage TEXT,
-            FOREIGN KEY (Sender) REFERENCES Users(UserName)
-        )
+    def __init__(self, path, size=8, timeout=5.0):
+        self.path = path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _Open(self):
+        # cached_statements: aynı SQL metni her bağlantıda bir kez derlenir, sonra yeniden kullanılır
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def Connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.created < self.size
+                if can_open:
+                    self.created += 1
+            if can_open:
+                try:
+                    conn = self._Open()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                conn = self.idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+
+    def Close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+class MessageWriter:
+    """Write-behind queue for AddMessage: a background thread commits queued rows in batches.
+
+    A batch is written when `max_batch` rows are waiting or `interval` seconds have
+    passed. Put blocks (up to `timeout`) while the queue is full. A row that still
+    fails after the per-row retry is logged and counted in `failed`; a row whose
+    chat has been deleted is not written.
+    """
+
+    def __init__(self, pool, max_batch=256, interval=0.02, max_queue=10000, timeout=5.0):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.interval = interval
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self.rows = deque()   # silinen chatlerin satırları None ile işaretlenir
+        self.cond = threading.Condition()
+        self.enqueued = 0
+        self.completed = 0    # yazılan, atlanan ya da yazılamayan satırlar
+        self.failed = 0
+        self.flush_requested = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._Run, name="db-message-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Put(self, row):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("Message writer is closed")
+            if not self.cond.wait_for(lambda: len(self.rows) < self.max_queue, self.timeout):
+                raise RuntimeError("Message write queue is full")
+            self.rows.append(row)
+            self.enqueued += 1
+            if len(self.rows) >= self.max_batch:
+                self.cond.notify_all()
+
+    # Çağrı anına kadar kuyruğa girmiş (onaylanmış) tüm mesajlar işlenene kadar bekler
+    def Flush(self):
+        with self.cond:
+            target = self.enqueued
+            if self.completed >= target:
+                return
+            self.flush_requested = True
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: self.completed >= target)
+
+    def Pending(self):
+        with self.cond:
+            return self.enqueued - self.completed
+
+    # Silinen chat'in kuyruktaki satırları yazılmaz; sayaçların sırası bozulmasın diye yerlerinde işaretlenir
+    def Discard(self, chat_id):
+        with self.cond:
+            discarded = sum(row is not None and row[0] == chat_id for row in self.rows)
+            if discarded:
+                self.rows = deque(None if row is not None and row[0] == chat_id else row for row in self.rows)
+            return discarded
+
+    def _Run(self):
+        while True:
+            with self.cond:
+                deadline = time.monotonic() + self.interval
+                self.cond.wait_for(
+                    lambda: self.closed or self.flush_requested or len(self.rows) >= self.max_batch
+                    or (self.rows and time.monotonic() >= deadline),
+                    self.interval
+                )
+                if not self.rows:
+                    self.flush_requested = False
+                    if self.closed:
+                        return
+                    continue
+                batch = [self.rows.popleft() for _ in range(min(self.max_batch, len(self.rows)))]
+                if not self.rows:
+                    self.flush_requested = False
+
+            rows = [row for row in batch if row is not None]
+            failed = len(rows)
+            try:
+                failed = self._Write(rows) if rows else 0
+            except Exception as e:
+                # Beklenmeyen hata thread'i öldürmesin; Flush bekleyenler yine de uyansın
+                print(f"Error in message writer, {len(rows)} message(s) lost: {str(e)}")
+            finally:
+                with self.cond:
+                    self.completed += len(batch)
+                    self.failed += failed
+                    self.cond.notify_all()
+            if failed:
+                DB_WRITE_FAILURES.Inc(amount=failed)
+
+    # Chat satırı silinmişse insert hiçbir şey yazmaz. Yazılamayan satır sayısını döndürür.
+    def _Write(self, rows):
+        query = """
+            INSERT INTO Messages (ChatID, Seq, Time, Sender, EncodedMessage)
+            SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM All_messages WHERE ChatID=?)
         """
-        self.cursor.execute(query)
+        params = [row + (row[0],) for row in rows]
+        try:
+            with self.pool.Connection() as conn, conn:
+                conn.executemany(query, params)
+            return 0
+        except Exception:
+            # Toplu yazım başarısızsa sorunlu satır diğerlerini düşürmesin
+            failed = 0
+            for row in params:
+                try:
+                    with self.pool.Connection() as conn, conn:
+                        conn.execute(query, row)
+                except Exception as e:
+                    failed += 1
+                    print(f"Error writing message {row[1]} for chat {row[0]}, it is lost: {str(e)}")
+            return failed
 
-    def InsertUser(self, username, password, status='offline'):
-        # Hash the password before storing
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        self.cursor.execute("INSERT INTO Users VALUES (?, ?, ?)", (username, hashed_password, status))
-        self.conn.commit()
+    # Kuyrukta kalan her şeyi yazıp thread'i durdurur
+    def Close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
 
-    def SetUserStatus(self, username, status):
-        self.cursor.execute("UPDATE Users SET Status=? WHERE UserName=?", (status, username))
-        self.conn.commit()
+class SQLiteChatStore:
+    """Chats and their messages in the All_messages / Messages tables."""
+
+    def __init__(self, pool, write_behind=Config.DB_WRITE_BEHIND):
+        self.pool = pool
+        self.writer = None
+        if write_behind:
+            self.next_seq = {}
+            self.seq_lock = threading.Lock()
+            self.writer = MessageWriter(self.pool,
+                                        max_batch=Config.DB_WRITE_BATCH,
+                                        interval=Config.DB_WRITE_INTERVAL_MS / 1000.0,
+                                        max_queue=Config.DB_WRITE_QUEUE,
+                                        timeout=Config.DB_WRITE_TIMEOUT)
+
+    def _Query(self, query, params=(), one=False):
+        with self.pool.Connection() as conn:
+            cursor = conn.execute(query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    # Mesajlar Messages tablosunda tutulduğu için chat başına tablo oluşturulmaz
+    def CreateChat(self, chat_id):
+        pass
 
+    # lastrowid kendi bağlantımızın insert'inden okunur, başka thread'lerin insert'leriyle karışmaz
+    def NewChat(self, main_user, connection_user):
+        with self.pool.Connection() as conn, conn:
+            chat_id = conn.execute("INSERT INTO All_messages (MainUser, ConnectionUser) VALUES (?, ?)",
+                                   (main_user, connection_user)).lastrowid
+        self.CreateChat(chat_id)
+        return chat_id
+
+    # Seq chat içinde 1'den artar; aynı saniyede gelen mesajlar çakışmaz. Atanan Seq döner.
     def AddMessage(self, chat_id, sender, encoded_msg):
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.cursor.execute(f"INSERT INTO Chat_{chat_id} VALUES (?, ?, ?)", (now, sender, encoded_msg))
-        self.conn.commit()
+        if self.writer:
+            # Write-behind: Seq burada atanır, satır arka planda toplu commit edilir
+            with self.seq_lock:
+                seq = self.next_seq.get(chat_id)
+                if seq is None:
+                    res = self._Query("""
+                        SELECT (SELECT MAX(Seq) FROM Messages WHERE ChatID=?), EXISTS (SELECT 1 FROM All_messages WHERE ChatID=?)
+                    """, (chat_id, chat_id), one=True)
+                    if not res[1]:
+                        raise KeyError(f"Chat {chat_id} not found")
+                    seq = (res[0] or 0) + 1
+                self.next_seq[chat_id] = seq + 1
+            self.writer.Put((chat_id, seq, now, sender, encoded_msg))
+            return seq
+        # Silinmiş chat'e (ör. moderasyonda beklerken kapanan) mesaj yazılmaz, MemoryChatStore gibi hata verir
+        with self.pool.Connection() as conn, conn:
+            row = conn.execute("""
+                INSERT INTO Messages (ChatID, Seq, Time, Sender, EncodedMessage)
+                SELECT ?, (SELECT COALESCE(MAX(Seq), 0) + 1 FROM Messages WHERE ChatID=?), ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM All_messages WHERE ChatID=?)
+                RETURNING Seq
+            """, (chat_id, chat_id, now, sender, encoded_msg, chat_id)).fetchone()
+        if row is None:
+            raise KeyError(f"Chat {chat_id} not found")
+        return row[0]
 
     def GetMessages(self, chat_id):
-        self.cursor.execute(f"SELECT * FROM Chat_{chat_id} ORDER BY Time")
-        return self.cursor.fetchall()
+        if self.writer:
+            self.writer.Flush()
+        return self._Query("SELECT Time, Sender, EncodedMessage FROM Messages WHERE ChatID=? ORDER BY Seq", (chat_id,))
+
+    # Sayfalı geçmiş: before_seq'ten küçük en yeni `limit` mesaj, yeniden eskiye (Seq, Time, Sender, EncodedMessage)
+    def GetMessagesPage(self, chat_id, before_seq=None, limit=Config.HISTORY_PAGE_SIZE):
+        if self.writer:
+            self.writer.Flush()
+        if before_seq is None:
+            return self._Query("""
+                SELECT Seq, Time, Sender, EncodedMessage FROM Messages
+                WHERE ChatID=? ORDER BY Seq DESC LIMIT ?
+            """, (chat_id, limit))
+        return self._Query("""
+            SELECT Seq, Time, Sender, EncodedMessage FROM Messages
+            WHERE ChatID=? AND Seq<? ORDER BY Seq DESC LIMIT ?
+        """, (chat_id, before_seq, limit))
 
     def DeleteChat(self, chat_id):
-        self.cursor.execute(f"DROP TABLE IF EXISTS Chat_{chat_id}")
-        self.cursor.execute("DELETE FROM All_messages WHERE ChatID=?", (chat_id,))
-        self.conn.commit()
+        if self.writer:
+            # Kuyruktaki mesajlar atılır. O an yazılmakta olanlar ya silmeden önce yazılıp aşağıda silinir
+            # ya da chat satırı silindiği için hiç yazılmaz; yetim mesaj kalmaz.
+            self.writer.Discard(chat_id)
+        with self.pool.Connection() as conn, conn:
+            conn.execute("DELETE FROM Messages WHERE ChatID=?", (chat_id,))
+            conn.execute("DELETE FROM All_messages WHERE ChatID=?", (chat_id,))
+        if self.writer:
+            with self.seq_lock:
+                self.next_seq.pop(chat_id, None)
 
+    # Kullanıcı sırası önemsiz: GetChatID(a, b) == GetChatID(b, a)
     def GetChatID(self, user1, user2):
-        self.cursor.execute("SELECT ChatID FROM All_messages WHERE MainUser=? AND ConnectionUser=?", (user1, user2))
-        res = self.cursor.fetchone()
+        low, high = sorted((user1, user2))
+        res = self._Query("""
+            SELECT ChatID FROM All_messages
+            WHERE min(MainUser, ConnectionUser)=? AND max(MainUser, ConnectionUser)=?
+        """, (low, high), one=True)
         return res[0] if res else None
 
+    def GetActiveChats(self, username):
+        """Get all active chats for a user"""
+        chats = self._Query("""
+            SELECT ChatID, MainUser, ConnectionUser
+            FROM All_messages
+            WHERE MainUser=? OR ConnectionUser=?
+        """, (username, username))
+
+        active_chats = []
+
+        for chat in chats:
+            chat_id = chat[0]
+            main_user = chat[1]
+            connection_user = chat[2]
+
+            # Determine the other user
+            other_user = connection_user if main_user == username else main_user
+
+            active_chats.append({
+                'chat_id': chat_id,
+                'other_user': other_user
+            })
+
+        return active_chats
+
+    def Close(self):
+        if self.writer:
+            self.writer.Close()
+
+class DB:
+    def __init__(self, path=Config.DATABASE_PATH, pool_size=Config.DB_POOL_SIZE,
+                 write_behind=Config.DB_WRITE_BEHIND, chat_storage=Config.CHAT_STORAGE):
+        self.pool = ConnectionPool(path, pool_size)
+        self.CreateDb()
+        if chat_storage == 'memory':
+            # Chatler zaten geçici: şifreli mesajlar sadece RAM'de, gönderim yolunda disk yok
+            self.chats = MemoryChatStore(max_messages_per_chat=Config.MEMORY_CHAT_MAX_MESSAGES,
+                                         max_bytes=Config.MEMORY_CHAT_MAX_BYTES)
+        elif chat_storage == 'sqlite':
+            self.chats = SQLiteChatStore(self.pool, write_behind)
+        else:
+            raise ValueError(f"Unknown chat storage: {chat_storage}")
+
+    # Okuma: havuzdan bağlantı al, sonucu döndür
+    def _Query(self, query, params=(), one=False):
+        with self.pool.Connection() as conn:
+            cursor = conn.execute(query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    # Yazma: tek transaction, hata olursa rollback
+    def _Write(self, query, params=()):
+        with self.pool.Connection() as conn, conn:
+            conn.execute(query, params)
+
+    def CreateDb(self):
+        with self.pool.Connection() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Users (
+                    UserName TEXT PRIMARY KEY,
+                    Password TEXT,
+                    Status TEXT
+                )
+            """)
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Connections (
+                    MainUser TEXT,
+                    ConnectionUser TEXT,
+                    PRIMARY KEY (MainUser, ConnectionUser),
+                    FOREIGN KEY (MainUser) REFERENCES Users(UserName),
+                    FOREIGN KEY (ConnectionUser) REFERENCES Users(UserName)
+                )
+            """)
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS All_messages (
+                    MainUser TEXT,
+                    ConnectionUser TEXT,
+                    ChatID INTEGER PRIMARY KEY AUTOINCREMENT,
+                    FOREIGN KEY (MainUser) REFERENCES Users(UserName),
+                    FOREIGN KEY (ConnectionUser) REFERENCES Users(UserName)
+                )
+            """)
+
+            # Kullanıcı çifti sırasız aranır: (a, b) ve (b, a) aynı index kaydına düşer
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS All_messages_Pair
+                ON All_messages (min(MainUser, ConnectionUser), max(MainUser, ConnectionUser))
+            """)
+
+            # Tüm chatlerin mesajları tek tabloda; (ChatID, Seq) hem geçmiş okumayı hem toplu silmeyi index üzerinden yapar
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Messages (
+                    ChatID INTEGER NOT NULL,
+                    Seq INTEGER NOT NULL,
+                    Time DATETIME,
+                    Sender TEXT,
+                    EncodedMessage TEXT,
+                    PRIMARY KEY (ChatID, Seq),
+                    FOREIGN KEY (Sender) REFERENCES Users(UserName)
+                ) WITHOUT ROWID
+            """)
+
+    # Chat ve mesaj işlemleri seçilen depoya (CHAT_STORAGE) gider; her DB metodunun süresi metriklere yazılır
+    @Timed(DB_CALL_SECONDS)
+    def CreateChat(self, chat_id):
+        return self.chats.CreateChat(chat_id)
+
+    @Timed(DB_CALL_SECONDS)
+    def NewChat(self, main_user, connection_user):
+        return self.chats.NewChat(main_user, connection_user)
+
+    @Timed(DB_CALL_SECONDS)
+    def AddMessage(self, chat_id, sender, encoded_msg):
+        return self.chats.AddMessage(chat_id, sender, encoded_msg)
+
+    @Timed(DB_CALL_SECONDS)
+    def GetMessages(self, chat_id):
+        return self.chats.GetMessages(chat_id)
+
+    @Timed(DB_CALL_SECONDS)
+    def GetMessagesPage(self, chat_id, before_seq=None, limit=Config.HISTORY_PAGE_SIZE):
+        return self.chats.GetMessagesPage(chat_id, before_seq, limit)
+
+    @Timed(DB_CALL_SECONDS)
+    def DeleteChat(self, chat_id):
+        return self.chats.DeleteChat(chat_id)
+
+    @Timed(DB_CALL_SECONDS)
+    def GetChatID(self, user1, user2):
+        return self.chats.GetChatID(user1, user2)
+
+    @Timed(DB_CALL_SECONDS)
+    def GetActiveChats(self, username):
+        return self.chats.GetActiveChats(username)
+
+    # Chatler geçicidir: süreç yeniden başladığında hiçbir oturum yoktur, kalan her chat yetimdir
+    # (ör. çökme sonrası). Eski sürümden kalan Chat_{id} tabloları da temizlenir.
+    @Timed(DB_CALL_SECONDS)
+    def SweepOrphanedChats(self):
+        with self.pool.Connection() as conn, conn:
+            # DROP TABLE kendiliğinden transaction açmaz; BEGIN ile silmelerle birlikte tek transaction olur
+            conn.execute("BEGIN")
+            legacy = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'Chat_[0-9]*'").fetchall()
+            for (name,) in legacy:
+                conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            removed = conn.execute("DELETE FROM All_messages").rowcount
+            conn.execute("DELETE FROM Messages")
+        return removed + len(legacy)
+
+    @Timed(DB_CALL_SECONDS)
+    def InsertUser(self, username, password, status='offline'):
+        # Hash the password before storing
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        self._Write("INSERT INTO Users VALUES (?, ?, ?)", (username, hashed_password, status))
+
+    @Timed(DB_CALL_SECONDS)
+    def SetUserStatus(self, username, status):
+        self._Write("UPDATE Users SET Status=? WHERE UserName=?", (status, username))
+
+    # Birden fazla durum güncellemesi tek transaction'da
+    @Timed(DB_CALL_SECONDS)
+    def SetUserStatuses(self, statuses):
+        with self.pool.Connection() as conn, conn:
+            conn.executemany("UPDATE Users SET Status=? WHERE UserName=?", [(s, u) for u, s in statuses])
+
+    @Timed(DB_CALL_SECONDS)
     def GetUser(self, username):
-        self.cursor.execute("SELECT * FROM Users WHERE UserName=?", (username,))
-        user = self.cursor.fetchone()
+        user = self._Query("SELECT * FROM Users WHERE UserName=?", (username,), one=True)
         if user:
             return {
                 'username': user[0],
@@ -90,41 +467,19 @@ class DB:
             }
         return None
 
+    @Timed(DB_CALL_SECONDS)
     def GetAllUsers(self):
-        self.cursor.execute("SELECT UserName, Status FROM Users")
-        users = self.cursor.fetchall()
+        users = self._Query("SELECT UserName, Status FROM Users")
         return [{
             'username': user[0],
             'status': user[1],
-            'avatar': f'../../assets/Uzaylı_{(hash(user[0]) % 4) + 1}.png'  # Generate avatar based on username
+            'avatar': UserAvatar(user[0])  # Generate avatar based on username
         } for user in users]
 
+    @Timed(DB_CALL_SECONDS)
     def CheckPassword(self, provided_password, stored_password):
         return bcrypt.checkpw(provided_password.encode('utf-8'), stored_password)
 
-    def GetActiveChats(self, username):
-        """Get all active chats for a user"""
-        self.cursor.execute("""
-            SELECT ChatID, MainUser, ConnectionUser 
-            FROM All_messages 
-            WHERE MainUser=? OR ConnectionUser=?
-        """, (username, username))
-        
-        chats = self.cursor.fetchall()
-        active_chats = []
-        
-        for chat in chats:
-            chat_id = chat[0]
-            main_user = chat[1]
-            connection_user = chat[2]
-            
-            # Determine the other user
-            other_user = connection_user if main_user == username else main_user
-            
-            active_chats.append({
-                'chat_id': chat_id,
-                'other_user': other_user
-            })
-        
-        return active_chats
-
+    def Close(self):
+        self.chats.Close()
+        self.pool.Close()
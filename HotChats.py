@@ -0,0 +1,149 @@
+from collections import OrderedDict, deque
+import threading
+from config import Config
+
+# Mesaj başına sabit ek yük tahmini (dict, string başlıkları, deque slotu)
+MESSAGE_OVERHEAD = 200
+# Buffer'ı olmayan chatler için hatırlanan son Seq sayısı
+UNBUFFERED_LIMIT = 4096
+
+def MessageSize(message):
+    return MESSAGE_OVERHEAD + len(message['sender']) + len(message['message'].encode('utf-8'))
+
+class HotChats:
+    """Decrypted recent messages of active chats, kept in memory.
+
+    Each chat holds at most `per_chat` messages in a ring buffer; across all
+    chats the estimated size stays under `max_bytes` by dropping the least
+    recently used chats. A buffer only answers history pages it covers
+    completely, everything else falls back to the database. Buffers are only
+    created by Start and Seed, so a late message of a dropped chat is not kept.
+    """
+
+    def __init__(self, per_chat=Config.HOT_CHAT_MESSAGES, max_bytes=Config.HOT_CHAT_MAX_BYTES):
+        self.per_chat = per_chat
+        self.max_bytes = max_bytes
+        self.chats = OrderedDict()  # chat_id -> _Buffer, en eski erişilen başta
+        self.unbuffered = OrderedDict()  # chat_id -> buffer yokken gelen son Seq
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Yeni açılan chat: geçmişi boş, baştan itibaren tamamı bellekte
+    def Start(self, chat_id):
+        if self.per_chat <= 0:
+            return
+        with self.lock:
+            self._Drop(str(chat_id))
+            self.unbuffered.pop(str(chat_id), None)
+            self.chats[str(chat_id)] = _Buffer(self.per_chat, 1)
+
+    # Gönderim sırasıyla çağrılır (MessagePipeline chat içi sırayı korur)
+    def Append(self, chat_id, message):
+        if self.per_chat <= 0:
+            return
+        chat_id = str(chat_id)
+        with self.lock:
+            buffer = self.chats.get(chat_id)
+            if buffer is None:
+                # Silinmiş ya da soğuk chat: buffer açılmaz, sadece Seq hatırlanır ki
+                # Seed bu mesajdan önce yapılmış bir DB okumasıyla buffer kurmasın
+                self.unbuffered[chat_id] = message['seq']
+                self.unbuffered.move_to_end(chat_id)
+                if len(self.unbuffered) > UNBUFFERED_LIMIT:
+                    self.unbuffered.popitem(last=False)
+                return
+            if buffer.messages and message['seq'] <= buffer.messages[-1]['seq']:
+                return
+            self.chats.move_to_end(chat_id)
+            self.bytes += buffer.Append(message)
+            self._Evict(chat_id)
+
+    # DB'den okunan ilk sayfa ile buffer'ı doldurur; okumadan sonra yazılmış bir mesaj varsa dokunmaz
+    def Seed(self, chat_id, messages, complete):
+        if self.per_chat <= 0 or not messages:
+            return
+        chat_id = str(chat_id)
+        with self.lock:
+            if chat_id in self.chats or self.unbuffered.pop(chat_id, 0) > messages[-1]['seq']:
+                return
+            start = 1 if complete else messages[0]['seq']
+            buffer = self.chats[chat_id] = _Buffer(self.per_chat, start)
+            for message in messages:
+                self.bytes += buffer.Append(message)
+            self._Evict(chat_id)
+
+    # before'dan eski en fazla `limit` mesaj (eskiden yeniye); buffer kapsamıyorsa None
+    def Page(self, chat_id, before=None, limit=Config.HISTORY_PAGE_SIZE):
+        chat_id = str(chat_id)
+        with self.lock:
+            buffer = self.chats.get(chat_id)
+            page = buffer.Page(before, limit) if buffer is not None else None
+            if page is None:
+                self.misses += 1
+                return None
+            self.chats.move_to_end(chat_id)
+            self.hits += 1
+            return page
+
+    def Drop(self, chat_id):
+        with self.lock:
+            self._Drop(str(chat_id))
+
+    def _Drop(self, chat_id):
+        buffer = self.chats.pop(chat_id, None)
+        if buffer is not None:
+            self.bytes -= buffer.bytes
+
+    # Soğuk chatler atılır; sınırı tek başına aşsa bile yazılan chat en son gider
+    def _Evict(self, keep):
+        while self.bytes > self.max_bytes and self.chats:
+            chat_id = next(iter(self.chats))
+            if chat_id == keep and len(self.chats) > 1:
+                self.chats.move_to_end(chat_id)
+                continue
+            self._Drop(chat_id)
+            self.evictions += 1
+
+    def Stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'chats': len(self.chats),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+class _Buffer:
+    __slots__ = ('messages', 'start', 'bytes')
+
+    def __init__(self, size, start):
+        self.messages = deque(maxlen=size)
+        self.start = start  # Seq >= start olan tüm mesajlar buffer'da
+        self.bytes = 0
+
+    # Boyut farkını döndürür
+    def Append(self, message):
+        delta = MessageSize(message)
+        if len(self.messages) == self.messages.maxlen:
+            dropped = self.messages.popleft()
+            delta -= MessageSize(dropped)
+            self.start = dropped['seq'] + 1
+        self.messages.append(message)
+        self.bytes += delta
+        return delta
+
+    def Page(self, before, limit):
+        older = [m for m in self.messages if before is None or m['seq'] < before]
+        if len(older) >= limit:
+            return older[-limit:]
+        # Sayfa dolmadı: bu ancak chat'in baştan tamamı buradaysa doğru cevaptır
+        if self.start == 1:
+            return older
+        return None
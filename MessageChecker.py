@@ -1,65 +1,634 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification ,AutoModelForSeq2SeqLM
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from Cache import TTLCache
+from Metrics import MODEL_STAGE_SECONDS, BLOCKED_MESSAGES, Timed
+import huggingface_hub.constants
+from config import Config
+import unicodedata
+import threading
+import hashlib
+import hmac
+import os
+import queue
+import time
 import torch
 import re
 
+# Çeviri cache anahtarı: aynı mesajın farklı boşluk/unicode yazımları tek kayıt olsun
+def NormalizeText(text):
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+# Cache anahtarı: süreç başına rastgele anahtarla HMAC-SHA256, mesajdan alınan metin bellekte tutulmaz
+def KeyedHash(secret, text):
+    return hmac.new(secret, text.encode("utf-8"), hashlib.sha256).digest()
+
+# Dil tespiti için ucuz sezgiler: çeviri yalnızca Türkçe olabilecek metinde çalışır
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+TURKISH_LETTERS = frozenset("çğıöşüÇĞİÖŞÜâîû")
+ENGLISH_WORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can could
+did do does dont for from get go going good got had has have he her here hey hi
+him his how i if im in is it its just know like lol me my no not now of off ok
+okay on one or our out please right see she so some thanks thank that the their
+them then there they this to too u up us was we well were what when where which
+who why will with would yeah yes you your
+back bad day great hello late love more much need new nice night people really
+see send sorry sure think time today tomorrow very want work
+""".split())
+TURKISH_WORDS = frozenset("""
+abi acaba ama ana artik aslinda bana beni benim ben bi bir biraz bize bu bugun
+burada cok da daha de degil diye en evet gel gibi hadi hala hayir hep her hic
+icin iki ile iste iyi kanka kim lan mi mu merhaba misin musun naber nasil
+nasilsin ne neden nerede niye o olan olarak olsun onu ona oyle sana sen seni
+senin selam simdi siz sonra su tamam tesekkurler ve ya yani yok zaten
+""".split())
+
+def _IsLatin(word):
+    return all(ord(c) < 0x250 for c in word)
+
+# False: metin zaten İngilizce ya da çevrilecek içerik yok (URL, emoji, sayı, Latin dışı yazı)
+def NeedsTranslation(text):
+    words = WORD_PATTERN.findall(URL_PATTERN.sub(" ", text))
+    if not words:
+        return False
+    if any(c in TURKISH_LETTERS for w in words for c in w):
+        return True
+    if not any(_IsLatin(w) for w in words):
+        return False
+
+    # Emin olunamayan her durumda çeviriye git, karar değişmesin: bilinmeyen tek bir kelime
+    # ("you are aptal") bile Türkçe olabilir, atlama sadece her kelime İngilizce listedeyken yapılır
+    words = [w.lower() for w in words if _IsLatin(w)]
+    return any(w in TURKISH_WORDS or w not in ENGLISH_WORDS for w in words)
+
+# Kısa onay / selamlaşma mesajları model çalıştırmadan temiz sayılır
+SAFE_MESSAGES = frozenset("""
+ok okay okey k kk tamam tmm peki evet hayir hayır yok var olur olmaz
+hi hello hey selam slm merhaba mrb sa as aleykumselam
+thanks thx ty tesekkurler teşekkürler sagol sağol saol eyvallah
+bye bb gorusuruz görüşürüz yes no yep nope lol haha hahaha
+""".split())
+
+def LoadWordList(path):
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def UrlHost(url):
+    if not url.startswith("http"):
+        url = "http://" + url
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+# Mesaj içinden yakalanan URL'nin sonundaki noktalama URL'ye ait değildir
+URL_TRAILING = ".,;:!?)]}'\"»"
+
+# İki seviyeli kayıt edilebilir domain sonekleri (example.com.tr -> 3 label)
+SECOND_LEVEL_SUFFIXES = frozenset("""
+ac bel co com edu gen gov k12 ltd me mil net org plc sch tv web
+""".split())
+
+# Paylaşımlı / kısaltıcı domainler: tek bir kötü URL tüm domaini kötü yapmasın
+SHARED_DOMAINS = frozenset("""
+bit.ly t.co tinyurl.com goo.gl ow.ly is.gd buff.ly cutt.ly rebrand.ly
+google.com youtube.com youtu.be github.com githubusercontent.com dropbox.com
+drive.google.com docs.google.com forms.gle sites.google.com blogspot.com
+wordpress.com medium.com reddit.com twitter.com x.com facebook.com instagram.com
+linkedin.com microsoft.com live.com office.com sharepoint.com amazonaws.com
+cloudfront.net herokuapp.com netlify.app vercel.app pages.dev web.app firebaseapp.com
+""".split())
+
+def NormalizeUrl(url):
+    url = url.rstrip(URL_TRAILING)
+    if not url.lower().startswith(("http://", "https://")):
+        url = "http://" + url
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or "/", parts.query, ""))
+
+def RegistrableDomain(host):
+    labels = [l for l in host.split(".") if l]
+    if all(l.isdigit() for l in labels) or ":" in host:
+        return host
+    if len(labels) >= 3 and labels[-2] in SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+class PreFilter:
+    """Cheap first moderation tier: blocklist, known bad domains, trivially safe text."""
+
+    def __init__(self, blocklist=(), bad_domains=()):
+        words = [re.escape(w) for w in blocklist]
+        self.blocklist = re.compile(r"\b(?:" + "|".join(words) + r")\b", re.IGNORECASE) if words else None
+        self.bad_domains = frozenset(d.lower().lstrip(".") for d in bad_domains)
+
+    def IsBadDomain(self, host):
+        labels = host.split(".")
+        return any(".".join(labels[i:]) in self.bad_domains for i in range(len(labels)))
+
+    # True: kesin kötü, False: kesin temiz, None: karar sonraki katmanlara kalır
+    def Check(self, message):
+        if self.blocklist and self.blocklist.search(message):
+            return True
+
+        urls = URL_PATTERN.findall(message)
+        if self.bad_domains and any(self.IsBadDomain(UrlHost(u)) for u in urls):
+            return True
+        if urls:
+            return None
+
+        text = NormalizeText(message)
+        if not WORD_PATTERN.search(text) and not any(c.isdigit() for c in text):
+            return False
+        words = WORD_PATTERN.findall(text.lower())
+        if words and len(words) <= 3 and all(w in SAFE_MESSAGES for w in words):
+            return False
+        return None
+
+# fp32: orijinal ağırlıklar, int8: dinamik quantize edilmiş Linear katmanlar
+INFERENCE_BACKENDS = ("fp32", "int8")
+
+# (tokenizer attribute, model attribute, model sınıfı, hub id)
+MODEL_SPECS = [
+    ("tokenizerUrl", "ModelUrl", AutoModelForSequenceClassification, "kmack/malicious-url-detection"),
+    ("tokenizerSpam", "ModelSpam", AutoModelForSequenceClassification, "mshenoda/roberta-spam"),
+    ("tokenizerTr_En", "modelTr_En", AutoModelForSeq2SeqLM, "Helsinki-NLP/opus-mt-tc-big-tr-en"),
+    ("tokenizerToxic", "modelToxic", AutoModelForSequenceClassification, "cardiffnlp/twitter-roberta-base-offensive")
+]
+
+# Hub dosyalarının indirilmesi paralel yapılır; model nesnesinin kurulumu (from_pretrained) meta-device
+# init için global durum değiştirir, thread-safe değil ve bu kilitle sırayla yapılır
+FROM_PRETRAINED_LOCK = threading.Lock()
+
+# Modelin hub dosyalarını yerel cache'e (cache_dir, yoksa HF varsayılanı) indirip klasörü döndürür. Hub'a
+# ulaşılamazsa (offline) ya da HF_HUB_OFFLINE ise adın kendisi döner, from_pretrained çözümlemeyi kilit altında kendisi yapar.
+def FetchModelFiles(name, cache_dir=None):
+    if os.path.isdir(name) or huggingface_hub.constants.HF_HUB_OFFLINE:
+        return name
+    try:
+        files = huggingface_hub.list_repo_files(name)
+        weights = "*.safetensors" if any(f.endswith(".safetensors") for f in files) else "*.bin"
+        return huggingface_hub.snapshot_download(name, cache_dir=cache_dir,
+                                                 allow_patterns=["*.json", "*.txt", "*.model", "*.spm", weights])
+    except Exception as e:
+        print(f"Could not prefetch {name}, loading it directly: {str(e)}")
+        return name
+
 class Models:
+    # Kademeler: isim -> metod. Sıra Config.MODERATION_TIERS ile belirlenir (ucuzdan pahalıya)
+    TIERS = {
+        'prefilter': '_PreFilterTier',
+        'url': '_UrlTier',
+        'spam': '_SpamTier',
+        'toxic': '_ToxicTier'
+    }
+
+    def __init__(self, translation_cache_size=Config.TRANSLATION_CACHE_SIZE, translation_cache_ttl=Config.TRANSLATION_CACHE_TTL,
+                 translation_fast_path=Config.TRANSLATION_FAST_PATH, tiers=Config.MODERATION_TIERS,
+                 blocklist=None, bad_domains=None, background=False, cache_dir=Config.MODEL_CACHE_DIR,
+                 load_workers=Config.MODEL_LOAD_WORKERS, warmup=Config.MODEL_WARMUP, backend=Config.INFERENCE_BACKEND):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.backend = backend
+        self.tiers = [t.strip() for t in tiers.split(",") if t.strip()]
+        unknown = [t for t in self.tiers if t not in self.TIERS]
+        if unknown:
+            raise ValueError(f"Unknown moderation tier(s): {', '.join(unknown)}")
+        self.prefilter = PreFilter(
+            LoadWordList(Config.MODERATION_BLOCKLIST_FILE) if blocklist is None else blocklist,
+            LoadWordList(Config.MODERATION_BAD_DOMAINS_FILE) if bad_domains is None else bad_domains
+        )
+        self.tier_stats = {t: {'checked': 0, 'bad': 0, 'safe': 0} for t in self.tiers}
+        self.stats_lock = threading.Lock()
+        self.translations = TTLCache(translation_cache_size, translation_cache_ttl)
+        # URL cache'leri URL'nin / domainin KeyedHash'i ile tutulur (yol ve sorgu token taşıyabilir)
+        self.secret = os.urandom(32)
+        self.url_verdicts = TTLCache(Config.URL_CACHE_SIZE, Config.URL_CACHE_TTL)
+        self.bad_url_domains = TTLCache(Config.URL_DOMAIN_CACHE_SIZE, Config.URL_DOMAIN_CACHE_TTL)
+        self.translation_fast_path = translation_fast_path
+        self.translation_skips = 0
+
+        self.cache_dir = cache_dir
+        self.load_workers = load_workers
+        self.warmup = warmup
+        self.ready = threading.Event()
+        self.load_error = None
+        self.load_seconds = None
+        self.generation = 0
+        if background:
+            loader = threading.Thread(target=self._LoadInBackground, name="model-loader")
+            loader.daemon = True
+            loader.start()
+        else:
+            self.Load()
+
+    # Dört model paralel yüklenir; moderasyon dışındaki her şey bu sırada çalışmaya devam eder
+    def Load(self):
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.load_workers)) as pool:
+            loaded = list(pool.map(lambda spec: self._LoadModel(spec[2], spec[3]), MODEL_SPECS))
+        for (tokenizer_attr, model_attr, _, _), (tokenizer, model) in zip(MODEL_SPECS, loaded):
+            setattr(self, tokenizer_attr, tokenizer)
+            setattr(self, model_attr, model)
+        if self.warmup:
+            self.Warmup()
+        self.load_seconds = time.monotonic() - start
+        self.Invalidate()
+        self.ready.set()
+
+    def _LoadInBackground(self):
+        try:
+            self.Load()
+        except Exception as e:
+            print(f"Model loading failed: {str(e)}")
+            self.load_error = e
+            self.ready.set()
+
+    # cache_dir: hub dosyalarının indirildiği klasör. Dosyalar hub cache'inde revizyona göre tutulur,
+    # model her açılışta bu dosyalardan kurulur (int8 quantization da her seferinde yapılır)
+    def _LoadModel(self, model_class, name):
+        source = FetchModelFiles(name, self.cache_dir)
+        tokenizer = AutoTokenizer.from_pretrained(source, cache_dir=self.cache_dir)
+        with FROM_PRETRAINED_LOCK:
+            model = model_class.from_pretrained(source, cache_dir=self.cache_dir)
+        model.eval()
+        if self.backend == "int8":
+            # Linear katmanlar int8 ağırlık + dinamik aktivasyon ölçeklemesi ile çalışır (sadece CPU)
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+        return tokenizer, model
+
+    # İlk gerçek mesajın ilk-çağrı maliyetini (lazy init, bellek ayırma) ödememesi için
+    def Warmup(self):
+        self._Translate(["merhaba"])
+        self.SpamBatch(["hello"])
+        self.ToxicBatch(["hello"])
+        self._ClassifyUrls(["http://example.com/"])
 
-    def __init__(self): 
-        self.tokenizerUrl = AutoTokenizer.from_pretrained("kmack/malicious-url-detection")
-        self.ModelUrl = AutoModelForSequenceClassification.from_pretrained("kmack/malicious-url-detection")
-        self.tokenizerSpam = AutoTokenizer.from_pretrained("mshenoda/roberta-spam")
-        self.ModelSpam = AutoModelForSequenceClassification.from_pretrained("mshenoda/roberta-spam")
-        self.tokenizerTr_En = AutoTokenizer.from_pretrained("Helsinki-NLP/opus-mt-tc-big-tr-en")
-        self.modelTr_En = AutoModelForSeq2SeqLM.from_pretrained("Helsinki-NLP/opus-mt-tc-big-tr-en")
-        self.tokenizerToxic = AutoTokenizer.from_pretrained("cardiffnlp/twitter-roberta-base-offensive")
-        self.modelToxic = AutoModelForSequenceClassification.from_pretrained("cardiffnlp/twitter-roberta-base-offensive")
+    # Model, kademe veya liste değişikliğinden sonra çağrılır: model kaynaklı cache'ler boşalır,
+    # generation artar ve BatchModerator'daki eski verdict'ler geçersiz olur
+    def Invalidate(self):
+        self.translations.Clear()
+        self.url_verdicts.Clear()
+        self.bad_url_domains.Clear()
+        self.generation += 1
+
+    def IsReady(self):
+        return self.ready.is_set() and self.load_error is None
+
+    def WaitReady(self, timeout=None):
+        if not self.ready.wait(timeout):
+            raise TimeoutError("Moderation models are still loading")
+        if self.load_error is not None:
+            raise RuntimeError("Moderation models failed to load") from self.load_error
 
     def TR_EN(self,text):
-        textC = [text]
-        encoded = self.tokenizerTr_En(textC,return_tensors="pt",padding=True)
-        Translated = self.modelTr_En.generate(**encoded)
-        Translated = self.tokenizerTr_En.decode(Translated[0],skip_special_tokens = True)
-        return Translated
+        return self.TranslateBatch([text])[0]
+
+    # Her mesaj bir kez çevrilir, sonuç cache'den tüm sınıflandırıcılara paylaştırılır
+    def TranslateBatch(self,texts):
+        keys = [NormalizeText(t) for t in texts]
+        results = {}
+        missing = {}
+        for key in keys:
+            if key in results or key in missing:
+                continue
+            if self.translation_fast_path and not NeedsTranslation(key):
+                self.translation_skips += 1
+                results[key] = key
+                continue
+            cached = self.translations.Get(key)
+            if cached is None:
+                missing[key] = True
+            else:
+                results[key] = cached
+
+        if missing:
+            missing = list(missing)
+            for key, text in zip(missing, self._Translate(missing)):
+                self.translations.Put(key, text)
+                results[key] = text
+
+        return [results[key] for key in keys]
+
+    @Timed(MODEL_STAGE_SECONDS, "translate")
+    def _Translate(self,texts):
+        encoded = self.tokenizerTr_En(texts,return_tensors="pt",padding=True)
+        with torch.no_grad():
+            Translated = self.modelTr_En.generate(**encoded)
+        return self.tokenizerTr_En.batch_decode(Translated,skip_special_tokens = True)
+
+    def TranslationStats(self):
+        stats = self.translations.Stats()
+        stats['skipped'] = self.translation_skips
+        return stats
 
     def SpamDetector(self,message):
-        text = self.TR_EN(message)
-        inputs = self.tokenizerSpam(text,return_tensors="pt",truncation = True , padding = True)
+        return self.SpamBatch([self.TR_EN(message)])[0]
+
+    # texts: İngilizceye çevrilmiş mesajlar
+    @Timed(MODEL_STAGE_SECONDS, "spam")
+    def SpamBatch(self,texts):
+        inputs = self.tokenizerSpam(texts,return_tensors="pt",truncation = True , padding = True)
         with torch.no_grad():
             logits = self.ModelSpam(**inputs).logits
-        predicted_class = logits.argmax().item()
-        return (predicted_class == 1)
-    
+        predicted_class = logits.argmax(dim=-1).tolist()
+        return [c == 1 for c in predicted_class]
+
     def MaliciousUrl(self,text):
-        url_list = re.findall(r"https?://\S+",text)
-        for url in url_list:
-            inputs = self.tokenizerUrl(url,return_tensors="pt", truncation=True, padding=True)
-            with torch.no_grad():
-                logits = self.MaliciousUrl(**inputs).logits
-            predicted_class = logits.argmax().item()
-            if predicted_class == 1 :
-                return 1
-        
-        return 0
-    
+        url_list = URL_PATTERN.findall(text)
+        return 1 if any(self.UrlBatch(url_list)) else 0
+
+    # Bir veya daha fazla mesajdaki tüm URL'ler tek forward pass'te sınıflandırılır.
+    # Sonuçlar normalize URL'ye göre, kötü sonuçlar ayrıca kayıt edilebilir domaine göre cache'lenir.
+    def UrlBatch(self,urls):
+        normalized = [NormalizeUrl(u) for u in urls]
+        verdicts = {}
+        missing = []
+        for url in dict.fromkeys(normalized):
+            key = KeyedHash(self.secret, url)
+            cached = self.url_verdicts.Get(key)
+            if cached is not None:
+                verdicts[url] = cached
+                continue
+            domain = RegistrableDomain(UrlHost(url))
+            if domain not in SHARED_DOMAINS and self.bad_url_domains.Get(KeyedHash(self.secret, domain)):
+                verdicts[url] = True
+                self.url_verdicts.Put(key, True)
+                continue
+            missing.append((url, key, domain))
+
+        if missing:
+            for (url, key, domain), bad in zip(missing, self._ClassifyUrls([url for url, _, _ in missing])):
+                verdicts[url] = bad
+                self.url_verdicts.Put(key, bad)
+                if bad and domain not in SHARED_DOMAINS:
+                    self.bad_url_domains.Put(KeyedHash(self.secret, domain), True)
+
+        return [verdicts[url] for url in normalized]
+
+    @Timed(MODEL_STAGE_SECONDS, "url")
+    def _ClassifyUrls(self,urls):
+        inputs = self.tokenizerUrl(urls,return_tensors="pt", truncation=True, padding=True)
+        with torch.no_grad():
+            logits = self.ModelUrl(**inputs).logits
+        return [c == 1 for c in logits.argmax(dim=-1).tolist()]
+
+    def UrlStats(self):
+        return {'urls': self.url_verdicts.Stats(), 'domains': self.bad_url_domains.Stats()}
+
     def is_toxic(self,message):
         text = self.TR_EN(message)
         print(text)
-        inputs = self.tokenizerToxic(text, return_tensors="pt", padding=True)
+        return self.ToxicBatch([text])[0]
+
+    # texts: İngilizceye çevrilmiş mesajlar
+    @Timed(MODEL_STAGE_SECONDS, "toxic")
+    def ToxicBatch(self,texts):
+        inputs = self.tokenizerToxic(texts, return_tensors="pt", truncation=True, padding=True)
         with torch.no_grad():
             outputs = self.modelToxic(**inputs)
-        
-           
-    
+
         logits = outputs.logits
         probs = torch.nn.functional.softmax(logits, dim=1)
-        pred_index = torch.argmax(probs, dim=1).item()
-        return (pred_index == 1)
-        
+        pred_index = torch.argmax(probs, dim=1).tolist()
+        return [i == 1 for i in pred_index]
+
     # Backendde mesaj kontrol edilirken sadece bunun kullanılması yeter objeyi oluştur ve bunu çağır
     def IsBadMessage(self,message):
-        MaliciousUrl = self.MaliciousUrl(message)
-        SpamMessage = self.SpamDetector(message)
-        Toxic = self.is_toxic(message)
+        return self.IsBadMessages([message])[0]
+
+    # Aynı anda gelen mesajları tek bir padded batch olarak değerlendirir.
+    # Kademeler sırayla çalışır, kesin karar veren kademeden sonra mesaj diğerlerine gitmez.
+    @Timed(MODEL_STAGE_SECONDS, "cascade")
+    # deciders verilirse her mesaja karar veren kademe adıyla doldurulur (hiçbiri karar vermediyse None)
+    def IsBadMessages(self,messages,deciders=None):
+        self.WaitReady()
+        messages = list(messages)
+        verdicts = [None] * len(messages)
+        decided_by = [None] * len(messages)
+        pending = list(range(len(messages)))
+        translations = {}
+
+        for tier in self.tiers:
+            if not pending:
+                break
+            results = getattr(self, self.TIERS[tier])([messages[i] for i in pending], translations)
+            undecided = []
+            bad = safe = 0
+            for i, result in zip(pending, results):
+                if result is None:
+                    undecided.append(i)
+                    continue
+                verdicts[i] = result
+                decided_by[i] = tier
+                if result:
+                    bad += 1
+                else:
+                    safe += 1
+            with self.stats_lock:
+                stats = self.tier_stats[tier]
+                stats['checked'] += len(pending)
+                stats['bad'] += bad
+                stats['safe'] += safe
+            pending = undecided
+
+        if deciders is not None:
+            deciders[:] = decided_by
+        return [bool(v) for v in verdicts]
+
+    def CascadeStats(self):
+        with self.stats_lock:
+            report = {}
+            for tier in self.tiers:
+                stats = dict(self.tier_stats[tier])
+                decided = stats['bad'] + stats['safe']
+                stats['hit_rate'] = (decided / stats['checked']) if stats['checked'] else 0.0
+                report[tier] = stats
+            return report
+
+    def _Translated(self,messages,translations):
+        missing = [m for m in dict.fromkeys(messages) if m not in translations]
+        if missing:
+            translations.update(zip(missing, self.TranslateBatch(missing)))
+        return [translations[m] for m in messages]
+
+    # Kademe metodları: True kötü, False temiz, None kararsız
+    def _PreFilterTier(self,messages,translations):
+        return [self.prefilter.Check(m) for m in messages]
+
+    def _UrlTier(self,messages,translations):
+        url_lists = [URL_PATTERN.findall(m) for m in messages]
+        verdicts = self.UrlBatch([url for urls in url_lists for url in urls])
+        results = []
+        start = 0
+        for urls in url_lists:
+            results.append(True if any(verdicts[start:start + len(urls)]) else None)
+            start += len(urls)
+        return results
+
+    def _SpamTier(self,messages,translations):
+        return [True if bad else None for bad in self.SpamBatch(self._Translated(messages, translations))]
+
+    def _ToxicTier(self,messages,translations):
+        return [True if bad else None for bad in self.ToxicBatch(self._Translated(messages, translations))]
+
+
+class VerdictCache:
+    """Bounded TTL cache of moderation verdicts keyed by a keyed hash of the message.
+
+    Only HMAC-SHA256 digests (with a per-process random key) and booleans are kept,
+    never message text. Entries from an older model generation count as misses.
+    """
+
+    def __init__(self, max_size=Config.VERDICT_CACHE_SIZE, ttl=Config.VERDICT_CACHE_TTL):
+        self.secret = os.urandom(32)
+        self.cache = TTLCache(max_size, ttl)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def Key(self, message):
+        return KeyedHash(self.secret, NormalizeText(message))
+
+    def Get(self, key, generation):
+        entry = self.cache.Get(key)
+        hit = entry is not None and entry[0] == generation
+        # Submit birden fazla thread'den çağrılır
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry[1] if hit else None
+
+    def Put(self, key, generation, verdict):
+        self.cache.Put(key, (generation, verdict))
+
+    def Clear(self):
+        self.cache.Clear()
+
+    def Stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'size': self.cache.Stats()['size'],
+            'max_size': self.cache.max_size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / lookups) if lookups else 0.0
+        }
+
+class BatchModerator:
+    """Collects messages from concurrent senders and moderates them in batches.
+
+    A batch is closed when `window_ms` has passed since its first message or
+    when it holds `max_batch` messages, whichever comes first. Each caller
+    gets its own verdict back through a Future. Repeated messages are answered
+    from a VerdictCache without waiting for a batch.
+    """
+
+    def __init__(self, models, window_ms=5, max_batch=16, max_pending=1024, verdicts=None):
+        self.models = models
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.verdicts = verdicts if verdicts is not None else VerdictCache()
+        self.coalesced = 0
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.worker = threading.Thread(target=self._Run, name="moderation-batcher")
+        self.worker.daemon = True
+        self.worker.start()
+
+    def Submit(self, message):
+        future = Future()
+        key = self.verdicts.Key(message)
+        verdict = self.verdicts.Get(key, self.models.generation)
+        if verdict is not None:
+            if verdict:
+                BLOCKED_MESSAGES.Inc("verdict_cache")
+            future.set_result(verdict)
+            return future
+        self.pending.put((message, key, future))
+        return future
+
+    def IsBadMessage(self, message, timeout=None):
+        return self.Submit(message).result(timeout)
+
+    # Model ya da eşik değişince eski kararlar kullanılmasın
+    def InvalidateVerdicts(self):
+        self.verdicts.Clear()
+
+    def Stats(self):
+        stats = self.verdicts.Stats()
+        stats['coalesced'] = self.coalesced
+        stats['queued'] = self.pending.qsize()
+        return stats
+
+    def _NextBatch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _Run(self):
+        while True:
+            # Aynı batch içindeki aynı mesajlar modele bir kez gider
+            groups = {}
+            for message, key, f in self._NextBatch():
+                if f.set_running_or_notify_cancel():
+                    groups.setdefault(key, (message, []))[1].append(f)
+            if not groups:
+                continue
+            self.coalesced += sum(len(futures) - 1 for _, futures in groups.values())
+
+            generation = self.models.generation
+            keys = list(groups)
+            deciders = []
+            try:
+                verdicts = self.models.IsBadMessages([groups[k][0] for k in keys], deciders)
+            except Exception:
+                # Tek bir sorunlu mesaj tüm batch'i düşürmesin, tek tek dene
+                self._RunEach(groups, generation)
+                continue
+            for key, verdict, decider in zip(keys, verdicts, deciders):
+                self._Resolve(key, generation, verdict, decider, groups[key][1])
 
-        return ( MaliciousUrl | SpamMessage | Toxic )
+    def _RunEach(self, groups, generation):
+        for key, (message, futures) in groups.items():
+            deciders = []
+            try:
+                verdict = self.models.IsBadMessages([message], deciders)[0]
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            self._Resolve(key, generation, verdict, deciders[0], futures)
 
+    # Engellenen mesajlar kesin karardan sonra bir kez sayılır: modele giden kopya karar veren kademeyle,
+    # aynı batch'teki diğer kopyalar cache'den cevaplanmış gibi
+    def _Resolve(self, key, generation, verdict, decider, futures):
+        self.verdicts.Put(key, generation, verdict)
+        if verdict:
+            BLOCKED_MESSAGES.Inc(decider or "unknown")
+            if len(futures) > 1:
+                BLOCKED_MESSAGES.Inc("verdict_cache", amount=len(futures) - 1)
+        for f in futures:
+            f.set_result(verdict)
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+from Tracing import NULL_TRACE
+
+class MessagePipeline:
+    """Moderates chat messages off the Socket.IO handler threads.
+
+    Verdicts come from the moderator in any order, but `finish(job, is_bad, error)`
+    is called for the messages of one chat strictly in the order they were submitted.
+    A job dict may carry a 'trace'; the verdict and the start of finish are lapped on it.
+    """
+
+    def __init__(self, moderator, finish, workers=4, max_pending=1024, max_pending_per_chat=64):
+        self.moderator = moderator
+        self.finish = finish
+        self.max_pending = max_pending
+        self.max_pending_per_chat = max_pending_per_chat
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="message-pipeline")
+        self.chats = {}        # chat_id -> deque([future, job])
+        self.draining = set()  # finish sırası bozulmasın diye her chat'i aynı anda tek worker boşaltır
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    # False: kuyruk dolu, mesaj kabul edilmedi
+    def Submit(self, chat_id, message, job):
+        with self.lock:
+            chat_queue = self.chats.setdefault(chat_id, deque())
+            if self.pending >= self.max_pending or len(chat_queue) >= self.max_pending_per_chat:
+                if not chat_queue:
+                    del self.chats[chat_id]
+                return False
+            entry = [None, job]
+            chat_queue.append(entry)
+            self.pending += 1
+
+        # Zaten tamamlanmış bir future'ın callback'i hemen çağrılır, lock dışında olmalı
+        try:
+            future = self.moderator.Submit(message)
+        except Exception:
+            # Kayıt kuyrukta kalırsa chat'in sonraki mesajları hiç bitmez; arkasında bekleyenler
+            # bu kayıt yüzünden boşaltılmamış olabilir
+            with self.lock:
+                chat_queue.remove(entry)
+                self.pending -= 1
+                if not chat_queue:
+                    self.chats.pop(chat_id, None)
+                waiting = bool(chat_queue)
+            if waiting:
+                self._Schedule(chat_id)
+            raise
+        entry[0] = future
+        future.add_done_callback(lambda _: self._Verdict(chat_id, job))
+        return True
+
+    def Pending(self):
+        with self.lock:
+            return self.pending
+
+    def _Verdict(self, chat_id, job):
+        job.get('trace', NULL_TRACE).Lap('moderation')
+        self._Schedule(chat_id)
+
+    def _Schedule(self, chat_id):
+        with self.lock:
+            if chat_id in self.draining:
+                return
+            self.draining.add(chat_id)
+        self.executor.submit(self._Drain, chat_id)
+
+    def _Drain(self, chat_id):
+        while True:
+            with self.lock:
+                chat_queue = self.chats.get(chat_id)
+                if not chat_queue or chat_queue[0][0] is None or not chat_queue[0][0].done():
+                    self.draining.discard(chat_id)
+                    if chat_queue is not None and not chat_queue:
+                        del self.chats[chat_id]
+                    return
+                future, job = chat_queue.popleft()
+                self.pending -= 1
+
+            error = future.exception()
+            # Aynı chat'te önceki mesajların bitmesini bekleme süresi
+            job.get('trace', NULL_TRACE).Lap('ordering')
+            try:
+                self.finish(job, None if error else future.result(), error)
+            except Exception as e:
+                print(f"Error finishing message for chat {chat_id}: {str(e)}")
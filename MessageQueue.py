@@ -0,0 +1,124 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+class SQLiteQueue:
+    """Append-only SQLite table used as a pub/sub channel by the workers of one host.
+
+    Publishers insert rows; each listener polls for rows newer than the last
+    one it has seen. Rows older than `retention` seconds are deleted now and then.
+    """
+
+    def __init__(self, path, channel, retention=60):
+        self.path = path
+        self.channel = channel
+        self.retention = retention
+        self.local = threading.local()
+        self.published = 0
+        self._Connection().executescript("""
+            CREATE TABLE IF NOT EXISTS Queue (
+                Id INTEGER PRIMARY KEY AUTOINCREMENT,
+                Channel TEXT,
+                Created REAL,
+                Payload TEXT
+            );
+        """)
+
+    def _Connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def Publish(self, data):
+        conn = self._Connection()
+        now = time.time()
+        conn.execute("INSERT INTO Queue (Channel, Created, Payload) VALUES (?, ?, ?)",
+                     (self.channel, now, json.dumps(data)))
+        self.published += 1
+        if self.published % 1000 == 0:
+            conn.execute("DELETE FROM Queue WHERE Created<?", (now - self.retention,))
+
+    def LastId(self):
+        return self._Connection().execute("SELECT COALESCE(MAX(Id), 0) FROM Queue").fetchone()[0]
+
+    def Since(self, last_id):
+        return self._Connection().execute(
+            "SELECT Id, Payload FROM Queue WHERE Id>? AND Channel=? ORDER BY Id", (last_id, self.channel)).fetchall()
+
+class SQLiteManager(socketio.PubSubManager):
+    """Socket.IO client manager that relays emits between workers through SQLiteQueue.
+
+    Stand-in for the Redis/RabbitMQ managers when all workers run on one host;
+    delivery latency is about one `poll` interval.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, poll=0.01):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = SQLiteQueue(url[len('sqlite:///'):], channel)
+        self.poll = poll
+
+    def _publish(self, data):
+        self.queue.Publish(data)
+
+    def _listen(self):
+        last_id = self.queue.LastId()
+        while True:
+            rows = self.queue.Since(last_id)
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                time.sleep(self.poll)
+
+class AsyncSQLiteManager(AsyncPubSubManager):
+    """SQLiteManager for the asyncio server; queries run in the default executor."""
+    name = 'aiosqlite'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, poll=0.01):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = SQLiteQueue(url[len('sqlite:///'):], channel)
+        self.poll = poll
+
+    async def _publish(self, data):
+        await asyncio.get_running_loop().run_in_executor(None, self.queue.Publish, data)
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        last_id = await loop.run_in_executor(None, self.queue.LastId)
+        while True:
+            rows = await loop.run_in_executor(None, self.queue.Since, last_id)
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                await asyncio.sleep(self.poll)
+
+# SOCKETIO_MESSAGE_QUEUE adresine göre client manager; None: tek süreç, kuyruk yok
+def ClientManager(url, asynchronous=False, poll=0.01):
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return (AsyncSQLiteManager if asynchronous else SQLiteManager)(url, poll=poll)
+    if asynchronous:
+        if url.startswith(('redis://', 'rediss://')):
+            return socketio.AsyncRedisManager(url)
+        if url.startswith(('amqp://', 'amqps://')):
+            return socketio.AsyncAioPikaManager(url)
+        raise ValueError(f"Unsupported message queue for the asyncio server: {url}")
+    if url.startswith(('redis://', 'rediss://')):
+        return socketio.RedisManager(url)
+    if url.startswith('kafka://'):
+        return socketio.KafkaManager(url)
+    if url.startswith('zmq'):
+        return socketio.ZmqManager(url)
+    return socketio.KombuManager(url)
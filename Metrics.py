@@ -0,0 +1,171 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import time
+
+# Saniye cinsinden gecikme kovaları
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MODEL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _Escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _Labels(names, values, extra=()):
+    pairs = [f'{n}="{_Escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _Number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Prometheus histogram with optional labels.
+
+    Observe() does one bisect and a few additions under a lock; the
+    cumulative bucket counts are only built when the registry is rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}   # label değerleri -> [kova sayaçları..., +Inf, toplam]
+        self.lock = threading.Lock()
+
+    def Observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def Time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.Observe(time.perf_counter() - start, *labels)
+
+    def Render(self):
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        lines = []
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="%s"' % _Number(bound)
+                lines.append(f"{self.name}_bucket{_Labels(self.labels, labels, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_Labels(self.labels, labels)} {_Number(values[-1])}")
+            lines.append(f"{self.name}_count{_Labels(self.labels, labels)} {cumulative}")
+        return lines
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def Inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def Render(self):
+        with self.lock:
+            values = dict(self.values)
+        return [f"{self.name}{_Labels(self.labels, labels)} {_Number(value)}" for labels, value in sorted(values.items())]
+
+class Gauge:
+    """Gauge whose value is read from `function` when the registry is rendered."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def Render(self):
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {str(e)}")
+            return []
+        return [f"{self.name} {_Number(value)}"]
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _Add(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def Histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._Add(Histogram(name, documentation, labels, buckets))
+
+    def Counter(self, name, documentation, labels=()):
+        return self._Add(Counter(name, documentation, labels))
+
+    # Gauge'lar her render'da fonksiyondan okunur; aynı isimle tekrar kayıt fonksiyonu değiştirir
+    def Gauge(self, name, documentation, function):
+        gauge = Gauge(name, documentation, function)
+        with self.lock:
+            self.metrics[name] = gauge
+        return gauge
+
+    # Prometheus text exposition format (0.0.4)
+    def Render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.Render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SOCKET_EVENT_SECONDS = REGISTRY.Histogram(
+    "supersecret_socketio_event_seconds", "Socket.IO event handler duration", ["event"])
+HTTP_REQUEST_SECONDS = REGISTRY.Histogram(
+    "supersecret_http_request_seconds", "REST route duration", ["route", "method", "status"])
+DB_CALL_SECONDS = REGISTRY.Histogram(
+    "supersecret_db_call_seconds", "DB method duration", ["method"])
+MODEL_STAGE_SECONDS = REGISTRY.Histogram(
+    "supersecret_model_stage_seconds", "Moderation stage duration per batch", ["stage"], MODEL_BUCKETS)
+BLOCKED_MESSAGES = REGISTRY.Counter(
+    "supersecret_blocked_messages_total", "Messages blocked by moderation, by deciding tier", ["reason"])
+DB_WRITE_FAILURES = REGISTRY.Counter(
+    "supersecret_db_write_failures_total", "Write-behind messages that could not be written")
+
+# Metodun süresini histograma metod adıyla (ya da verilen etiketle) yazar
+def Timed(histogram, label=None):
+    def decorator(f):
+        name = label or f.__name__
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                histogram.Observe(time.perf_counter() - start, name)
+        return decorated
+    return decorator
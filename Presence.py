@@ -0,0 +1,141 @@
+import threading
+import time
+from config import Config
+from DataBase import UserAvatar
+
+STATUSES = ('idle', 'busy', 'offline')
+
+class PresenceRegistry:
+    """Owner of every user's idle/busy/offline status.
+
+    Statuses live in the shared state (MemoryState or SQLiteState), so every
+    worker sees the same statuses and one version sequence. Status changes never
+    touch the users table on the request path; dirty entries are written to
+    Users.Status in one batch every `persist_interval` seconds (0 disables
+    persistence entirely).
+    """
+
+    def __init__(self, db, state, persist_interval=Config.PRESENCE_PERSIST_INTERVAL):
+        self.db = db
+        self.state = state
+        self.persist_interval = persist_interval
+        self.lock = threading.Lock()
+        self.dirty = {}
+        self.stop = threading.Event()
+        # Yayınlanmamış değişiklikler: delta_base'den sonraki versiyonlar
+        self.changed = threading.Event()
+
+        # Durumu bilinmeyen kullanıcılar offline başlar; DB'de kalan eski durumlar düzeltilir
+        users = db.GetAllUsers()
+        state.InitStatuses([user['username'] for user in users], 'offline')
+        self.delta_base, current = state.Statuses()
+        current = dict(current)
+        for user in users:
+            if user['status'] != current.get(user['username']):
+                self.dirty[user['username']] = current.get(user['username'])
+
+        if persist_interval > 0:
+            self.thread = threading.Thread(target=self._PersistLoop, name="presence-persist")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def Add(self, username, status='offline'):
+        self.state.SetStatus(username, status)
+        with self.lock:
+            self.dirty.pop(username, None)
+        self.changed.set()
+
+    def Set(self, username, status):
+        if status not in STATUSES:
+            raise ValueError(f"Invalid status: {status}")
+        if self.state.SetStatus(username, status) is None:
+            return False
+        with self.lock:
+            self.dirty[username] = status
+        self.changed.set()
+        return True
+
+    # (versiyon, kullanıcı listesi) aynı anda alınır, istemci deltaları buradan devam ettirir
+    def Snapshot(self):
+        version, items = self.state.Statuses()
+        return version, [{'username': u, 'status': s, 'avatar': UserAvatar(u)} for u, s in items]
+
+    # Son yayından beri değişenler: kullanıcı başına sadece son durum
+    def TakeDelta(self):
+        self.changed.clear()
+        version, items = self.state.StatusesSince(self.delta_base)
+        if not items:
+            return None
+        delta = {
+            'from_version': self.delta_base,
+            'version': version,
+            'changes': [{'username': u, 'status': s, 'avatar': UserAvatar(u)} for u, s in items]
+        }
+        self.delta_base = version
+        return delta
+
+    def Get(self, username):
+        status = self.state.GetStatus(username)
+        if status is None:
+            return None
+        return {'username': username, 'status': status, 'avatar': UserAvatar(username)}
+
+    # DB.GetAllUsers ile aynı biçim, tablo taraması yok
+    def Users(self):
+        return self.Snapshot()[1]
+
+    def Persist(self):
+        with self.lock:
+            changes, self.dirty = self.dirty, {}
+        if not changes:
+            return
+        try:
+            self.db.SetUserStatuses(changes.items())
+        except Exception as e:
+            print(f"Error persisting user statuses: {str(e)}")
+            with self.lock:
+                for username, status in changes.items():
+                    self.dirty.setdefault(username, status)
+
+    def _PersistLoop(self):
+        while not self.stop.wait(self.persist_interval):
+            self.Persist()
+
+    def Close(self):
+        self.stop.set()
+        if self.persist_interval > 0:
+            self.Persist()
+
+class PresenceBroadcaster:
+    """Coalesces presence changes and broadcasts them as versioned deltas.
+
+    After the first change the broadcaster waits `debounce` seconds, then sends
+    everything that changed in that window as a single `presenceDelta` event.
+    With several workers only the holder of the broadcast lease sends, and it
+    polls every `poll` seconds for changes made by the other workers.
+    """
+
+    def __init__(self, registry, emit, debounce=Config.PRESENCE_BROADCAST_MS / 1000.0, poll=None, owner=None):
+        self.registry = registry
+        self.emit = emit
+        self.debounce = debounce
+        self.poll = poll
+        self.owner = owner
+        self.thread = threading.Thread(target=self._Run, name="presence-broadcast")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _Run(self):
+        while True:
+            self.registry.changed.wait(self.poll)
+            time.sleep(self.debounce)
+            try:
+                # Kira birkaç tur boyunca geçerli: lider çökerse başka worker devralır
+                if not self.registry.state.TryLease('presence-broadcast', self.owner, max(1.0, 5 * (self.poll or 0))):
+                    self.registry.changed.clear()
+                    continue
+                delta = self.registry.TakeDelta()
+                if delta:
+                    self.emit(delta)
+            except Exception as e:
+                print(f"Error broadcasting presence: {str(e)}")
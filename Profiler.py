@@ -0,0 +1,117 @@
+from collections import Counter
+from datetime import datetime
+import os
+import sys
+import threading
+import time
+
+# Yaprak frame'i bunlardan biriyse thread boşta bekliyordur (lock, kuyruk, select, sleep).
+# Sadece kütüphane frame'leri: C'de bekleyen çağrılar (time.sleep, SimpleQueue.get) stack'te görünmez,
+# yaprak onları çağıran frame olur. Bu yüzden arka plan döngüleri time.sleep yerine Event/Condition ile bekler.
+IDLE_FRAMES = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('queue.py', 'get'),
+    ('selectors.py', 'select'), ('socket.py', 'accept'), ('socket.py', 'readinto'), ('socketserver.py', 'serve_forever'),
+    ('thread.py', '_worker'), ('server.py', 'sleep')
+}
+
+class StackSampler:
+    """Time-boxed stack-sampling profiler for the live process.
+
+    Every `interval` seconds the Python stacks of all threads are read with
+    sys._current_frames() and counted. Unlike cProfile, which only sees the
+    thread that enabled it, this covers the handler, moderation and pipeline
+    threads at once, and costs nothing while no profile is running.
+
+    Each profile writes two files to `directory`: collapsed stacks
+    (`.folded`, the input format of flamegraph.pl and speedscope) and a
+    text summary of the functions with the most samples.
+    """
+
+    def __init__(self, directory, interval=0.005, max_seconds=60):
+        self.directory = directory
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.running = None
+        self.last = None
+        self.lock = threading.Lock()
+
+    # Profil arka planda alınır; zaten çalışan bir profil varsa None döner
+    def Start(self, seconds, include_idle=False):
+        seconds = max(0.1, min(float(seconds), self.max_seconds))
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        with self.lock:
+            if self.running is not None:
+                return None
+            self.running = {'path': path, 'seconds': seconds, 'started': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            # Kısa profil _Run'da lock dışında bitip running'i silebilir
+            profile = dict(self.running)
+        sampler = threading.Thread(target=self._Run, args=(path, seconds, include_idle), name="stack-sampler")
+        sampler.daemon = True
+        sampler.start()
+        return profile
+
+    def Status(self):
+        with self.lock:
+            return {'running': dict(self.running) if self.running else None, 'last': self.last}
+
+    def _Run(self, path, seconds, include_idle):
+        stacks = Counter()
+        samples = idle = 0
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = self._Stack(frame)
+                    if not include_idle and stack[-1][:2] in IDLE_FRAMES:
+                        idle += 1
+                        continue
+                    stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+                samples += 1
+                time.sleep(self.interval)
+            self._Write(path, stacks, samples, idle, seconds)
+            result = {'path': path, 'samples': samples, 'error': None}
+        except Exception as e:
+            print(f"Error in profiler: {str(e)}")
+            result = {'path': path, 'samples': samples, 'error': str(e)}
+        with self.lock:
+            self.running = None
+            self.last = result
+
+    @staticmethod
+    def _Stack(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _Write(self, path, stacks, samples, idle, seconds):
+        with open(path + ".folded", "w", encoding="utf-8") as f:
+            for (thread, stack), count in stacks.most_common():
+                frames = [thread] + [f"{name} ({file}:{line})" for file, name, line in stack]
+                f.write(";".join(frame.replace(";", ",") for frame in frames) + f" {count}\n")
+
+        # Özet satır numarasız, fonksiyon başına; recursive fonksiyonlar bir örnekte bir kez sayılır
+        inclusive = Counter()
+        exclusive = Counter()
+        for (_, stack), count in stacks.items():
+            for function in set(f"{name} ({file})" for file, name, _ in stack):
+                inclusive[function] += count
+            file, name, _ = stack[-1]
+            exclusive[f"{name} ({file})"] += count
+        busy = sum(stacks.values())
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"{samples} ticks over {seconds:.1f}s, every {self.interval * 1000:.1f} ms; "
+                    f"{busy} busy thread samples, {idle} idle samples skipped\n\n")
+            for title, counts in (("Most samples including callees", inclusive), ("Most samples in the function itself", exclusive)):
+                f.write(f"{title}:\n")
+                for function, count in counts.most_common(30):
+                    f.write(f"{count:>8} {count / busy if busy else 0:>7.1%}  {function}\n")
+                f.write("\n")
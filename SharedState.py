@@ -0,0 +1,455 @@
+from contextlib import contextmanager
+import heapq
+import sqlite3
+import threading
+import time
+
+class _Session:
+    __slots__ = ('sid', 'connected', 'worker')
+
+    def __init__(self, sid, connected, worker):
+        self.sid = sid
+        self.connected = connected
+        self.worker = worker
+
+class _Chat:
+    __slots__ = ('chat_id', 'other_user')
+
+    def __init__(self, chat_id, other_user):
+        self.chat_id = chat_id
+        self.other_user = other_user
+
+class _Request:
+    __slots__ = ('sender', 'target', 'expires')
+
+    def __init__(self, sender, target, expires):
+        self.sender = sender
+        self.target = target
+        self.expires = expires
+
+class MemoryState:
+    """Session, chat, request and presence state of a single process.
+
+    Records are slotted objects indexed by username, by sid and by chat id,
+    all updated together under one lock, so every multi-key operation is
+    atomic. Chat requests also sit in a heap ordered by expiry time, so
+    expiring them only pops the ones that are due.
+
+    SQLiteState has the same interface and lets several worker processes on
+    one host share the state.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)  # daha erken biten istek eklenince süre döngüsünü uyandırır
+        self.sessions = {}   # username -> _Session
+        self.sids = {}       # bağlı sid -> username
+        self.chats = {}      # username -> _Chat
+        self.members = {}    # chat_id -> {username, ...}
+        self.requests = {}   # request_id -> _Request
+        self.expiry = []     # (expires, request_id) heap; alınan isteklerin girdisi süresi gelince atılır
+        self.statuses = {}   # username -> (status, version)
+        self.version = 0
+
+    # Tek süreç: her zaman ilk (ve tek) worker
+    def RegisterWorker(self, worker, ttl=30):
+        return True
+
+    def Heartbeat(self, worker):
+        pass
+
+    def TakeDeadWorker(self, ttl):
+        return None, []
+
+    def TryLease(self, name, owner, ttl):
+        return True
+
+    def Reset(self):
+        with self.lock:
+            self.sessions.clear()
+            self.sids.clear()
+            self.chats.clear()
+            self.members.clear()
+            self.requests.clear()
+            self.expiry.clear()
+            self.statuses.clear()
+
+    # Yeni oturumu kaydeder; kullanıcının önceki bağlı oturumunun sid'ini döndürür
+    def SetSession(self, username, sid, worker=None):
+        with self.lock:
+            old = self.sessions.get(username)
+            if old is not None:
+                self.sids.pop(old.sid, None)
+            self.sessions[username] = _Session(sid, True, worker)
+            self.sids[sid] = username
+        return old.sid if old else None
+
+    def GetSession(self, username):
+        with self.lock:
+            session = self.sessions.get(username)
+            return {'sid': session.sid, 'connected': session.connected, 'worker': session.worker} if session else None
+
+    # Sadece güncel oturum ise bağlantısız işaretlenir
+    def SetDisconnected(self, username, sid):
+        with self.lock:
+            session = self.sessions.get(username)
+            if session is None or session.sid != sid:
+                return False
+            session.connected = False
+            self.sids.pop(sid, None)
+            return True
+
+    def GetChat(self, username):
+        with self.lock:
+            chat = self.chats.get(username)
+            return {'chat_id': chat.chat_id, 'other_user': chat.other_user} if chat else None
+
+    # Bağlı sid'in kullanıcısı ve (varsa) chat'i
+    def ChatOfSid(self, sid):
+        with self.lock:
+            username = self.sids.get(sid)
+            chat = self.chats.get(username)
+            if chat is None:
+                return None
+            return {'username': username, 'chat_id': chat.chat_id, 'other_user': chat.other_user}
+
+    def SetChat(self, username, chat_id, other_user):
+        with self.lock:
+            self._Unlink(username)
+            self._Link(username, str(chat_id), other_user)
+
+    # "Zihin meşgul" kilidi: iki kullanıcı da boştaysa ikisi birden chat'e alınır
+    def ClaimChat(self, user1, user2, chat_id):
+        with self.lock:
+            if user1 in self.chats or user2 in self.chats:
+                return False
+            self._Link(user1, str(chat_id), user2)
+            self._Link(user2, str(chat_id), user1)
+            return True
+
+    # Kullanıcının ve karşı tarafın chat kaydı silinir; karşı tarafın adı döner
+    def ReleaseChat(self, username):
+        with self.lock:
+            chat = self._Unlink(username)
+            if chat is None:
+                return None
+            self._Unlink(chat.other_user)
+            return chat.other_user
+
+    # _Link/_Unlink lock altında çağrılır; chat_id indeksi kullanıcı kaydıyla birlikte güncellenir
+    def _Link(self, username, chat_id, other_user):
+        self.chats[username] = _Chat(chat_id, other_user)
+        self.members.setdefault(chat_id, set()).add(username)
+
+    def _Unlink(self, username):
+        chat = self.chats.pop(username, None)
+        if chat is not None:
+            members = self.members.get(chat.chat_id)
+            members.discard(username)
+            if not members:
+                del self.members[chat.chat_id]
+        return chat
+
+    # Metrikler için: (aktif chat sayısı, bekleyen istek sayısı)
+    def Counts(self):
+        with self.lock:
+            return len(self.members), len(self.requests)
+
+    # expires: epoch saniyesi (time.time())
+    def AddRequest(self, request_id, sender, target, expires):
+        with self.lock:
+            earlier = not self.expiry or expires < self.expiry[0][0]
+            self.requests[request_id] = _Request(sender, target, expires)
+            heapq.heappush(self.expiry, (expires, request_id))
+            if earlier:
+                self.wakeup.notify_all()
+
+    # İsteği sadece hedef kullanıcı, sadece bir kez ve süresi dolmadan alabilir
+    def TakeRequest(self, request_id, target):
+        with self.lock:
+            request = self.requests.get(request_id)
+            if request is None or request.target != target or request.expires <= time.time():
+                return None
+            del self.requests[request_id]
+            return {'sender': request.sender, 'target': request.target}
+
+    # Sadece süresi gelmiş girdiler heap'ten alınır
+    def ExpireRequests(self, now):
+        expired = 0
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now:
+                expires, request_id = heapq.heappop(self.expiry)
+                request = self.requests.get(request_id)
+                if request is not None and request.expires == expires:
+                    del self.requests[request_id]
+                    expired += 1
+        return expired
+
+    # En yakın istek son tarihi; bekleyen istek yoksa None
+    def NextRequestExpiry(self):
+        with self.lock:
+            return self._NextExpiry()
+
+    def _NextExpiry(self):
+        while self.expiry and self.expiry[0][1] not in self.requests:
+            heapq.heappop(self.expiry)
+        return self.expiry[0][0] if self.expiry else None
+
+    # En yakın son tarihe ya da en fazla max_wait saniye bekler; daha erken biten istek eklenirse hemen döner
+    def WaitForRequests(self, max_wait):
+        with self.lock:
+            next_expiry = self._NextExpiry()
+            wait = max_wait if next_expiry is None else min(max_wait, next_expiry - time.time())
+            if wait > 0:
+                self.wakeup.wait(wait)
+
+    # Değişmediyse None, değiştiyse yeni versiyon
+    def SetStatus(self, username, status):
+        with self.lock:
+            current = self.statuses.get(username)
+            if current is not None and current[0] == status:
+                return None
+            self.version += 1
+            self.statuses[username] = (status, self.version)
+            return self.version
+
+    # Başlangıç: durumu bilinmeyen kullanıcılar eklenir, diğer worker'ların yazdıkları korunur
+    def InitStatuses(self, usernames, status):
+        with self.lock:
+            for username in usernames:
+                if username not in self.statuses:
+                    self.version += 1
+                    self.statuses[username] = (status, self.version)
+
+    def GetStatus(self, username):
+        with self.lock:
+            current = self.statuses.get(username)
+            return current[0] if current else None
+
+    def Statuses(self):
+        with self.lock:
+            return self.version, [(u, s) for u, (s, _) in self.statuses.items()]
+
+    def StatusesSince(self, version):
+        with self.lock:
+            if self.version == version:
+                return version, []
+            return self.version, [(u, s) for u, (s, v) in self.statuses.items() if v > version]
+
+class SQLiteState:
+    """MemoryState backed by a SQLite file shared by the worker processes of one host.
+
+    Each operation is one IMMEDIATE transaction, so checks and updates that
+    span several users (the chat lock, taking a request) are atomic across
+    processes. Workers record heartbeats; the state of a worker that stops
+    beating is handed to a survivor by TakeDeadWorker.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        # Bu süreçte eklenen istek süre döngüsünü uyandırır; diğer worker'larınki için max_wait beklenir
+        self.wakeup = threading.Event()
+        # Her ifade idempotent; birden fazla worker aynı anda başlasa da güvenli
+        self._Connection().executescript("""
+            CREATE TABLE IF NOT EXISTS Workers (Worker TEXT PRIMARY KEY, Beat REAL);
+            CREATE TABLE IF NOT EXISTS Leases (Name TEXT PRIMARY KEY, Owner TEXT, Expires REAL);
+            CREATE TABLE IF NOT EXISTS Sessions (
+                UserName TEXT PRIMARY KEY, Sid TEXT, Connected INTEGER, Worker TEXT
+            );
+            CREATE INDEX IF NOT EXISTS Sessions_Worker ON Sessions (Worker);
+            CREATE INDEX IF NOT EXISTS Sessions_Sid ON Sessions (Sid);
+            CREATE TABLE IF NOT EXISTS Chats (UserName TEXT PRIMARY KEY, ChatID TEXT, OtherUser TEXT);
+            CREATE INDEX IF NOT EXISTS Chats_ChatID ON Chats (ChatID);
+            CREATE TABLE IF NOT EXISTS Requests (
+                RequestID TEXT PRIMARY KEY, Sender TEXT, Target TEXT, Expires REAL
+            );
+            CREATE INDEX IF NOT EXISTS Requests_Expires ON Requests (Expires);
+            CREATE TABLE IF NOT EXISTS Presence (UserName TEXT PRIMARY KEY, Status TEXT, Version INTEGER);
+            CREATE INDEX IF NOT EXISTS Presence_Version ON Presence (Version);
+            CREATE TABLE IF NOT EXISTS Meta (Key TEXT PRIMARY KEY, Value INTEGER);
+            INSERT OR IGNORE INTO Meta VALUES ('presence_version', 0);
+        """)
+
+    # Thread başına bir bağlantı; işlemler kısa olduğu için havuz gerekmez
+    def _Connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    # IMMEDIATE: yazma kilidi baştan alınır; okumalar DEFERRED ile tutarlı bir anlık görüntü okur
+    @contextmanager
+    def _Transaction(self, mode="IMMEDIATE"):
+        conn = self._Connection()
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _Query(self, query, params=(), one=False):
+        cursor = self._Connection().execute(query, params)
+        return cursor.fetchone() if one else cursor.fetchall()
+
+    # Canlı başka worker yoksa (ilk worker ya da hepsi çökmüş) True: durum sıfırlanmalı
+    def RegisterWorker(self, worker, ttl=30):
+        now = time.time()
+        with self._Transaction() as conn:
+            alive = conn.execute("SELECT COUNT(*) FROM Workers WHERE Beat>=? AND Worker!=?",
+                                 (now - ttl, worker)).fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO Workers VALUES (?, ?)", (worker, now))
+        return alive == 0
+
+    def Heartbeat(self, worker):
+        with self._Transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO Workers VALUES (?, ?)", (worker, time.time()))
+
+    # Sessiz kalan bir worker'ı siler; onun bağlı kullanıcılarını döndürür
+    def TakeDeadWorker(self, ttl):
+        with self._Transaction() as conn:
+            row = conn.execute("SELECT Worker FROM Workers WHERE Beat<? LIMIT 1", (time.time() - ttl,)).fetchone()
+            if row is None:
+                return None, []
+            users = [u for (u,) in conn.execute(
+                "SELECT UserName FROM Sessions WHERE Worker=? AND Connected=1", (row[0],))]
+            conn.execute("UPDATE Sessions SET Connected=0 WHERE Worker=?", (row[0],))
+            conn.execute("DELETE FROM Workers WHERE Worker=?", (row[0],))
+        return row[0], users
+
+    # Süreli kilit: sahibi yenilemezse ttl sonunda başkası alır
+    def TryLease(self, name, owner, ttl):
+        now = time.time()
+        with self._Transaction() as conn:
+            row = conn.execute("SELECT Owner, Expires FROM Leases WHERE Name=?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO Leases VALUES (?, ?, ?)", (name, owner, now + ttl))
+        return True
+
+    def Reset(self):
+        with self._Transaction() as conn:
+            for table in ("Sessions", "Chats", "Requests", "Presence", "Leases"):
+                conn.execute(f"DELETE FROM {table}")
+
+    def SetSession(self, username, sid, worker=None):
+        with self._Transaction() as conn:
+            old = conn.execute("SELECT Sid FROM Sessions WHERE UserName=?", (username,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO Sessions VALUES (?, ?, 1, ?)", (username, sid, worker))
+        return old[0] if old else None
+
+    def GetSession(self, username):
+        row = self._Query("SELECT Sid, Connected, Worker FROM Sessions WHERE UserName=?", (username,), one=True)
+        if row is None:
+            return None
+        return {'sid': row[0], 'connected': bool(row[1]), 'worker': row[2]}
+
+    def SetDisconnected(self, username, sid):
+        with self._Transaction() as conn:
+            return conn.execute("UPDATE Sessions SET Connected=0 WHERE UserName=? AND Sid=?",
+                                (username, sid)).rowcount > 0
+
+    def GetChat(self, username):
+        row = self._Query("SELECT ChatID, OtherUser FROM Chats WHERE UserName=?", (username,), one=True)
+        return {'chat_id': row[0], 'other_user': row[1]} if row else None
+
+    def ChatOfSid(self, sid):
+        row = self._Query("SELECT s.UserName, c.ChatID, c.OtherUser FROM Sessions s JOIN Chats c ON c.UserName=s.UserName "
+                          "WHERE s.Sid=? AND s.Connected=1", (sid,), one=True)
+        return {'username': row[0], 'chat_id': row[1], 'other_user': row[2]} if row else None
+
+    def SetChat(self, username, chat_id, other_user):
+        with self._Transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO Chats VALUES (?, ?, ?)", (username, str(chat_id), other_user))
+
+    def ClaimChat(self, user1, user2, chat_id):
+        with self._Transaction() as conn:
+            busy = conn.execute("SELECT COUNT(*) FROM Chats WHERE UserName IN (?, ?)", (user1, user2)).fetchone()[0]
+            if busy:
+                return False
+            conn.executemany("INSERT INTO Chats VALUES (?, ?, ?)",
+                             [(user1, str(chat_id), user2), (user2, str(chat_id), user1)])
+        return True
+
+    def ReleaseChat(self, username):
+        with self._Transaction() as conn:
+            row = conn.execute("SELECT OtherUser FROM Chats WHERE UserName=?", (username,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM Chats WHERE UserName IN (?, ?)", (username, row[0]))
+        return row[0]
+
+    def Counts(self):
+        chats = self._Query("SELECT COUNT(DISTINCT ChatID) FROM Chats", one=True)[0]
+        requests = self._Query("SELECT COUNT(*) FROM Requests", one=True)[0]
+        return chats, requests
+
+    def AddRequest(self, request_id, sender, target, expires):
+        with self._Transaction() as conn:
+            conn.execute("INSERT INTO Requests VALUES (?, ?, ?, ?)", (request_id, sender, target, expires))
+        self.wakeup.set()
+
+    def TakeRequest(self, request_id, target):
+        with self._Transaction() as conn:
+            row = conn.execute("DELETE FROM Requests WHERE RequestID=? AND Target=? AND Expires>? RETURNING Sender, Target",
+                               (request_id, target, time.time())).fetchone()
+        return {'sender': row[0], 'target': row[1]} if row else None
+
+    # Expires indeksi üzerinden aralık silme; tablo taranmaz
+    def ExpireRequests(self, now):
+        with self._Transaction() as conn:
+            return conn.execute("DELETE FROM Requests WHERE Expires<=?", (now,)).rowcount
+
+    def NextRequestExpiry(self):
+        return self._Query("SELECT MIN(Expires) FROM Requests", one=True)[0]
+
+    # Başka süreçlerin eklediği istekler bildirilemez; en fazla max_wait saniye beklenir
+    def WaitForRequests(self, max_wait):
+        self.wakeup.clear()
+        next_expiry = self.NextRequestExpiry()
+        wait = max_wait if next_expiry is None else min(max_wait, next_expiry - time.time())
+        if wait > 0:
+            self.wakeup.wait(wait)
+
+    def SetStatus(self, username, status):
+        with self._Transaction() as conn:
+            row = conn.execute("SELECT Status FROM Presence WHERE UserName=?", (username,)).fetchone()
+            if row is not None and row[0] == status:
+                return None
+            version = conn.execute(
+                "UPDATE Meta SET Value=Value+1 WHERE Key='presence_version' RETURNING Value").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO Presence VALUES (?, ?, ?)", (username, status, version))
+        return version
+
+    def InitStatuses(self, usernames, status):
+        with self._Transaction() as conn:
+            known = {u for (u,) in conn.execute("SELECT UserName FROM Presence")}
+            missing = [u for u in usernames if u not in known]
+            if not missing:
+                return
+            version = conn.execute("UPDATE Meta SET Value=Value+? WHERE Key='presence_version' RETURNING Value",
+                                   (len(missing),)).fetchone()[0]
+            conn.executemany("INSERT INTO Presence VALUES (?, ?, ?)", [(u, status, version) for u in missing])
+
+    def GetStatus(self, username):
+        row = self._Query("SELECT Status FROM Presence WHERE UserName=?", (username,), one=True)
+        return row[0] if row else None
+
+    # Okuma tek transaction'da: versiyon ve liste birbirini tutar
+    def Statuses(self):
+        with self._Transaction("DEFERRED") as conn:
+            version = conn.execute("SELECT Value FROM Meta WHERE Key='presence_version'").fetchone()[0]
+            return version, conn.execute("SELECT UserName, Status FROM Presence").fetchall()
+
+    def StatusesSince(self, version):
+        with self._Transaction("DEFERRED") as conn:
+            current = conn.execute("SELECT Value FROM Meta WHERE Key='presence_version'").fetchone()[0]
+            if current == version:
+                return version, []
+            return current, conn.execute("SELECT UserName, Status FROM Presence WHERE Version>?", (version,)).fetchall()
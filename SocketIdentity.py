@@ -0,0 +1,46 @@
+import threading
+import time
+
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+class SocketIdentities:
+    """Usernames bound to socket sids, verified once from the JWT at connect.
+
+    Later events only look the sid up and compare the token's `exp` with the
+    clock, instead of re-verifying the signature on every event.
+    """
+
+    def __init__(self, secret, algorithms=("HS256",)):
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.by_sid = {}
+        self.lock = threading.Lock()
+
+    # Token doğrulanamazsa jose'nin hatası olduğu gibi yükselir
+    def Bind(self, sid, token):
+        data = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        username = data['username']
+        expires = data.get('exp')
+        with self.lock:
+            self.by_sid[sid] = (username, float(expires) if expires is not None else None)
+        return username
+
+    # Süresi dolmuş token'da ExpiredSignatureError, bağlanırken doğrulanmamış sid'de JWTError
+    def Get(self, sid):
+        entry = self.by_sid.get(sid)
+        if entry is None:
+            raise JWTError("Socket is not authenticated")
+        username, expires = entry
+        if expires is not None and expires <= time.time():
+            raise ExpiredSignatureError("Signature has expired.")
+        return username
+
+    # Disconnect'te token süresi dolmuş olsa da kullanıcı adı döner
+    def Unbind(self, sid):
+        with self.lock:
+            entry = self.by_sid.pop(sid, None)
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self.by_sid)
@@ -0,0 +1,95 @@
+from collections import deque
+from datetime import datetime
+import json
+import random
+import threading
+import time
+import uuid
+
+class Trace:
+    """Timeline of one sampled request, split into consecutive spans.
+
+    Lap(name) closes the span that started at the previous lap (or at the
+    start), so a message that crosses threads only has to carry this object
+    along and call Lap() at each hand-over point.
+    """
+    __slots__ = ('trace_id', 'name', 'attributes', 'started', 'last', 'spans')
+
+    def __init__(self, name, attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started = self.last = time.perf_counter()
+        self.spans = []
+
+    def Lap(self, span):
+        now = time.perf_counter()
+        self.spans.append((span, self.last - self.started, now - self.last))
+        self.last = now
+
+    def Total(self):
+        return self.last - self.started
+
+    def ToDict(self):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'total_ms': round(self.Total() * 1000, 3),
+            'attributes': self.attributes,
+            'spans': [{'span': span, 'offset_ms': round(offset * 1000, 3), 'ms': round(duration * 1000, 3)}
+                      for span, offset, duration in self.spans]
+        }
+
+class _NullTrace:
+    """Returned for requests that were not sampled; every call is a no-op."""
+    __slots__ = ()
+
+    def Lap(self, span):
+        pass
+
+    def __bool__(self):
+        return False
+
+NULL_TRACE = _NullTrace()
+
+class Tracer:
+    """Samples requests for span tracing and logs the slow ones.
+
+    A `sample_rate` fraction of requests get a Trace. Finished traces longer
+    than `slow_ms` are appended to `slow_log` as one JSON line each and kept
+    in memory (the last `keep` of them) for the admin endpoint.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=500, slow_log=None, keep=100):
+        self.sample_rate = sample_rate
+        self.slow = slow_ms / 1000.0
+        self.slow_log = slow_log
+        self.recent_slow = deque(maxlen=keep)
+        self.sampled = 0
+        self.lock = threading.Lock()
+
+    def Start(self, name, **attributes):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NULL_TRACE
+        # Start birçok handler thread'inden çağrılır
+        with self.lock:
+            self.sampled += 1
+        return Trace(name, attributes)
+
+    def Finish(self, trace):
+        if not trace or trace.Total() < self.slow:
+            return
+        record = trace.ToDict()
+        with self.lock:
+            self.recent_slow.append(record)
+            if self.slow_log:
+                try:
+                    with open(self.slow_log, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    print(f"Error writing slow request log: {str(e)}")
+
+    def RecentSlow(self):
+        with self.lock:
+            return list(self.recent_slow)
@@ -1,5 +1,5 @@
-from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
+from flask import Flask, request, jsonify, g, Response
+from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import sqlite3
 from datetime import datetime, timedelta
@@ -8,30 +8,138 @@ from DataBase import DB
 from jose import jwt
 from functools import wraps
 from config import Config
-import uuid
+import os
+import socket
 import time
+import uuid
+import atexit
 import threading
 import MessageChecker
+from ChatService import ChatService
+from Presence import PresenceRegistry, PresenceBroadcaster
+from HotChats import HotChats
+from SharedState import MemoryState, SQLiteState
+from MessageQueue import ClientManager
+from SocketIdentity import SocketIdentities
+from Metrics import REGISTRY, CONTENT_TYPE, SOCKET_EVENT_SECONDS, HTTP_REQUEST_SECONDS
+from Tracing import Tracer
+from Profiler import StackSampler
 
 app = Flask(__name__)
 app.config.from_object(Config)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}})
 
-ml = MessageChecker.Models()
+# Modeller arka planda yüklenir; sunucu hemen bağlantı kabul eder, sadece moderasyon bekler.
+# Verdict cache açıkken çeviri cache'i kapalı: mesaj metnini ve çevirisini tutardı, tekrar eden mesaj zaten verdict cache'ten döner.
+ml = MessageChecker.Models(background=True,
+                           translation_cache_size=0 if Config.VERDICT_CACHE_SIZE > 0 else Config.TRANSLATION_CACHE_SIZE)
+moderator = MessageChecker.BatchModerator(ml,
+                                          window_ms=Config.MODERATION_BATCH_WINDOW_MS,
+                                          max_batch=Config.MODERATION_MAX_BATCH,
+                                          max_pending=Config.MODERATION_MAX_PENDING)
 fernet = Fernet(app.config['FERNET_KEY'])
 
+# Birden fazla worker: emit'ler mesaj kuyruğu üzerinden diğer worker'lardaki soketlere de ulaşır
 socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000", "http://127.0.0.1:3000"], 
                    ping_timeout=60,
                    ping_interval=25,
-                   async_mode='threading')
+                   async_mode='threading',
+                   client_manager=ClientManager(Config.SOCKETIO_MESSAGE_QUEUE, poll=Config.MESSAGE_QUEUE_POLL_MS / 1000.0))
+
+class SocketIOTransport:
+    """ChatService output on the Flask-SocketIO server; usable from any thread."""
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def Emit(self, event, data, room=None):
+        self.socketio.emit(event, data, to=room)
+
+    def EnterRoom(self, sid, room):
+        self.socketio.server.enter_room(sid, room, namespace='/')
+
+    def LeaveRoom(self, sid, room):
+        self.socketio.server.leave_room(sid, room, namespace='/')
+
+    def Disconnect(self, sid):
+        self.socketio.server.disconnect(sid, namespace='/')
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+shared = Config.SHARED_STATE == 'sqlite'
+if shared and (Config.CHAT_STORAGE != 'sqlite' or Config.DB_WRITE_BEHIND):
+    # Mesaj Seq'i ve chat ID'si tüm worker'larda tek kaynaktan gelmeli
+    raise ValueError("SHARED_STATE=sqlite requires CHAT_STORAGE=sqlite and DB_WRITE_BEHIND=0")
 
 db = DB()
 db.CreateDb()
+# Write-behind kuyruğunda bekleyen mesajlar kapanışta diske yazılsın
+atexit.register(db.Close)
+
+# Oturumlar, aktif chatler, chat istekleri ve kullanıcı durumları
+if Config.SHARED_STATE == 'memory':
+    state = MemoryState()
+elif shared:
+    state = SQLiteState(Config.SHARED_STATE_PATH)
+else:
+    raise ValueError(f"Unknown shared state: {Config.SHARED_STATE}")
+
+# İlk worker (canlı başka worker yoksa): önceki çalıştırmadan (ör. çökme) kalan durum ve yetim chatler temizlenir.
+# Sonradan katılan worker'lar diğerlerinin chatlerine dokunmaz.
+if state.RegisterWorker(WORKER_ID, Config.WORKER_TTL):
+    state.Reset()
+    swept = db.SweepOrphanedChats()
+    if swept:
+        print(f"Removed {swept} orphaned chat(s) left from a previous run")
+
+# Kullanıcı durumlarının tek sahibi; DB'ye sadece periyodik yazılır
+presence = PresenceRegistry(db, state)
+atexit.register(presence.Close)
+# Aktif chatlerin son mesajları; join_chat ve geçmiş sayfaları önce buradan okunur.
+# Birden fazla worker'da mesajı hangi worker'ın yazdığı belli olmadığı için kapalı.
+hot_chats = HotChats(per_chat=0) if shared else HotChats()
+
+# Socket olaylarının mantığı; async_app.py aynı servisi kendi transport'u ile kullanır
+# Örneklenen mesajların span dökümü; yavaş olanlar TRACE_SLOW_LOG'a yazılır
+tracer = Tracer(Config.TRACE_SAMPLE_RATE, Config.TRACE_SLOW_MS, Config.TRACE_SLOW_LOG)
+# /admin/profile ile canlı süreçten süre sınırlı profil alınır
+profiler = StackSampler(Config.PROFILE_DIR, Config.PROFILE_SAMPLE_MS / 1000.0, Config.PROFILE_MAX_SECONDS)
+
+service = ChatService(db, state, presence, hot_chats, moderator, fernet,
+                      transport=SocketIOTransport(socketio), worker=WORKER_ID, tracer=tracer)
+
+# Token bağlantıda bir kez doğrulanır; sonraki olaylar kullanıcıyı sid'den alır
+identities = SocketIdentities(app.config['JWT_SECRET_KEY'])
+
+# Durum değişiklikleri birleştirilip tüm istemcilere tek delta olarak gider
+broadcaster = PresenceBroadcaster(presence, lambda delta: service.transport.Emit('presenceDelta', delta),
+                                  poll=Config.PRESENCE_POLL_MS / 1000.0 if shared else None,
+                                  owner=WORKER_ID)
+
+# Gauge'lar sadece /metrics okunurken hesaplanır, olay yolunda maliyeti yok
+REGISTRY.Gauge("supersecret_connected_sockets", "Sockets connected to this worker", lambda: len(identities))
+REGISTRY.Gauge("supersecret_active_chats", "Active chats", lambda: state.Counts()[0])
+REGISTRY.Gauge("supersecret_pending_chat_requests", "Chat requests waiting for an answer", lambda: state.Counts()[1])
+REGISTRY.Gauge("supersecret_moderation_queue_depth", "Messages waiting for a moderation batch", lambda: moderator.pending.qsize())
+REGISTRY.Gauge("supersecret_message_pipeline_pending", "Messages submitted but not yet stored and emitted",
+               lambda: service.pipeline.Pending())
 
-# Store active chat requests and user sessions
-active_chat_requests = {}
-user_sessions = {}
-active_chats = {}
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+# Süre teardown'da yazılır: yakalanmayan bir hatada after_request hiç çalışmayabilir, o istek 500 sayılır
+@app.teardown_request
+def observe_request(error=None):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.pop('response_status', 500)
+        HTTP_REQUEST_SECONDS.Observe(time.perf_counter() - start, route, request.method, str(status))
 
 def token_required(f):
     @wraps(f)
@@ -60,6 +168,15 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+# token_required'dan sonra: kullanıcı ADMIN_USERS içinde olmalı
+def admin_required(f):
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if current_user not in Config.ADMIN_USERS:
+            return jsonify({'message': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+    return decorated
+
 @app.route("/register", methods=['POST'])
 def register():
     data = request.get_json()
@@ -69,6 +186,7 @@ def register():
     try:
         # Register user with 'Idle' status
         db.InsertUser(data['username'], data['password'], status='idle')
+        presence.Add(data['username'], 'idle')
         
         token = jwt.encode(
             {
@@ -101,7 +219,7 @@ def login():
             return jsonify({"error": "Invalid credentials"}), 401
         
         # Update user status to Idle
-        db.SetUserStatus(data['username'], 'idle')
+        presence.Set(data['username'], 'idle')
         
         token = jwt.encode(
             {
@@ -126,7 +244,7 @@ def login():
 def logout(current_user):
     try:
         # Update user status to Offline
-        db.SetUserStatus(current_user, 'offline')
+        presence.Set(current_user, 'offline')
         return jsonify({"message": "Logout successful"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -135,521 +253,163 @@ def logout(current_user):
 @token_required
 def get_users(current_user):
     try:
-        users = db.GetAllUsers()
+        users = presence.Users()
         # Filter out current user from the list
         users = [user for user in users if user['username'] != current_user]
         return jsonify({"users": users})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Prometheus text formatı; METRICS_TOKEN verilmişse Bearer token ile korunur
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    if Config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+        return jsonify({'message': 'Invalid metrics token'}), 401
+    return Response(REGISTRY.Render(), content_type=CONTENT_TYPE)
+
+@app.route("/admin/profile", methods=['POST'])
+@token_required
+@admin_required
+def start_profile(current_user):
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 10))
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds must be a number"}), 400
+    profile = profiler.Start(seconds, include_idle=bool(data.get('include_idle', False)))
+    if profile is None:
+        return jsonify({"error": "A profile is already running", "status": profiler.Status()}), 409
+    print(f"Profile started by {current_user}: {profile['path']} ({profile['seconds']}s)")
+    return jsonify({"profile": profile}), 202
+
+@app.route("/admin/profile", methods=['GET'])
+@token_required
+@admin_required
+def profile_status(current_user):
+    return jsonify(profiler.Status())
+
+@app.route("/admin/slow-requests", methods=['GET'])
+@token_required
+@admin_required
+def slow_requests(current_user):
+    return jsonify({"sampled": tracer.sampled, "slow": tracer.RecentSlow()})
+
+@app.route("/ready", methods=['GET'])
+def ready():
+    if ml.IsReady():
+        return jsonify({"ready": True, "models_load_seconds": ml.load_seconds})
+    return jsonify({"ready": False, "error": str(ml.load_error) if ml.load_error else None}), 503
+
+# Kullanıcı bağlantıda doğrulanan kimlikten gelir; her olayda sadece token süresi kontrol edilir.
+# Handler süresi olay adıyla metriklere yazılır.
+def socket_user(f):
+    @wraps(f)
+    def decorated(*args):
+        with SOCKET_EVENT_SECONDS.Time(request.event['message']):
+            try:
+                username = identities.Get(request.sid)
+            except Exception as e:
+                emit('error', {'message': str(e)})
+                return
+            return f(username, *args)
+    return decorated
+
 @socketio.on('connect')
 def handle_connect():
     token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        
-        # Check if user is already connected
-        if username in user_sessions:
-            old_sid = user_sessions[username]['sid']
-            # Disconnect old session if it exists
-            disconnect(sid=old_sid)
-            print(f"Disconnecting old session for {username}")
-        
-        # Store user's session data
-        user_sessions[username] = {
-            'sid': request.sid,
-            'status': 'idle',
-            'connected': True
-        }
-        
-        # Clean up any stale chat data for this user
-        if username in active_chats:
-            other_user = active_chats[username]['other_user']
-            print(f"Cleaning up stale chat data for {username} with {other_user}")
-            
-            # Clean up both users' chat data
-            if username in active_chats:
-                del active_chats[username]
-            if other_user in active_chats:
-                del active_chats[other_user]
-        
-        # Update user status to idle when connecting
-        db.SetUserStatus(username, 'idle')
-        
-        # Join user to their personal room using their socket ID
-        join_room(request.sid)
-        
-        print(f"User {username} connected with sid {request.sid}")
-        
-        # Broadcast updated user list to all clients
-        users = db.GetAllUsers()
-        emit('userList', {'users': users}, broadcast=True)
-        
-        return True
-    except Exception as e:
-        print(f"Connection error: {str(e)}")
-        return False
+    with SOCKET_EVENT_SECONDS.Time('connect'):
+        try:
+            username = identities.Bind(request.sid, token)
+            service.Connect(request.sid, username)
+            return True
+        except Exception as e:
+            identities.Unbind(request.sid)
+            print(f"Connection error: {str(e)}")
+            return False
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        
-        if username in user_sessions:
-            # Only handle disconnect if this is the current session
-            if user_sessions[username]['sid'] == request.sid:
-                user_sessions[username]['connected'] = False
-                print(f"User {username} disconnected (sid: {request.sid})")
-                
-                # Clean up any active chat
-                if username in active_chats:
-                    other_user = active_chats[username]['other_user']
-                    chat_id = active_chats[username]['chat_id']
-                    
-                    # Clean up database
-                    try:
-                        db_chat_id = db.GetChatID(username, other_user)
-                        if not db_chat_id:
-                            db_chat_id = db.GetChatID(other_user, username)
-                        
-                        if db_chat_id:
-                            print(f"Deleting chat {db_chat_id} from database")
-                            db.DeleteChat(db_chat_id)
-                    except Exception as e:
-                        print(f"Error deleting chat from database: {str(e)}")
-                    
-                    # Clean up both users' chat data
-                    if username in active_chats:
-                        del active_chats[username]
-                    if other_user in active_chats:
-                        del active_chats[other_user]
-                    
-                    # Notify other user if they're connected
-                    if other_user in user_sessions and user_sessions[other_user]['connected']:
-                        emit('force_close_chat', {
-                            'username': username
-                        }, room=user_sessions[other_user]['sid'])
-                
-                # Update user status to offline
-                db.SetUserStatus(username, 'offline')
-                
-                # Broadcast updated user list to all clients
-                users = db.GetAllUsers()
-                emit('userList', {'users': users}, broadcast=True)
-            else:
-                print(f"Ignoring disconnect for old session of {username}")
-        
-    except Exception as e:
-        print(f"Disconnect error: {str(e)}")
+    username = identities.Unbind(request.sid)
+    if username is None:
+        return
+    with SOCKET_EVENT_SECONDS.Time('disconnect'):
+        try:
+            service.Disconnect(request.sid, username)
+        except Exception as e:
+            print(f"Disconnect error: {str(e)}")
 
 @socketio.on('update_status')
-def handle_status_update(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        new_status = data['status']
-        
-        # Update user status
-        db.SetUserStatus(username, new_status)
-        
-        # Get updated user data
-        user = db.GetUser(username)
-        
-        # Broadcast status update to all clients
-        emit('userStatusUpdate', {'user': user}, broadcast=True)
-    except Exception as e:
-        emit('error', {'message': str(e)})
+@socket_user
+def handle_status_update(username, data):
+    service.UpdateStatus(request.sid, username, data)
 
-@socketio.on('join_chat')
-def handle_join_chat(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        other_user = data['other_user']
-        
-        # First check if there's an active chat
-        if username in active_chats and active_chats[username]['other_user'] == other_user:
-            chat_id = active_chats[username]['chat_id']
-        else:
-            # If no active chat, check database
-            chat_id = db.GetChatID(username, other_user)
-            if not chat_id:
-                chat_id = db.GetChatID(other_user, username)
-            
-            if not chat_id:
-                # Create new chat if it doesn't exist
-                db.cursor.execute("INSERT INTO All_messages (MainUser, ConnectionUser) VALUES (?, ?)", 
-                                (username, other_user))
-                chat_id = db.cursor.lastrowid
-                db.CreateChat(chat_id)
-            
-            # Store in active_chats
-            active_chats[username] = {
-                'chat_id': str(chat_id),
-                'other_user': other_user
-            }
-            if other_user in user_sessions:
-                active_chats[other_user] = {
-                    'chat_id': str(chat_id),
-                    'other_user': username
-                }
-        
-        # Join both users to the chat room
-        join_room(str(chat_id))
-        
-        # Get chat history
-        messages = db.GetMessages(chat_id)
-        decrypted_messages = []
-        for msg in messages:
-            try:
-                decrypted_text = fernet.decrypt(msg[2]).decode()
-                decrypted_messages.append({
-                    'time': msg[0],
-                    'sender': msg[1],
-                    'message': decrypted_text
-                })
-            except:
-                continue
-        
-        # Send chat history and chat started event
-        emit('chat_started', {
-            'chat_id': str(chat_id),
-            'other_user': other_user,
-            'messages': decrypted_messages
-        })
-        
-    except Exception as e:
-        print(f"Error in join_chat: {str(e)}")
-        emit('error', {'message': str(e)})
+@socketio.on('request_user_list')
+def handle_request_user_list():
+    with SOCKET_EVENT_SECONDS.Time('request_user_list'):
+        service.RequestUserList(request.sid)
 
-@socketio.on('send_message')
-def handle_message(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        other_user = data['other_user']
-        message = data['message']
-        
-        # Get chat ID from active_chats
-        if username not in active_chats or active_chats[username]['other_user'] != other_user:
-            raise Exception("Chat room not found")
-        
-        chat_id = active_chats[username]['chat_id']
-        
-        is_bad = ml.IsBadMessage(message)
+@socketio.on('join_chat')
+@socket_user
+def handle_join_chat(username, data):
+    service.JoinChat(request.sid, username, data)
 
-        if (is_bad):
-            message = "Bu düşünce spam veya kötü mesaj içeriyor!"
+@socketio.on('load_older_messages')
+@socket_user
+def handle_load_older_messages(username, data):
+    service.LoadOlderMessages(request.sid, username, data)
 
-        # Encrypt message before storing
-        encrypted_msg = fernet.encrypt(message.encode())
-        
-        # Store message in database
-        db.AddMessage(int(chat_id), username, encrypted_msg)
-        
-        # Broadcast to chat room (including sender for confirmation)
-        emit('new_message', {
-            'sender': username,
-            'message': message,
-            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, room=str(chat_id))
-        
-    except Exception as e:
-        print(f"Error in send_message: {str(e)}")
-        emit('error', {'message': str(e)})
+@socketio.on('send_message')
+@socket_user
+def handle_message(username, data):
+    service.SendMessage(request.sid, username, data)
 
 @socketio.on('leave_chat')
-def handle_leave_chat(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        username = token_data['username']
-        chat_id = data['chat_id']
-        
-        leave_room(str(chat_id))
-        db.DeleteChat(int(chat_id))
-        
-        emit('chat_ended', {'chat_id': chat_id}, room=str(chat_id))
-    except Exception as e:
-        emit('error', {'message': str(e)})
+@socket_user
+def handle_leave_chat(username, data):
+    service.LeaveChat(request.sid, username, data)
 
 @socketio.on('chat_request')
-def handle_chat_request(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        sender_username = token_data['username']
-        target_username = data['targetUsername']
-        
-        # Check if either user is in a chat
-        sender_in_chat = sender_username in active_chats and active_chats[sender_username].get('chat_id') is not None
-        target_in_chat = target_username in active_chats and active_chats[target_username].get('chat_id') is not None
-        
-        if sender_in_chat or target_in_chat:
-            print(f"Cannot create chat request: User already in chat (sender: {sender_in_chat}, target: {target_in_chat})")
-            emit('error', {'message': 'One of the users is already in a chat'})
-            return
-        
-        # Check if target user is connected
-        if target_username not in user_sessions or not user_sessions[target_username]['connected']:
-            emit('error', {'message': 'User is not online'})
-            return
-            
-        # Generate unique request ID
-        request_id = str(uuid.uuid4())
-        
-        # Store request data with socket IDs
-        active_chat_requests[request_id] = {
-            'sender': sender_username,
-            'target': target_username,
-            'timestamp': datetime.now()
-        }
-        
-        # Get sender user data with default avatar
-        sender_user = db.GetUser(sender_username)
-        sender_avatar = sender_user.get('avatar', '/assets/Uzaylı_1.png')
-        
-        print(f"Sending chat request: {sender_username} -> {target_username}")
-        
-        # Send request to target user's room using their socket ID
-        emit('chat_request_received', {
-            'requestId': request_id,
-            'senderUsername': sender_username,
-            'senderAvatar': sender_avatar
-        }, room=user_sessions[target_username]['sid'])
-        
-    except Exception as e:
-        print(f"Chat request error: {str(e)}")
-        emit('error', {'message': str(e)})
+@socket_user
+def handle_chat_request(username, data):
+    service.ChatRequest(request.sid, username, data)
 
 @socketio.on('chat_request_response')
-def handle_chat_request_response(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        responder_username = token_data['username']
-        request_id = data['requestId']
-        accepted = data['accepted']
-        
-        # Get request data
-        request_data = active_chat_requests.get(request_id)
-        if not request_data:
-            print(f"Warning: Request {request_id} not found in active_chat_requests")
-            return
-        
-        # Verify responder is the target
-        if request_data['target'] != responder_username:
-            print(f"Warning: Responder {responder_username} is not the target {request_data['target']}")
-            return
-        
-        # Get responder user data with default avatar
-        responder_user = db.GetUser(responder_username)
-        responder_avatar = responder_user.get('avatar', '/assets/Uzaylı_1.png')
-        
-        # Get sender user data with default avatar
-        sender_user = db.GetUser(request_data['sender'])
-        sender_avatar = sender_user.get('avatar', '/assets/Uzaylı_1.png')
-        
-        if accepted:
-            print(f"Chat request accepted: {request_data['sender']} -> {responder_username}")
-            
-            # Create chat in database first
-            db.cursor.execute("INSERT INTO All_messages (MainUser, ConnectionUser) VALUES (?, ?)", 
-                            (request_data['sender'], responder_username))
-            chat_id = db.cursor.lastrowid
-            db.CreateChat(chat_id)
-            
-            # Update both users' status to busy
-            db.SetUserStatus(request_data['sender'], 'busy')
-            db.SetUserStatus(responder_username, 'busy')
-            
-            if request_data['sender'] in user_sessions:
-                user_sessions[request_data['sender']]['status'] = 'busy'
-            if responder_username in user_sessions:
-                user_sessions[responder_username]['status'] = 'busy'
-            
-            # Store chat information using database chat_id
-            active_chats[request_data['sender']] = {
-                'chat_id': str(chat_id),
-                'other_user': responder_username
-            }
-            active_chats[responder_username] = {
-                'chat_id': str(chat_id),
-                'other_user': request_data['sender']
-            }
-            
-            # Join both users to the chat room
-            if request_data['sender'] in user_sessions:
-                join_room(str(chat_id), sid=user_sessions[request_data['sender']]['sid'])
-            if responder_username in user_sessions:
-                join_room(str(chat_id), sid=user_sessions[responder_username]['sid'])
-            
-            # Broadcast status updates
-            users = db.GetAllUsers()
-            emit('userList', {'users': users}, broadcast=True)
-            
-            # Send response to sender's room
-            if request_data['sender'] in user_sessions:
-                emit('chat_request_response', {
-                    'accepted': True,
-                    'targetUsername': responder_username,
-                    'targetAvatar': responder_avatar,
-                    'chatId': chat_id
-                }, room=user_sessions[request_data['sender']]['sid'])
-            
-            # Send chat window open event to responder
-            if responder_username in user_sessions:
-                emit('open_chat_window', {
-                    'username': request_data['sender'],
-                    'avatar': sender_avatar,
-                    'chatId': chat_id
-                }, room=user_sessions[responder_username]['sid'])
-            
-            print(f"Chat room {chat_id} created for {request_data['sender']} and {responder_username}")
-            
-        else:
-            print(f"Chat request rejected: {request_data['sender']} -> {responder_username}")
-            # Send rejection response to sender's room
-            if request_data['sender'] in user_sessions:
-                emit('chat_request_response', {
-                    'accepted': False,
-                    'targetUsername': responder_username,
-                    'targetAvatar': responder_avatar
-                }, room=user_sessions[request_data['sender']]['sid'])
-        
-        # Remove request from active requests
-        del active_chat_requests[request_id]
-        
-    except Exception as e:
-        print(f"Error in chat_request_response: {str(e)}")
-        emit('error', {'message': str(e)})
+@socket_user
+def handle_chat_request_response(username, data):
+    service.ChatRequestResponse(request.sid, username, data)
 
 @socketio.on('close_chat')
-def handle_close_chat(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        current_username = token_data['username']
-        other_username = data['otherUsername']
-        
-        print(f"Closing chat between {current_username} and {other_username}")
-        
-        # Get chat ID from active chats
-        chat_data = active_chats.get(current_username)
-        if chat_data and chat_data['other_user'] == other_username:
-            chat_id = chat_data['chat_id']
-            
-            # Clean up database
-            try:
-                # Get chat ID from database
-                db_chat_id = db.GetChatID(current_username, other_username)
-                if not db_chat_id:
-                    db_chat_id = db.GetChatID(other_username, current_username)
-                
-                if db_chat_id:
-                    print(f"Deleting chat {db_chat_id} from database")
-                    db.DeleteChat(db_chat_id)
-            except Exception as e:
-                print(f"Error deleting chat from database: {str(e)}")
-            
-            # Update both users' status to idle
-            db.SetUserStatus(current_username, 'idle')
-            db.SetUserStatus(other_username, 'idle')
-            
-            if current_username in user_sessions:
-                user_sessions[current_username]['status'] = 'idle'
-            if other_username in user_sessions:
-                user_sessions[other_username]['status'] = 'idle'
-            
-            # Remove chat data
-            if current_username in active_chats:
-                del active_chats[current_username]
-            if other_username in active_chats:
-                del active_chats[other_username]
-            
-            # Leave chat room
-            leave_room(str(chat_id))
-            
-            # Broadcast status updates
-            users = db.GetAllUsers()
-            emit('userList', {'users': users}, broadcast=True)
-            
-            # Notify other user about chat closure
-            if other_username in user_sessions and user_sessions[other_username]['connected']:
-                emit('force_close_chat', {
-                    'username': current_username
-                }, room=user_sessions[other_username]['sid'])
-            
-            print(f"Chat closed successfully between {current_username} and {other_username}")
-        else:
-            print(f"No active chat found between {current_username} and {other_username}")
-        
-    except Exception as e:
-        print(f"Error in close_chat: {str(e)}")
-        emit('error', {'message': str(e)})
+@socket_user
+def handle_close_chat(username, data):
+    service.CloseChat(request.sid, username, data)
 
 @socketio.on('end_chat')
-def handle_end_chat(data):
-    token = request.args.get('token')
-    try:
-        token_data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-        current_username = token_data['username']
-        other_username = data['other_user']
-        
-        # Get chat ID
-        chat_id = db.GetChatID(current_username, other_username)
-        if not chat_id:
-            chat_id = db.GetChatID(other_username, current_username)
-        
-        if chat_id:
-            # Delete chat messages and chat entry
-            db.DeleteChat(chat_id)
-            
-            # Leave the chat room
-            leave_room(str(chat_id))
-            
-            # Update both users' status to idle
-            db.SetUserStatus(current_username, 'idle')
-            db.SetUserStatus(other_username, 'idle')
-            
-            # Broadcast status updates
-            users = db.GetAllUsers()
-            emit('userList', {'users': users}, broadcast=True)
-            
-            # Notify other user about chat closure
-            socketio.emit('chat_ended', {
-                'username': current_username
-            }, room=other_username)
-        
-    except Exception as e:
-        emit('error', {'message': str(e)})
-
-# Clean up expired requests periodically
-def cleanup_expired_requests():
-    now = datetime.now()
-    expired = []
-    for request_id, request_data in active_chat_requests.items():
-        if (now - request_data['timestamp']).total_seconds() > 300:  # 5 minutes
-            expired.append(request_id)
-    
-    for request_id in expired:
-        del active_chat_requests[request_id]
+@socket_user
+def handle_end_chat(username, data):
+    service.EndChat(request.sid, username, data)
 
 # Start cleanup task
+cleanup_stop = threading.Event()
+atexit.register(cleanup_stop.set)
+
 def start_cleanup_task():
     while True:
-        cleanup_expired_requests()
-        time.sleep(60)  # Check every minute
+        try:
+            state.Heartbeat(WORKER_ID)
+            service.ReapDeadWorkers()
+        except Exception as e:
+            print(f"Error in cleanup task: {str(e)}")
+        if cleanup_stop.wait(Config.WORKER_HEARTBEAT):
+            return
 
 cleanup_thread = threading.Thread(target=start_cleanup_task)
 cleanup_thread.daemon = True
 cleanup_thread.start()
 
+# Chat isteklerinin süresi heap'teki en yakın son tarihe göre dolar
+expiry_thread = threading.Thread(target=service.ExpireRequestsForever, name="request-expiry")
+expiry_thread.daemon = True
+expiry_thread.start()
+
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
+    socketio.run(app, port=Config.PORT, debug=True)
@@ -0,0 +1,135 @@
+"""Asyncio Socket.IO server with the same events and REST routes as app.py.
+
+Sockets live on one event loop instead of one OS thread each, so idle
+connections cost a few KB rather than a thread stack. Blocking handler work
+(SQLite, Fernet, bcrypt in the REST routes) runs in a bounded thread pool,
+and moderation still goes through the shared MessagePipeline.
+
+Run with any ASGI server, e.g.:
+    uvicorn async_app:asgi_app --port 5000
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+
+from config import Config
+from MessageQueue import ClientManager
+from Metrics import SOCKET_EVENT_SECONDS
+# Modeller, DB, presence ve ChatService app.py ile ortak; Flask-SocketIO sunucusu burada çalıştırılmaz
+import app as wsgi
+
+sio = socketio.AsyncServer(async_mode='asgi',
+                           cors_allowed_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
+                           ping_timeout=60,
+                           ping_interval=25,
+                           client_manager=ClientManager(Config.SOCKETIO_MESSAGE_QUEUE, asynchronous=True,
+                                                        poll=Config.MESSAGE_QUEUE_POLL_MS / 1000.0))
+# REST route'ları (login/register'daki bcrypt dahil) asgiref'in thread'lerinde çalışır
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(wsgi.app))
+
+executor = ThreadPoolExecutor(max_workers=Config.ASYNC_HANDLER_WORKERS, thread_name_prefix="socket-handler")
+
+class AsyncTransport:
+    """ChatService output on the asyncio server.
+
+    Handlers run in executor threads (and the pipeline in its own workers), so
+    every operation is handed to the event loop and performed by a single task
+    in call order; a chat's messages reach the room in the order they were stored.
+    """
+
+    def __init__(self, sio, loop):
+        self.sio = sio
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def _Call(self, operation):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, operation)
+
+    def Emit(self, event, data, room=None):
+        self._Call(lambda: self.sio.emit(event, data, to=room))
+
+    def EnterRoom(self, sid, room):
+        self._Call(lambda: self.sio.enter_room(sid, room))
+
+    def LeaveRoom(self, sid, room):
+        self._Call(lambda: self.sio.leave_room(sid, room))
+
+    def Disconnect(self, sid):
+        self._Call(lambda: self.sio.disconnect(sid))
+
+    async def Run(self):
+        while True:
+            operation = await self.queue.get()
+            try:
+                await operation()
+            except Exception as e:
+                print(f"Error in socket operation: {str(e)}")
+
+# İlk bağlantıda, çalışan event loop'a bağlı transport servise takılır
+def EnsureTransport():
+    loop = asyncio.get_running_loop()
+    transport = wsgi.service.transport
+    if not isinstance(transport, AsyncTransport) or transport.loop is not loop:
+        transport = AsyncTransport(sio, loop)
+        wsgi.service.transport = transport
+        sio.start_background_task(transport.Run)
+
+async def Call(method, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, method, *args)
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    EnsureTransport()
+    token = parse_qs(environ.get('QUERY_STRING', '')).get('token', [None])[0]
+    with SOCKET_EVENT_SECONDS.Time('connect'):
+        try:
+            username = wsgi.identities.Bind(sid, token)
+            await Call(wsgi.service.Connect, sid, username)
+        except Exception as e:
+            wsgi.identities.Unbind(sid)
+            print(f"Connection error: {str(e)}")
+            return False
+    return True
+
+@sio.event
+async def disconnect(sid, reason=None):
+    username = wsgi.identities.Unbind(sid)
+    if username is not None:
+        with SOCKET_EVENT_SECONDS.Time('disconnect'):
+            await Call(wsgi.service.Disconnect, sid, username)
+
+@sio.on('request_user_list')
+async def request_user_list(sid):
+    with SOCKET_EVENT_SECONDS.Time('request_user_list'):
+        await Call(wsgi.service.RequestUserList, sid)
+
+# Olay adı -> ChatService metodu; hepsi (sid, username, data) alır
+HANDLERS = {
+    'update_status': 'UpdateStatus',
+    'join_chat': 'JoinChat',
+    'load_older_messages': 'LoadOlderMessages',
+    'send_message': 'SendMessage',
+    'leave_chat': 'LeaveChat',
+    'chat_request': 'ChatRequest',
+    'chat_request_response': 'ChatRequestResponse',
+    'close_chat': 'CloseChat',
+    'end_chat': 'EndChat'
+}
+
+def Register(event, method_name):
+    async def handler(sid, data=None):
+        with SOCKET_EVENT_SECONDS.Time(event):
+            # Kimlik connect'te doğrulandı; burada sadece token süresi kontrol edilir
+            try:
+                username = wsgi.identities.Get(sid)
+            except Exception as e:
+                await sio.emit('error', {'message': str(e)}, to=sid)
+                return
+            await Call(getattr(wsgi.service, method_name), sid, username, data)
+    sio.on(event, handler)
+
+for event, method_name in HANDLERS.items():
+    Register(event, method_name)
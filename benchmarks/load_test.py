@@ -0,0 +1,479 @@
+"""End-to-end Socket.IO load test against a locally started server.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test [--clients 20] [--messages 20] [--models stub|real]
+                                   [--server threading|async] [--json OUT] [--baseline FILE]
+
+Starts app.py (or async_app.py under uvicorn) on a fresh temporary database,
+with either the real moderation models or a deterministic stub of
+configurable latency. Each pair of simulated clients then goes through
+register/login, connect, chat_request, chat_request_response, join_chat,
+send_message and close_chat. The report has per-event throughput and
+p50/p95/p99 latency, plus the server's CPU time and RSS.
+
+--json writes the report as a baseline. --baseline compares the run with an
+earlier one; the exit status is 1 when a p95 latency or the message
+throughput is more than --tolerance worse.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sunucunun CORS listesindeki frontend adresi
+ORIGIN = "http://localhost:3000"
+EVENTS = ("register", "login", "connect", "chat_request", "chat_request_response",
+          "join_chat", "send_message", "close_chat")
+
+
+class StubModels:
+    """Stand-in for MessageChecker.Models with a fixed, configurable cost.
+
+    A batch takes `batch_ms` plus `per_message_ms` per message and a message
+    is bad when it contains "spam". Nothing is loaded, so the server is ready
+    at once and the numbers reflect the server code rather than the models.
+    """
+
+    def __init__(self, batch_ms=20.0, per_message_ms=2.0, **_):
+        self.batch = batch_ms / 1000.0
+        self.per_message = per_message_ms / 1000.0
+        self.backend = "stub"
+        self.generation = 1
+        self.load_seconds = 0.0
+        self.load_error = None
+
+    def IsReady(self):
+        return True
+
+    def WaitReady(self, timeout=None):
+        pass
+
+    def IsBadMessage(self, message):
+        return self.IsBadMessages([message])[0]
+
+    def IsBadMessages(self, messages, deciders=None):
+        time.sleep(self.batch + self.per_message * len(messages))
+        verdicts = ["spam" in m.lower() for m in messages]
+        if deciders is not None:
+            deciders[:] = ["stub" if bad else None for bad in verdicts]
+        return verdicts
+
+
+# Sunucu alt süreci: stub modeller app import edilmeden önce yerine konur
+def Serve(args):
+    sys.path.insert(0, ROOT)
+    if args.models == "stub":
+        import MessageChecker
+        MessageChecker.Models = lambda **kwargs: StubModels(args.batch_ms, args.per_message_ms)
+    if args.server == "async":
+        import uvicorn
+        import async_app
+        uvicorn.run(async_app.asgi_app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        import app
+        app.socketio.run(app.app, host="127.0.0.1", port=args.port, allow_unsafe_werkzeug=True)
+
+
+def StartServer(args, workdir):
+    from cryptography.fernet import Fernet
+    env = dict(os.environ,
+               DATABASE_PATH=os.path.join(workdir, "load_test.db"),
+               SHARED_STATE_PATH=os.path.join(workdir, "state.db"),
+               PYTHONUNBUFFERED="1")
+    env.setdefault("SECRET_KEY", uuid.uuid4().hex)
+    env.setdefault("JWT_SECRET_KEY", uuid.uuid4().hex)
+    env.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+    command = [sys.executable, "-m", "benchmarks.load_test", "serve", "--port", str(args.port),
+               "--models", args.models, "--server", args.server,
+               "--batch-ms", str(args.batch_ms), "--per-message-ms", str(args.per_message_ms)]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}, see {log.name}")
+        try:
+            with urllib.request.urlopen(f"{BaseUrl(args)}/ready", timeout=2):
+                return server
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    server.terminate()
+    raise TimeoutError(f"Server was not ready after {args.startup_timeout}s, see {log.name}")
+
+
+def BaseUrl(args):
+    return f"http://127.0.0.1:{args.port}"
+
+
+def Post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+class ProcessSampler:
+    """CPU time and RSS of the server process, read from /proc (Linux only)."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.rss_peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._Run, daemon=True)
+
+    def CpuSeconds(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self.ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def Rss(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def Start(self):
+        self.cpu_start = self.CpuSeconds()
+        self.rss_start = self.Rss()
+        self.started = time.monotonic()
+        self.thread.start()
+
+    def Stop(self):
+        self.stopped.set()
+        self.thread.join()
+        wall = time.monotonic() - self.started
+        cpu_end = self.CpuSeconds()
+        cpu = cpu_end - self.cpu_start if cpu_end is not None and self.cpu_start is not None else None
+        return {
+            'cpu_seconds': cpu,
+            'cpu_percent': cpu / wall * 100 if cpu is not None else None,
+            'rss_start_bytes': self.rss_start,
+            'rss_peak_bytes': self.rss_peak or None,
+            'rss_end_bytes': self.Rss()
+        }
+
+    def _Run(self):
+        while not self.stopped.wait(self.interval):
+            rss = self.Rss()
+            if rss:
+                self.rss_peak = max(self.rss_peak, rss)
+
+
+class Recorder:
+    """Latency samples per event, shared by all client threads.
+
+    The first start and last finish of each event are kept too, so its
+    throughput is measured over the time it was actually being exercised.
+    """
+
+    def __init__(self):
+        self.samples = {event: [] for event in EVENTS}
+        self.windows = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def Add(self, event, seconds):
+        now = time.monotonic()
+        with self.lock:
+            self.samples[event].append(seconds)
+            first, last = self.windows.get(event, (now - seconds, now))
+            self.windows[event] = (min(first, now - seconds), max(last, now))
+
+    def Error(self, event, message):
+        with self.lock:
+            self.errors.setdefault(event, {})
+            self.errors[event][message] = self.errors[event].get(message, 0) + 1
+
+
+class Client:
+    """One simulated user: a Socket.IO client plus the events it has received."""
+
+    def __init__(self, args, username, recorder, pending_messages):
+        import socketio
+        self.args = args
+        self.username = username
+        self.recorder = recorder
+        self.pending_messages = pending_messages
+        self.events = {}
+        self.condition = threading.Condition()
+        self.sio = socketio.Client(reconnection=False, websocket_extra_options={"origin": ORIGIN})
+        self.sio.on("*", self._OnEvent)
+        self.sio.on("new_message", self._OnMessage)
+
+    def _OnEvent(self, event, data=None):
+        with self.condition:
+            self.events.setdefault(event, []).append(data)
+            self.condition.notify_all()
+
+    # Gecikme gönderenin kaydettiği zamandan alıcıya ulaşana kadar ölçülür
+    def _OnMessage(self, data):
+        sent = self.pending_messages.pop(data.get('message'), None)
+        if sent is not None:
+            self.recorder.Add("send_message", time.monotonic() - sent)
+        self._OnEvent("new_message", data)
+
+    def Wait(self, event, count=1, timeout=None):
+        timeout = self.args.timeout if timeout is None else timeout
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.events.get(event, ())) >= count, timeout):
+                errors = self.events.get("error") or []
+                raise TimeoutError(f"no {event}" + (f" after error {errors[-1]}" if errors else ""))
+            return self.events[event][count - 1]
+
+    def Timed(self, event, action, waiter):
+        start = time.monotonic()
+        try:
+            action()
+            result = waiter()
+        except Exception as e:
+            self.recorder.Error(event, f"{type(e).__name__}: {e}")
+            raise
+        self.recorder.Add(event, time.monotonic() - start)
+        return result
+
+    def Login(self):
+        url = BaseUrl(self.args)
+        body = {"username": self.username, "password": "load-test"}
+        self.Timed("register", lambda: None, lambda: Post(f"{url}/register", body))
+        response = self.Timed("login", lambda: None, lambda: Post(f"{url}/login", body))
+        if "token" not in response:
+            raise RuntimeError(f"login failed: {response}")
+        self.token = response["token"]
+
+    # websocket-client Origin'i kendisi ekler; header olarak sadece polling'de verilir
+    def Connect(self):
+        headers = {"Origin": ORIGIN} if self.args.transport == "polling" else {}
+        self.Timed("connect", lambda: None, lambda: self.sio.connect(
+            f"{BaseUrl(self.args)}?token={self.token}", transports=[self.args.transport],
+            headers=headers, wait_timeout=self.args.timeout))
+
+    def Close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+# Mesaj fazı tüm çiftlerde aynı anda başlar (barrier), böylece mesaj/s çalıştırmalar arasında karşılaştırılabilir
+def RunPair(args, index, recorder, pending_messages, run_id, barrier):
+    sender = Client(args, f"lt{run_id}a{index}", recorder, pending_messages)
+    receiver = Client(args, f"lt{run_id}b{index}", recorder, pending_messages)
+    try:
+        ready = False
+        try:
+            SetUpChat(sender, receiver)
+            ready = True
+        finally:
+            barrier.wait()
+        if ready:
+            SendMessages(args, sender, receiver, recorder, pending_messages, f"{run_id}-{index}")
+    except Exception as e:
+        print(f"pair {index} ({sender.username}, {receiver.username}) failed: {e}")
+    finally:
+        sender.Close()
+        receiver.Close()
+
+
+def SetUpChat(sender, receiver):
+    for client in (sender, receiver):
+        client.Login()
+        client.Connect()
+
+    request = receiver.Timed("chat_request",
+                             lambda: sender.sio.emit("chat_request", {"targetUsername": receiver.username}),
+                             lambda: receiver.Wait("chat_request_received"))
+    sender.Timed("chat_request_response",
+                 lambda: receiver.sio.emit("chat_request_response", {"requestId": request["requestId"], "accepted": True}),
+                 lambda: sender.Wait("chat_request_response"))
+    for client, other in ((sender, receiver), (receiver, sender)):
+        client.Timed("join_chat",
+                     lambda: client.sio.emit("join_chat", {"other_user": other.username}),
+                     lambda: client.Wait("chat_started"))
+
+
+def SendMessages(args, sender, receiver, recorder, pending_messages, prefix):
+    for i in range(args.messages):
+        text = f"load test message {prefix}-{i}"
+        pending_messages[text] = time.monotonic()
+        sender.sio.emit("send_message", {"other_user": receiver.username, "message": text})
+        time.sleep(args.interval_ms / 1000.0)
+    try:
+        receiver.Wait("new_message", args.messages)
+    except TimeoutError as e:
+        recorder.Error("send_message", f"{type(e).__name__}: {e}")
+
+    receiver.Timed("close_chat",
+                   lambda: sender.sio.emit("close_chat", {"otherUsername": receiver.username}),
+                   lambda: receiver.Wait("force_close_chat"))
+
+
+def Percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def Summarize(recorder):
+    report = {}
+    for event, samples in recorder.samples.items():
+        first, last = recorder.windows.get(event, (0.0, 0.0))
+        entry = {'count': len(samples), 'per_second': len(samples) / (last - first) if last > first else 0.0,
+                 'errors': sum(recorder.errors.get(event, {}).values())}
+        if samples:
+            entry.update({f'p{int(q * 100)}_ms': Percentile(samples, q) * 1000 for q in (0.5, 0.95, 0.99)})
+            entry['max_ms'] = max(samples) * 1000
+        report[event] = entry
+    return report
+
+
+def GitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Compare(result, baseline, tolerance):
+    regressions = []
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('created')})")
+    print(f"{'event':<24}{'p95 ms':>10}{'baseline':>10}{'change':>9}")
+    for event in EVENTS:
+        now = result['events'].get(event, {}).get('p95_ms')
+        before = baseline.get('events', {}).get(event, {}).get('p95_ms')
+        if now is None or not before:
+            continue
+        change = now / before - 1
+        flag = " REGRESSION" if change > tolerance else ""
+        print(f"{event:<24}{now:>10.1f}{before:>10.1f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(f"{event} p95")
+    now = result['events']['send_message']['per_second']
+    before = baseline.get('events', {}).get('send_message', {}).get('per_second')
+    if before:
+        change = now / before - 1
+        flag = " REGRESSION" if change < -tolerance else ""
+        print(f"{'messages/s':<24}{now:>10.1f}{before:>10.1f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append("message throughput")
+    return regressions
+
+
+def Run(args):
+    pending_messages = {}
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:6]
+    with tempfile.TemporaryDirectory(prefix="load_test-") as workdir:
+        server = StartServer(args, workdir)
+        try:
+            sampler = ProcessSampler(server.pid)
+            sampler.Start()
+            started = time.monotonic()
+            threads = []
+            pairs = max(1, args.clients // 2)
+            barrier = threading.Barrier(pairs)
+            for index in range(pairs):
+                thread = threading.Thread(target=RunPair, args=(args, index, recorder, pending_messages, run_id, barrier))
+                thread.start()
+                threads.append(thread)
+                time.sleep(args.ramp_ms / 1000.0)
+            for thread in threads:
+                thread.join()
+            seconds = time.monotonic() - started
+            process = sampler.Stop()
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    return {
+        'commit': GitCommit(),
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'config': {k: v for k, v in vars(args).items() if k not in ('command', 'json_out', 'baseline')},
+        'seconds': seconds,
+        'events': Summarize(recorder),
+        'errors': recorder.errors,
+        'server': process
+    }
+
+
+def Print(result):
+    config = result['config']
+    print(f"{config['clients']} clients, {config['messages']} messages each, models={config['models']}, "
+          f"server={config['server']}, {result['seconds']:.1f}s")
+    print(f"{'event':<24}{'count':>7}{'errors':>7}{'/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for event, entry in result['events'].items():
+        if not entry['count']:
+            print(f"{event:<24}{0:>7}{entry['errors']:>7}")
+            continue
+        print(f"{event:<24}{entry['count']:>7}{entry['errors']:>7}{entry['per_second']:>9.1f}"
+              f"{entry['p50_ms']:>9.1f}{entry['p95_ms']:>9.1f}{entry['p99_ms']:>9.1f}")
+    server = result['server']
+    if server['cpu_seconds'] is not None:
+        print(f"server CPU {server['cpu_seconds']:.2f}s ({server['cpu_percent']:.0f}%), "
+              f"RSS {server['rss_start_bytes'] / 2**20:.1f} -> peak {server['rss_peak_bytes'] / 2**20:.1f} MB")
+    for event, messages in result['errors'].items():
+        for message, count in messages.items():
+            print(f"    {event}: {count}x {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "serve"))
+    parser.add_argument("--clients", type=int, default=20, help="simulated users, paired into chats")
+    parser.add_argument("--messages", type=int, default=20, help="messages sent per chat")
+    parser.add_argument("--interval-ms", type=float, default=50, help="pause between a sender's messages")
+    parser.add_argument("--ramp-ms", type=float, default=20, help="delay between starting two chat pairs")
+    parser.add_argument("--models", default="stub", choices=("stub", "real"))
+    parser.add_argument("--batch-ms", type=float, default=20, help="stub latency per moderation batch")
+    parser.add_argument("--per-message-ms", type=float, default=2, help="stub latency per message in a batch")
+    parser.add_argument("--server", default="threading", choices=("threading", "async"))
+    parser.add_argument("--transport", default="websocket", choices=("websocket", "polling"))
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for each expected event")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--json", dest="json_out", default=None, help="write the report (a baseline) to this file")
+    parser.add_argument("--baseline", default=None, help="earlier --json report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before a regression")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        Serve(args)
+        return
+
+    result = Run(args)
+    Print(result)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = Compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
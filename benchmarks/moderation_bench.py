@@ -0,0 +1,293 @@
+"""Per-stage timing of Models.IsBadMessages on the local moderation corpus.
+
+Usage (from the repository root):
+    python -m benchmarks.moderation_bench [--corpus FILE] [--lengths 1,4,16] [--batch-sizes 1,8]
+                                          [--config NAME:key=value;...] [--json OUT]
+
+Every tokenizer and model of a loaded Models is wrapped in a timing proxy,
+so a run reports wall time per stage: tokenization, TR->EN generation and
+decoding, the spam, toxicity and URL forward passes, and the remaining
+Python glue (normalization, caches, tier logic). Tokens per second are
+given for each stage. A second pass under tracemalloc reports the Python
+allocation peak and net allocated blocks; RSS growth covers tensor memory,
+which tracemalloc does not see.
+
+A message of length N is N corpus lines joined with spaces. Caches are
+cleared before every batch, so each batch does the full work.
+
+--config can be repeated to compare configurations side by side. Keys:
+backend (fp32/int8), tiers (e.g. url,spam,toxic), fast_path (0/1) and
+cache_dir. The default compares the fp32 and int8 backends.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from MessageChecker import Models, URL_PATTERN, NeedsTranslation, NormalizeText, LoadWordList
+from benchmarks.quantization_check import CORPUS, CurrentRss
+
+# (tokenizer attribute, model attribute, aşama adı)
+STAGES = [
+    ("tokenizerTr_En", "modelTr_En", "translate"),
+    ("tokenizerSpam", "ModelSpam", "spam"),
+    ("tokenizerToxic", "modelToxic", "toxic"),
+    ("tokenizerUrl", "ModelUrl", "url")
+]
+COLUMNS = ["translate.tokenize", "translate.generate", "translate.decode", "spam.tokenize", "spam.forward",
+           "toxic.tokenize", "toxic.forward", "url.tokenize", "url.forward", "glue"]
+
+
+class StageTimer:
+    """Wall time, call count and token count per stage."""
+
+    def __init__(self):
+        self.Reset()
+
+    def Reset(self):
+        self.seconds = {}
+        self.tokens = {}
+        self.calls = {}
+
+    def Add(self, stage, seconds, tokens=0):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.tokens[stage] = self.tokens.get(stage, 0) + tokens
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+
+def RealTokens(encoded):
+    mask = encoded.get("attention_mask") if hasattr(encoded, "get") else None
+    return int(mask.sum()) if mask is not None else 0
+
+
+class TimedTokenizer:
+    def __init__(self, tokenizer, stage, timer):
+        self.tokenizer = tokenizer
+        self.stage = stage
+        self.timer = timer
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        encoded = self.tokenizer(*args, **kwargs)
+        self.timer.Add(f"{self.stage}.tokenize", time.perf_counter() - start, RealTokens(encoded))
+        return encoded
+
+    def batch_decode(self, sequences, **kwargs):
+        start = time.perf_counter()
+        texts = self.tokenizer.batch_decode(sequences, **kwargs)
+        self.timer.Add(f"{self.stage}.decode", time.perf_counter() - start, int(sequences.numel()))
+        return texts
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+
+class TimedModel:
+    def __init__(self, model, stage, timer):
+        self.model = model
+        self.stage = stage
+        self.timer = timer
+
+    def __call__(self, **inputs):
+        start = time.perf_counter()
+        outputs = self.model(**inputs)
+        self.timer.Add(f"{self.stage}.forward", time.perf_counter() - start, RealTokens(inputs))
+        return outputs
+
+    # Token sayısı: üretilen (padding dahil) çıktı token'ları
+    def generate(self, **inputs):
+        start = time.perf_counter()
+        generated = self.model.generate(**inputs)
+        self.timer.Add(f"{self.stage}.generate", time.perf_counter() - start, int(generated.numel()))
+        return generated
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def ParseConfig(text):
+    name, _, options = text.partition(":")
+    config = {'name': name, 'backend': name if name in ("fp32", "int8") else "fp32"}
+    for option in filter(None, options.split(";")):
+        key, _, value = option.partition("=")
+        if key not in ("backend", "tiers", "fast_path", "cache_dir"):
+            raise ValueError(f"Unknown config key: {key}")
+        config[key] = value
+    return config
+
+
+def LoadModels(config, timer):
+    kwargs = {'backend': config['backend'], 'translation_cache_size': 0, 'cache_dir': config.get('cache_dir')}
+    if 'tiers' in config:
+        kwargs['tiers'] = config['tiers']
+    if 'fast_path' in config:
+        kwargs['translation_fast_path'] = config['fast_path'] == "1"
+    start = time.monotonic()
+    models = Models(**kwargs)
+    load_seconds = time.monotonic() - start
+    for tokenizer_attr, model_attr, stage in STAGES:
+        setattr(models, tokenizer_attr, TimedTokenizer(getattr(models, tokenizer_attr), stage, timer))
+        setattr(models, model_attr, TimedModel(getattr(models, model_attr), stage, timer))
+    return models, load_seconds
+
+
+def Messages(corpus, length):
+    return [" ".join(corpus[(i + k) % len(corpus)] for k in range(length)) for i in range(len(corpus))]
+
+
+def Batches(messages, batch_size):
+    return [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+
+
+def Category(message):
+    if URL_PATTERN.search(message):
+        return "url"
+    if NeedsTranslation(NormalizeText(message)):
+        return "translated"
+    return "english/other"
+
+
+# Her batch'ten önce cache'ler boşalır: tekrar eden mesajlar/URL'ler de modellere gider
+def RunBatches(models, batches):
+    for batch in batches:
+        models.Invalidate()
+        models.IsBadMessages(batch)
+
+
+def Measure(models, timer, messages, batch_size, repeat, trace_alloc):
+    batches = Batches(messages, batch_size)
+    RunBatches(models, batches[:1])
+    timer.Reset()
+
+    rss_before = CurrentRss()
+    rss_peak = rss_before
+    total = 0.0
+    for _ in range(repeat):
+        for batch in batches:
+            models.Invalidate()
+            start = time.perf_counter()
+            models.IsBadMessages(batch)
+            total += time.perf_counter() - start
+            rss_peak = max(rss_peak, CurrentRss())
+
+    count = len(messages) * repeat
+    staged = sum(timer.seconds.values())
+    stages = {}
+    for stage in COLUMNS[:-1]:
+        seconds = timer.seconds.get(stage, 0.0)
+        tokens = timer.tokens.get(stage, 0)
+        stages[stage] = {'ms_per_message': seconds / count * 1000, 'share': seconds / total if total else 0.0,
+                         'calls': timer.calls.get(stage, 0), 'tokens': tokens,
+                         'tokens_per_second': tokens / seconds if seconds else None}
+    glue = max(0.0, total - staged)
+    stages['glue'] = {'ms_per_message': glue / count * 1000, 'share': glue / total if total else 0.0}
+
+    result = {
+        'batch_size': batch_size,
+        'messages': count,
+        'seconds': total,
+        'messages_per_second': count / total if total else 0.0,
+        'ms_per_message': total / count * 1000,
+        'rss_growth_bytes': rss_peak - rss_before,
+        'stages': stages
+    }
+    if trace_alloc:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        RunBatches(models, batches)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        result['alloc_peak_bytes'] = peak
+        result['alloc_net_blocks'] = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return result
+
+
+def Evaluate(config, corpus, lengths, batch_sizes, repeat, trace_alloc):
+    timer = StageTimer()
+    models, load_seconds = LoadModels(config, timer)
+    rows = []
+    for length in lengths:
+        messages = Messages(corpus, length)
+        for batch_size in batch_sizes:
+            row = Measure(models, timer, messages, batch_size, repeat, trace_alloc)
+            row['length'] = length
+            rows.append(row)
+    return {'config': config, 'load_seconds': load_seconds, 'tiers': models.tiers, 'rows': rows}
+
+
+def Print(result):
+    config = result['config']
+    options = ", ".join(f"{k}={v}" for k, v in config.items() if k not in ('name', 'tiers'))
+    print(f"\n{config['name']} ({options}; tiers={','.join(result['tiers'])}), load {result['load_seconds']:.1f}s")
+    traced = f"{'py peak MB':>11}{'py blocks':>10}" if 'alloc_peak_bytes' in result['rows'][0] else ""
+    print(f"{'len':>4}{'batch':>6}{'msg/s':>9}{'ms/msg':>9}{'RSS +MB':>9}{traced}")
+    for row in result['rows']:
+        peak = f"{row['alloc_peak_bytes'] / 2**20:>11.1f}{row['alloc_net_blocks']:>10}" if 'alloc_peak_bytes' in row else ""
+        print(f"{row['length']:>4}{row['batch_size']:>6}{row['messages_per_second']:>9.1f}{row['ms_per_message']:>9.1f}"
+              f"{row['rss_growth_bytes'] / 2**20:>9.1f}{peak}")
+
+    print("ms per message by stage (share of wall time):")
+    print(f"{'len':>4}{'batch':>6}" + "".join(f"{c.replace('translate', 'tr'):>15}" for c in COLUMNS))
+    for row in result['rows']:
+        cells = "".join(f"{row['stages'][c]['ms_per_message']:>10.2f} {row['stages'][c]['share']:>4.0%}" for c in COLUMNS)
+        print(f"{row['length']:>4}{row['batch_size']:>6}{cells}")
+
+    print("tokens per second by stage:")
+    print(f"{'len':>4}{'batch':>6}" + "".join(f"{c.replace('translate', 'tr'):>15}" for c in COLUMNS[:-1]))
+    for row in result['rows']:
+        cells = "".join(f"{row['stages'][c]['tokens_per_second'] or 0:>15.0f}" for c in COLUMNS[:-1])
+        print(f"{row['length']:>4}{row['batch_size']:>6}{cells}")
+
+
+def PrintComparison(results):
+    reference = results[0]
+    print(f"\nms per message, relative to {reference['config']['name']}:")
+    print(f"{'len':>4}{'batch':>6}" + "".join(f"{r['config']['name']:>16}" for r in results))
+    for i, row in enumerate(reference['rows']):
+        cells = "".join(f"{r['rows'][i]['ms_per_message']:>9.1f} {r['rows'][i]['ms_per_message'] / row['ms_per_message']:>5.2f}x"
+                        for r in results)
+        print(f"{row['length']:>4}{row['batch_size']:>6}{cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--lengths", default="1,4,16", help="corpus lines joined into one message")
+    parser.add_argument("--batch-sizes", default="1,8", help="messages per IsBadMessages call")
+    parser.add_argument("--repeat", type=int, default=1, help="timed passes over the corpus")
+    parser.add_argument("--config", action="append", default=None,
+                        help="NAME[:key=value;...], repeatable (default: fp32 and int8)")
+    parser.add_argument("--no-alloc", dest="trace_alloc", action="store_false",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("--json", dest="json_out", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    corpus = LoadWordList(args.corpus)
+    lengths = [int(n) for n in args.lengths.split(",")]
+    batch_sizes = [int(n) for n in args.batch_sizes.split(",")]
+    configs = [ParseConfig(c) for c in (args.config or ["fp32", "int8"])]
+
+    categories = {}
+    for message in corpus:
+        category = Category(message)
+        categories[category] = categories.get(category, 0) + 1
+    print(f"{len(corpus)} messages from {args.corpus}: "
+          + ", ".join(f"{count} {name}" for name, count in sorted(categories.items())))
+
+    results = []
+    for config in configs:
+        result = Evaluate(config, corpus, lengths, batch_sizes, args.repeat, args.trace_alloc)
+        Print(result)
+        results.append(result)
+    if len(results) > 1:
+        PrintComparison(results)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({'corpus': args.corpus, 'categories': categories, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
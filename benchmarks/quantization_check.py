@@ -0,0 +1,144 @@
+"""Compare the fp32 and int8 inference backends on the local moderation corpus.
+
+Usage (from the repository root):
+    python -m benchmarks.quantization_check [--corpus FILE] [--json OUT]
+
+Reports load time, in-memory weight size, RSS growth and per-message
+latency for each backend, plus how often the int8 translation, spam,
+toxicity and final verdicts differ from fp32. Each backend runs in its
+own process, so the RSS numbers of one do not include the other.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import time
+
+import torch
+
+from MessageChecker import Models, MODEL_SPECS, LoadWordList
+
+CORPUS = os.path.join(os.path.dirname(__file__), "moderation_corpus.txt")
+
+
+def CurrentRss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def TensorBytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(TensorBytes(v) for v in value)
+    return 0
+
+
+# Quantize edilmiş Linear ağırlıkları state_dict içinde (qtensor, bias) tuple'ı olarak durur
+def WeightBytes(models):
+    return sum(
+        TensorBytes(value)
+        for _, model_attr, _, _ in MODEL_SPECS
+        for value in getattr(models, model_attr).state_dict().values()
+    )
+
+
+def Percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def Evaluate(backend, messages, cache_dir=None):
+    rss_before = CurrentRss()
+    start = time.monotonic()
+    # Cache ve ön filtre kapalı: her mesaj tüm modellerden geçsin
+    models = Models(backend=backend, cache_dir=cache_dir, translation_cache_size=0, tiers="url,spam,toxic")
+    load_seconds = time.monotonic() - start
+
+    # Sadece uygulamanın yolu (IsBadMessage) ölçülür; model bazlı sonuçlar ölçüm dışında toplanır
+    verdicts = []
+    latencies = []
+    for message in messages:
+        start = time.monotonic()
+        try:
+            verdicts.append(models.IsBadMessage(message))
+        except Exception as e:
+            verdicts.append(f"error: {type(e).__name__}")
+        latencies.append(time.monotonic() - start)
+
+    rows = []
+    for message, verdict in zip(messages, verdicts):
+        translation = models.TR_EN(message)
+        rows.append({
+            'translation': translation,
+            'spam': models.SpamBatch([translation])[0],
+            'toxic': models.ToxicBatch([translation])[0],
+            'verdict': verdict
+        })
+
+    return {
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'weight_bytes': WeightBytes(models),
+        'rss_growth_bytes': CurrentRss() - rss_before,
+        'latency_mean_ms': statistics.mean(latencies) * 1000,
+        'latency_p95_ms': Percentile(latencies, 0.95) * 1000,
+        'rows': rows
+    }
+
+
+# Her backend yeni bir süreçte: bir öncekinin modelleri ve allocator'ı RSS ölçümüne karışmasın
+def EvaluateInProcess(backend, messages, cache_dir=None):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(Evaluate, backend, messages, cache_dir).result()
+
+
+def Drift(reference, candidate, messages):
+    report = {}
+    for field in ('translation', 'spam', 'toxic', 'verdict'):
+        differing = [
+            {'message': m, 'fp32': r[field], 'int8': c[field]}
+            for m, r, c in zip(messages, reference['rows'], candidate['rows'])
+            if r[field] != c[field]
+        ]
+        report[field] = {'differing': len(differing), 'rate': len(differing) / len(messages), 'examples': differing[:5]}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--cache-dir", default=None, help="MODEL_CACHE_DIR to download the hub files into")
+    parser.add_argument("--json", dest="json_out", default=None, help="write the full report to this file")
+    args = parser.parse_args()
+
+    messages = LoadWordList(args.corpus)
+    fp32 = EvaluateInProcess("fp32", messages, args.cache_dir)
+    int8 = EvaluateInProcess("int8", messages, args.cache_dir)
+    drift = Drift(fp32, int8, messages)
+
+    print(f"{len(messages)} messages from {args.corpus}")
+    print(f"{'backend':<8}{'load s':>10}{'weights MB':>12}{'RSS +MB':>10}{'mean ms':>10}{'p95 ms':>10}")
+    for result in (fp32, int8):
+        print(f"{result['backend']:<8}{result['load_seconds']:>10.2f}{result['weight_bytes'] / 2**20:>12.1f}"
+              f"{result['rss_growth_bytes'] / 2**20:>10.1f}{result['latency_mean_ms']:>10.1f}{result['latency_p95_ms']:>10.1f}")
+    print(f"speedup: {fp32['latency_mean_ms'] / int8['latency_mean_ms']:.2f}x, "
+          f"weights: {int8['weight_bytes'] / fp32['weight_bytes']:.2%} of fp32")
+    for field, result in drift.items():
+        print(f"{field:<12} differs on {result['differing']}/{len(messages)} ({result['rate']:.1%})")
+        for example in result['examples']:
+            print(f"    {example['message'][:60]!r}: fp32={example['fp32']!r} int8={example['int8']!r}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({'fp32': fp32, 'int8': int8, 'drift': drift}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,101 @@ class Config:
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     SECRET_KEY = os.getenv("SECRET_KEY")
     FERNET_KEY = os.getenv("FERNET_KEY")
-    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 3600))
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 3600))
+
+    # Moderasyon micro-batching ayarları
+    MODERATION_BATCH_WINDOW_MS = float(os.getenv("MODERATION_BATCH_WINDOW_MS", 5))
+    MODERATION_MAX_BATCH = int(os.getenv("MODERATION_MAX_BATCH", 16))
+    MODERATION_MAX_PENDING = int(os.getenv("MODERATION_MAX_PENDING", 1024))
+
+    # TR->EN çeviri cache'i (0 kapatır). Düz metin tuttuğu için sadece VERDICT_CACHE_SIZE=0 iken kullanılır
+    TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 4096))
+    TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", 3600))
+    # İngilizce / çevrilecek içeriği olmayan mesajlarda çeviriyi atla
+    TRANSLATION_FAST_PATH = os.getenv("TRANSLATION_FAST_PATH", "1") == "1"
+
+    # Moderasyon kademeleri (ucuzdan pahalıya) ve ön filtre listeleri (satır başına bir kelime / domain)
+    MODERATION_TIERS = os.getenv("MODERATION_TIERS", "prefilter,url,spam,toxic")
+    MODERATION_BLOCKLIST_FILE = os.getenv("MODERATION_BLOCKLIST_FILE")
+    MODERATION_BAD_DOMAINS_FILE = os.getenv("MODERATION_BAD_DOMAINS_FILE")
+
+    # Model yükleme: paralel worker sayısı, hub indirme cache klasörü (boşsa HF varsayılanı), warm-up
+    MODEL_LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", 4))
+    MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR")
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+    # fp32 veya int8 (dinamik quantization, CPU). Geçmeden önce: python -m benchmarks.quantization_check
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fp32")
+
+    # send_message pipeline: finish worker sayısı ve kuyruk sınırları
+    MESSAGE_WORKERS = int(os.getenv("MESSAGE_WORKERS", 4))
+    MESSAGE_MAX_PENDING = int(os.getenv("MESSAGE_MAX_PENDING", 1024))
+    MESSAGE_MAX_PENDING_PER_CHAT = int(os.getenv("MESSAGE_MAX_PENDING_PER_CHAT", 64))
+
+    # URL sınıflandırma cache'leri: normalize URL başına verdict, kötü çıkan domainler (anahtarlar HMAC)
+    URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", 8192))
+    URL_CACHE_TTL = int(os.getenv("URL_CACHE_TTL", 3600))
+    URL_DOMAIN_CACHE_SIZE = int(os.getenv("URL_DOMAIN_CACHE_SIZE", 4096))
+    URL_DOMAIN_CACHE_TTL = int(os.getenv("URL_DOMAIN_CACHE_TTL", 3600))
+
+    # Mesaj içeriği hash'ine göre verdict cache'i (düz metin tutulmaz)
+    VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", 16384))
+    VERDICT_CACHE_TTL = int(os.getenv("VERDICT_CACHE_TTL", 600))
+
+    # SQLite: dosya yolu ve bağlantı havuzu boyutu
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "NeuralNetworks.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+
+    # AddMessage write-behind modu: mesajlar kuyruktan toplu transaction'larla yazılır
+    DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0") == "1"
+    DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", 256))
+    DB_WRITE_INTERVAL_MS = float(os.getenv("DB_WRITE_INTERVAL_MS", 20))
+    DB_WRITE_QUEUE = int(os.getenv("DB_WRITE_QUEUE", 10000))
+    DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", 5))
+
+    # Kullanıcı durumları bellekte tutulur, Users.Status'a bu aralıkla yazılır (0: hiç yazma)
+    PRESENCE_PERSIST_INTERVAL = float(os.getenv("PRESENCE_PERSIST_INTERVAL", 30))
+    # Durum değişiklikleri bu pencere içinde birleştirilip tek delta olarak yayınlanır
+    PRESENCE_BROADCAST_MS = float(os.getenv("PRESENCE_BROADCAST_MS", 100))
+
+    # join_chat ilk sayfayı gönderir, eskiler load_older_messages ile istenir
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+
+    # Aktif chatlerin son mesajları bellekte (çözülmüş); chat başına ve toplam sınır
+    HOT_CHAT_MESSAGES = int(os.getenv("HOT_CHAT_MESSAGES", 200))
+    HOT_CHAT_MAX_BYTES = int(os.getenv("HOT_CHAT_MAX_BYTES", 64 * 1024 * 1024))
+
+    # Chat mesajlarının deposu: "sqlite" (NeuralNetworks.db) veya "memory" (sadece RAM, şifreli)
+    CHAT_STORAGE = os.getenv("CHAT_STORAGE", "sqlite")
+    MEMORY_CHAT_MAX_MESSAGES = int(os.getenv("MEMORY_CHAT_MAX_MESSAGES", 10000))
+    MEMORY_CHAT_MAX_BYTES = int(os.getenv("MEMORY_CHAT_MAX_BYTES", 256 * 1024 * 1024))
+
+    # async_app.py: socket olaylarının bloklayan kısmını (SQLite, Fernet) çalıştıran thread sayısı
+    ASYNC_HANDLER_WORKERS = int(os.getenv("ASYNC_HANDLER_WORKERS", 32))
+
+    # Birden fazla worker süreci: "memory" (tek süreç) veya "sqlite" (aynı makinedeki worker'lar ortak dosya kullanır)
+    SHARED_STATE = os.getenv("SHARED_STATE", "memory")
+    SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "SharedState.db")
+    # Cevaplanmayan chat isteği bu kadar saniye sonra düşer
+    CHAT_REQUEST_TTL = float(os.getenv("CHAT_REQUEST_TTL", 300))
+    # Worker'lar arası emit kuyruğu: redis://..., amqp://..., kafka://... veya sqlite:///SocketQueue.db (boş: yok)
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    MESSAGE_QUEUE_POLL_MS = float(os.getenv("MESSAGE_QUEUE_POLL_MS", 10))
+    PRESENCE_POLL_MS = float(os.getenv("PRESENCE_POLL_MS", 250))
+    # Heartbeat'i WORKER_TTL saniye gelmeyen worker ölü sayılır, kullanıcıları offline olur
+    WORKER_HEARTBEAT = float(os.getenv("WORKER_HEARTBEAT", 5))
+    WORKER_TTL = float(os.getenv("WORKER_TTL", 30))
+    PORT = int(os.getenv("PORT", 5000))
+
+    # /metrics (Prometheus); verilirse "Authorization: Bearer <token>" istenir
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Mesaj yolu izleme: örneklenen mesaj oranı; TRACE_SLOW_MS'den uzun sürenler span dökümüyle loga yazılır
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+    TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 500))
+    TRACE_SLOW_LOG = os.getenv("TRACE_SLOW_LOG", "slow_requests.log")
+
+    # /admin/* uçlarını kullanabilecek kullanıcılar (virgülle ayrılmış); boşsa kapalı
+    ADMIN_USERS = frozenset(u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip())
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+    PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", 5))
@@ -191,14 +191,30 @@ socket.on('connect', () => {
     console.log('Socket.IO connection established');
 });
 
-socket.on('userStatusUpdate', (data) => {
-    updateUserStatus(data.user);
-});
+// Presence: the server sends a full list on connect, then versioned deltas
+let presenceVersion = null;
+const knownUsers = new Map();
 
 socket.on('userList', (data) => {
+    presenceVersion = data.version;
+    knownUsers.clear();
     createUserElements(data.users);
 });
 
+socket.on('presenceDelta', (data) => {
+    if (presenceVersion === null || data.from_version > presenceVersion) {
+        // Missed a delta (or no snapshot yet): resync with a full list
+        socket.emit('request_user_list');
+        return;
+    }
+    if (data.version <= presenceVersion) {
+        return;
+    }
+    presenceVersion = data.version;
+    data.changes.forEach(user => knownUsers.set(user.username, user));
+    createUserElements([...knownUsers.values()]);
+});
+
 socket.on('disconnect', (reason) => {
     console.log('Socket disconnected:', reason);
     if (reason === 'io server disconnect') {
@@ -310,6 +326,7 @@ function sortUsersByStatus(users) {
 // Create user elements
 function createUserElements(users) {
     userGrid.innerHTML = '';
+    users.forEach(user => knownUsers.set(user.username, user));
     
     // Filter out current user and sort remaining users by status
     const filteredUsers = users.filter(user => user.username !== currentUsername);
@@ -341,7 +358,7 @@ function createUserElements(users) {
             <div class="user-status ${user.status}">${statusText}</div>
         `;
         
-        userElement.addEventListener('click', () => handleUserClick(user));
+        userElement.addEventListener('click', () => handleUserClick(knownUsers.get(user.username) || user));
         userGrid.appendChild(userElement);
     });
 }
@@ -593,6 +610,7 @@ function closeChatWindow() {
     chatWindow.style.display = 'none';
     blurOverlay.style.display = 'none';
     chatMessages.innerHTML = ''; // Clear chat history
+    historyHasMore = false;
     currentChatRoom = null;
     
     // Reset window position and size for next time
@@ -685,16 +703,52 @@ function centerChatWindow() {
 
 // Add message to chat
 function addMessage(text, type) {
-    const messageDiv = document.createElement('div');
-    messageDiv.className = `chat-message message-${type}`;
-    messageDiv.textContent = text;
-    
-    chatMessages.appendChild(messageDiv);
+    chatMessages.appendChild(createMessageElement(text, type));
     
     // Scroll to the bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+function createMessageElement(text, type) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `chat-message message-${type}`;
+    messageDiv.textContent = text;
+    return messageDiv;
+}
+
+// History paging: the server sends the newest page first, older pages on scroll-up
+let historyCursor = null;
+let historyHasMore = false;
+let historyLoading = false;
+
+function setHistoryPage(data) {
+    historyCursor = data.cursor;
+    historyHasMore = data.has_more;
+    historyLoading = false;
+
+    // A page that does not fill the pane leaves nothing to scroll, so fetch the next one right away
+    if (chatWindow.style.display !== 'none' && chatMessages.scrollHeight <= chatMessages.clientHeight) {
+        loadOlderMessages();
+    }
+}
+
+function loadOlderMessages() {
+    if (!historyHasMore || historyLoading) {
+        return;
+    }
+    historyLoading = true;
+    socket.emit('load_older_messages', {
+        other_user: chatUserName.textContent,
+        before: historyCursor
+    });
+}
+
+chatMessages.addEventListener('scroll', () => {
+    if (chatMessages.scrollTop === 0) {
+        loadOlderMessages();
+    }
+});
+
 // Send message on Enter key press
 chatInput.addEventListener('keypress', (e) => {
     if (e.key === 'Enter') {
@@ -831,38 +885,6 @@ document.addEventListener('DOMContentLoaded', () => {
     fetchUsers();
 });
 
-// Update specific user's status
-function updateUserStatus(updatedUser) {
-    const userElements = document.querySelectorAll('.user-bubble');
-    userElements.forEach(element => {
-        const username = element.querySelector('.user-name').textContent;
-        if (username === updatedUser.username) {
-            // Update status class
-            const avatar = element.querySelector('.user-avatar');
-            avatar.className = `user-avatar ${updatedUser.status}`;
-            
-            // Update status text
-            const statusElement = element.querySelector('.user-status');
-            statusElement.className = `user-status ${updatedUser.status}`;
-            
-            // Translate status to Turkish
-            let statusText = '';
-            switch(updatedUser.status) {
-                case 'idle':
-                    statusText = 'Aktif';
-                    break;
-                case 'busy':
-                    statusText = 'Meşgul';
-                    break;
-                case 'offline':
-                    statusText = 'Çevrimdışı';
-                    break;
-            }
-            statusElement.textContent = statusText;
-        }
-    });
-}
-
 // Handle tab/window close
 window.addEventListener('beforeunload', () => {
     // If there's an active chat, send chat end event
@@ -953,13 +975,30 @@ socket.on('chat_started', (data) => {
     // Clear existing messages first
     chatMessages.innerHTML = '';
     
-    // Display chat history
+    // Display the newest page of chat history
     if (data.messages && data.messages.length > 0) {
         data.messages.forEach(msg => {
             const messageType = msg.sender === chatUserName.textContent ? 'received' : 'sent';
             addMessage(msg.message, messageType);
         });
     }
+    setHistoryPage(data);
+});
+
+// Prepend an older page of history, keeping the visible messages in place
+socket.on('older_messages', (data) => {
+    if (data.other_user !== chatUserName.textContent) {
+        return;
+    }
+    const previousHeight = chatMessages.scrollHeight;
+    const fragment = document.createDocumentFragment();
+    data.messages.forEach(msg => {
+        const messageType = msg.sender === chatUserName.textContent ? 'received' : 'sent';
+        fragment.appendChild(createMessageElement(msg.message, messageType));
+    });
+    chatMessages.insertBefore(fragment, chatMessages.firstChild);
+    chatMessages.scrollTop = chatMessages.scrollHeight - previousHeight;
+    setHistoryPage(data);
 });
 
 // Handle new messages
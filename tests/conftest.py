@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modüller depo kökünden import edilir (python -m pytest ya da pytest, hangi dizinden çalışırsa)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
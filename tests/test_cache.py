@@ -0,0 +1,43 @@
+import time
+
+from Cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=0)
+    cache.Put("a", 1)
+    cache.Put("b", 2)
+    assert cache.Get("a") == 1
+    cache.Put("c", 3)
+
+    assert cache.Get("b") is None
+    assert cache.Get("a") == 1 and cache.Get("c") == 3
+    assert cache.Stats()['size'] == 2
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(max_size=10, ttl=0.05)
+    cache.Put("a", 1)
+    assert cache.Get("a") == 1
+    time.sleep(0.1)
+
+    assert cache.Get("a", "gone") == "gone"
+    assert cache.Stats()['size'] == 0
+
+
+def test_zero_size_disables_the_cache():
+    cache = TTLCache(max_size=0)
+    cache.Put("a", 1)
+    assert cache.Get("a") is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = TTLCache(max_size=10)
+    cache.Put("a", 1)
+    cache.Get("a")
+    cache.Get("b")
+
+    stats = cache.Stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+    cache.Clear()
+    assert cache.Stats()['size'] == 0
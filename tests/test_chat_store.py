@@ -0,0 +1,49 @@
+import pytest
+
+from ChatStore import MESSAGE_OVERHEAD, MemoryChatStore
+
+
+def test_chat_keeps_only_the_newest_messages():
+    store = MemoryChatStore(max_messages_per_chat=3)
+    chat_id = store.NewChat("alice", "bob")
+    for i in range(5):
+        assert store.AddMessage(chat_id, "alice", f"m{i}") == i + 1
+
+    assert [m for _, _, m in store.GetMessages(chat_id)] == ["m2", "m3", "m4"]
+    assert [seq for seq, _, _, _ in store.GetMessagesPage(chat_id, before_seq=5, limit=10)] == [4, 3]
+    assert store.bytes == 3 * (MESSAGE_OVERHEAD + len("alice") + len("m0"))
+
+
+def test_storage_limit_refuses_new_messages():
+    size = MESSAGE_OVERHEAD + len("alice") + len("m0")
+    store = MemoryChatStore(max_bytes=2 * size)
+    chat_id = store.NewChat("alice", "bob")
+    store.AddMessage(chat_id, "alice", "m0")
+    store.AddMessage(chat_id, "alice", "m1")
+
+    with pytest.raises(RuntimeError):
+        store.AddMessage(chat_id, "alice", "m2")
+    assert len(store.GetMessages(chat_id)) == 2
+
+
+def test_full_chat_ring_frees_room_for_its_next_message():
+    size = MESSAGE_OVERHEAD + len("alice") + len("m0")
+    store = MemoryChatStore(max_messages_per_chat=2, max_bytes=2 * size)
+    chat_id = store.NewChat("alice", "bob")
+    for i in range(4):
+        store.AddMessage(chat_id, "alice", f"m{i}")
+    assert store.bytes == 2 * size
+
+
+def test_delete_chat_releases_its_bytes_and_pair():
+    store = MemoryChatStore()
+    chat_id = store.NewChat("alice", "bob")
+    store.AddMessage(chat_id, "alice", "hello")
+    assert store.GetChatID("bob", "alice") == chat_id
+    assert store.GetActiveChats("bob") == [{'chat_id': chat_id, 'other_user': "alice"}]
+
+    store.DeleteChat(chat_id)
+    assert store.bytes == 0
+    assert store.GetChatID("alice", "bob") is None
+    with pytest.raises(KeyError):
+        store.AddMessage(chat_id, "alice", "late")
@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+
+from DataBase import DB
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def db(request, tmp_path):
+    db = DB(path=str(tmp_path / "test.db"), pool_size=2, write_behind=False, chat_storage=request.param)
+    yield db
+    db.Close()
+
+
+def test_add_message_assigns_increasing_seq(db):
+    chat_id = db.NewChat("alice", "bob")
+    assert [db.AddMessage(chat_id, "alice", f"m{i}") for i in range(3)] == [1, 2, 3]
+    assert [row[2] for row in db.GetMessages(chat_id)] == ["m0", "m1", "m2"]
+
+
+def test_add_message_to_deleted_chat_raises(db):
+    chat_id = db.NewChat("alice", "bob")
+    db.AddMessage(chat_id, "alice", "early")
+    db.DeleteChat(chat_id)
+
+    with pytest.raises(KeyError):
+        db.AddMessage(chat_id, "alice", "late")
+    assert db.GetMessages(chat_id) == []
+
+
+def test_sweep_removes_chats_and_legacy_tables(tmp_path):
+    db = DB(path=str(tmp_path / "test.db"), pool_size=2, write_behind=False, chat_storage="sqlite")
+    try:
+        chat_id = db.NewChat("alice", "bob")
+        db.AddMessage(chat_id, "alice", "hello")
+        with db.pool.Connection() as conn, conn:
+            conn.execute("CREATE TABLE Chat_7 (Time TEXT)")
+
+        assert db.SweepOrphanedChats() == 2
+        assert db.GetChatID("alice", "bob") is None
+        assert db.GetMessages(chat_id) == []
+        assert db._Query("SELECT name FROM sqlite_master WHERE name='Chat_7'") == []
+    finally:
+        db.Close()
+
+
+@pytest.fixture
+def write_behind_db(tmp_path):
+    db = DB(path=str(tmp_path / "test.db"), pool_size=2, write_behind=True, chat_storage="sqlite")
+    yield db
+    db.Close()
+
+
+def _Flushed(writer, timeout=5.0):
+    flusher = threading.Thread(target=writer.Flush, daemon=True)
+    flusher.start()
+    flusher.join(timeout)
+    return not flusher.is_alive()
+
+
+def test_write_behind_keeps_order_across_batches(write_behind_db):
+    write_behind_db.chats.writer.max_batch = 7
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    seqs = [write_behind_db.AddMessage(chat_id, "alice", f"m{i}") for i in range(50)]
+
+    assert seqs == list(range(1, 51))
+    assert [row[2] for row in write_behind_db.GetMessages(chat_id)] == [f"m{i}" for i in range(50)]
+
+
+def test_flush_writes_everything_queued_before_it(write_behind_db):
+    writer = write_behind_db.chats.writer
+    writer.interval = 60
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    for i in range(5):
+        write_behind_db.AddMessage(chat_id, "alice", f"m{i}")
+
+    assert _Flushed(writer)
+    assert writer.Pending() == 0
+    assert len(write_behind_db._Query("SELECT Seq FROM Messages WHERE ChatID=?", (chat_id,))) == 5
+
+
+def test_failed_row_is_counted_and_others_are_written(write_behind_db):
+    writer = write_behind_db.chats.writer
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    writer.Put((chat_id, 1, "t", "alice", "first"))
+    writer.Put((chat_id, 1, "t", "alice", "duplicate seq"))
+    writer.Put((chat_id, 2, "t", "alice", "second"))
+
+    assert _Flushed(writer)
+    assert writer.failed == 1
+    assert [row[2] for row in write_behind_db.GetMessages(chat_id)] == ["first", "second"]
+
+
+def test_unexpected_error_does_not_stop_the_writer(write_behind_db):
+    writer = write_behind_db.chats.writer
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    pool = writer.pool
+
+    class BrokenPool:
+        def Connection(self):
+            raise MemoryError("boom")
+
+    writer.pool = BrokenPool()
+    writer.Put((chat_id, 1, "t", "alice", "lost"))
+    assert _Flushed(writer)
+    assert writer.failed == 1
+
+    writer.pool = pool
+    writer.Put((chat_id, 2, "t", "alice", "kept"))
+    assert _Flushed(writer)
+    assert writer.thread.is_alive()
+    assert [row[2] for row in write_behind_db.GetMessages(chat_id)] == ["kept"]
+
+
+def test_delete_chat_drops_queued_rows(write_behind_db):
+    writer = write_behind_db.chats.writer
+    writer.interval = 60
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    other_id = write_behind_db.NewChat("carol", "dave")
+    write_behind_db.AddMessage(chat_id, "alice", "queued")
+    write_behind_db.AddMessage(other_id, "carol", "other chat")
+    write_behind_db.DeleteChat(chat_id)
+
+    assert _Flushed(writer)
+    assert writer.failed == 0
+    assert write_behind_db._Query("SELECT ChatID, EncodedMessage FROM Messages") == [(other_id, "other chat")]
+    with pytest.raises(KeyError):
+        write_behind_db.AddMessage(chat_id, "alice", "late")
+
+
+def test_row_for_deleted_chat_is_not_written(write_behind_db):
+    writer = write_behind_db.chats.writer
+    chat_id = write_behind_db.NewChat("alice", "bob")
+    write_behind_db.DeleteChat(chat_id)
+    writer.Put((chat_id, 1, "t", "alice", "late"))
+
+    assert _Flushed(writer)
+    assert write_behind_db._Query("SELECT COUNT(*) FROM Messages", one=True)[0] == 0
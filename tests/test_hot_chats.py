@@ -0,0 +1,37 @@
+from HotChats import HotChats
+
+
+def _Message(seq):
+    return {'seq': seq, 'sender': 'alice', 'message': f"m{seq}", 'time': "t"}
+
+
+def test_append_extends_started_chat():
+    chats = HotChats(per_chat=10, max_bytes=10**6)
+    chats.Start(1)
+    for seq in (1, 2, 3):
+        chats.Append(1, _Message(seq))
+
+    assert [m['seq'] for m in chats.Page(1, limit=10)] == [1, 2, 3]
+
+
+def test_append_after_drop_does_not_bring_the_chat_back():
+    chats = HotChats(per_chat=10, max_bytes=10**6)
+    chats.Start(1)
+    chats.Append(1, _Message(1))
+    chats.Drop(1)
+    chats.Append(1, _Message(2))
+
+    assert chats.Page(1) is None
+    assert chats.Stats()['chats'] == 0
+    assert chats.Stats()['bytes'] == 0
+
+
+def test_seed_ignores_a_read_older_than_the_last_message():
+    chats = HotChats(per_chat=10, max_bytes=10**6)
+    # Sayfa DB'den okunduktan sonra 3 numaralı mesaj yazıldı
+    chats.Append(1, _Message(3))
+    chats.Seed(1, [_Message(1), _Message(2)], complete=True)
+    assert chats.Page(1) is None
+
+    chats.Seed(1, [_Message(1), _Message(2), _Message(3)], complete=True)
+    assert [m['seq'] for m in chats.Page(1, limit=10)] == [1, 2, 3]
@@ -0,0 +1,122 @@
+from concurrent.futures import Future
+import threading
+
+import pytest
+
+from MessagePipeline import MessagePipeline
+
+
+class ManualModerator:
+    """Verdicts are set by the test, in any order."""
+
+    def __init__(self):
+        self.futures = {}
+
+    def Submit(self, message):
+        if not isinstance(message, str):
+            raise TypeError("message must be str")
+        future = Future()
+        self.futures[message] = future
+        return future
+
+
+class Finished:
+    def __init__(self, expected):
+        self.jobs = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, job, is_bad, error):
+        self.jobs.append((job['message'], is_bad, error))
+        if len(self.jobs) == self.expected:
+            self.done.set()
+
+
+def test_messages_of_a_chat_finish_in_submit_order():
+    moderator = ManualModerator()
+    finished = Finished(expected=4)
+    pipeline = MessagePipeline(moderator, finished, workers=4)
+    for message in ("a1", "a2", "a3"):
+        assert pipeline.Submit("a", message, {'message': message})
+    assert pipeline.Submit("b", "b1", {'message': "b1"})
+
+    # Sonraki mesajların kararı önce gelir; a1 bitmeden a2/a3 bitmez
+    moderator.futures["a3"].set_result(False)
+    moderator.futures["a2"].set_result(True)
+    moderator.futures["b1"].set_result(False)
+    moderator.futures["a1"].set_exception(RuntimeError("model down"))
+
+    assert finished.done.wait(5)
+    order = [m for m, _, _ in finished.jobs]
+    assert [m for m in order if m.startswith("a")] == ["a1", "a2", "a3"]
+    a1 = finished.jobs[order.index("a1")]
+    assert a1[1] is None and isinstance(a1[2], RuntimeError)
+    assert finished.jobs[order.index("a2")][1:] == (True, None)
+    assert pipeline.Pending() == 0
+
+
+def test_queue_limits_reject_messages():
+    moderator = ManualModerator()
+    pipeline = MessagePipeline(moderator, Finished(expected=0), max_pending=3, max_pending_per_chat=2)
+    assert pipeline.Submit("a", "a1", {'message': "a1"})
+    assert pipeline.Submit("a", "a2", {'message': "a2"})
+    assert not pipeline.Submit("a", "a3", {'message': "a3"})
+    assert pipeline.Submit("b", "b1", {'message': "b1"})
+    assert not pipeline.Submit("c", "c1", {'message': "c1"})
+    assert pipeline.Pending() == 3
+    assert "c" not in pipeline.chats
+
+
+def test_failed_submit_does_not_block_the_chat():
+    moderator = ManualModerator()
+    finished = Finished(expected=1)
+    pipeline = MessagePipeline(moderator, finished)
+
+    with pytest.raises(TypeError):
+        pipeline.Submit("1", 123, {'message': 123})
+    assert pipeline.Pending() == 0
+    assert "1" not in pipeline.chats
+
+    assert pipeline.Submit("1", "hello", {'message': "hello"})
+    moderator.futures["hello"].set_result(False)
+    assert finished.done.wait(5)
+    assert finished.jobs == [("hello", False, None)]
+    assert pipeline.Pending() == 0
+
+
+def test_failed_submit_releases_messages_queued_behind_it():
+    moderator = ManualModerator()
+    finished = Finished(expected=1)
+    pipeline = MessagePipeline(moderator, finished)
+    entered = threading.Event()
+    release = threading.Event()
+    submit = moderator.Submit
+
+    def SlowFailingSubmit(message):
+        if message == "bad":
+            entered.set()
+            release.wait(5)
+            raise ValueError("bad message")
+        return submit(message)
+
+    moderator.Submit = SlowFailingSubmit
+    errors = []
+
+    def SubmitBad():
+        try:
+            pipeline.Submit("1", "bad", {'message': "bad"})
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=SubmitBad)
+    thread.start()
+    assert entered.wait(5)
+    # Bozuk kayıt kuyruğun başındayken gelen mesajın kararı hazır
+    assert pipeline.Submit("1", "next", {'message': "next"})
+    moderator.futures["next"].set_result(False)
+    release.set()
+    thread.join(5)
+
+    assert len(errors) == 1
+    assert finished.done.wait(5)
+    assert finished.jobs == [("next", False, None)]
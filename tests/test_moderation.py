@@ -0,0 +1,149 @@
+from MessageChecker import BatchModerator, Models, VerdictCache
+from Metrics import BLOCKED_MESSAGES
+
+
+class FlakyModels:
+    """Fails the first batch after it has decided, then answers one message at a time."""
+    generation = 1
+
+    def __init__(self):
+        self.calls = []
+
+    def IsBadMessages(self, messages, deciders=None):
+        self.calls.append(list(messages))
+        if len(self.calls) == 1:
+            raise RuntimeError("batch failed")
+        verdicts = ["spam" in m for m in messages]
+        if deciders is not None:
+            deciders[:] = ["spam" if bad else None for bad in verdicts]
+        return verdicts
+
+
+def _Blocked(reason):
+    return BLOCKED_MESSAGES.values.get((reason,), 0)
+
+
+def test_retried_batch_counts_blocked_messages_once():
+    models = FlakyModels()
+    moderator = BatchModerator(models, window_ms=200, max_batch=3, verdicts=VerdictCache(max_size=0))
+    before = _Blocked("spam"), _Blocked("verdict_cache")
+
+    futures = [moderator.Submit(m) for m in ("buy spam", "hello", "buy spam")]
+
+    assert [f.result(timeout=5) for f in futures] == [True, False, True]
+    assert models.calls[0] == ["buy spam", "hello"]
+    assert _Blocked("spam") - before[0] == 1
+    assert _Blocked("verdict_cache") - before[1] == 1
+
+
+class RecordingModels:
+    generation = 1
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def IsBadMessages(self, messages, deciders=None):
+        self.calls.append(list(messages))
+        if self.fail:
+            raise RuntimeError("model down")
+        verdicts = ["spam" in m for m in messages]
+        if deciders is not None:
+            deciders[:] = ["spam" if bad else None for bad in verdicts]
+        return verdicts
+
+
+def test_concurrent_messages_share_one_batch():
+    models = RecordingModels()
+    moderator = BatchModerator(models, window_ms=200, max_batch=16, verdicts=VerdictCache(max_size=0))
+
+    futures = [moderator.Submit(m) for m in ("a", "buy spam", "b")]
+
+    assert [f.result(timeout=5) for f in futures] == [False, True, False]
+    assert models.calls == [["a", "buy spam", "b"]]
+
+
+def test_full_batch_closes_before_the_window():
+    models = RecordingModels()
+    moderator = BatchModerator(models, window_ms=10000, max_batch=2, verdicts=VerdictCache(max_size=0))
+
+    futures = [moderator.Submit(m) for m in ("a", "b")]
+
+    assert [f.result(timeout=5) for f in futures] == [False, False]
+    assert models.calls == [["a", "b"]]
+
+
+def test_duplicates_in_a_batch_reach_the_model_once():
+    models = RecordingModels()
+    moderator = BatchModerator(models, window_ms=200, max_batch=16, verdicts=VerdictCache(max_size=0))
+
+    futures = [moderator.Submit(m) for m in ("hello", "hello  ", "other")]
+
+    assert [f.result(timeout=5) for f in futures] == [False, False, False]
+    assert models.calls == [["hello", "other"]]
+    assert moderator.Stats()['coalesced'] == 1
+
+
+def test_cached_verdict_is_answered_without_a_batch():
+    models = RecordingModels()
+    moderator = BatchModerator(models, window_ms=1, max_batch=16)
+    assert moderator.IsBadMessage("buy spam", timeout=5) is True
+
+    future = moderator.Submit("buy spam")
+    assert future.done() and future.result() is True
+    assert len(models.calls) == 1
+
+    # Model değişince eski karar kullanılmaz
+    models.generation = 2
+    assert moderator.IsBadMessage("buy spam", timeout=5) is True
+    assert len(models.calls) == 2
+
+
+def test_model_errors_reach_every_waiting_caller():
+    moderator = BatchModerator(RecordingModels(fail=True), window_ms=50, max_batch=16, verdicts=VerdictCache(max_size=0))
+
+    futures = [moderator.Submit(m) for m in ("a", "b")]
+
+    for f in futures:
+        assert isinstance(f.exception(timeout=5), RuntimeError)
+
+
+def test_verdict_cache_is_keyed_by_normalized_text_and_generation():
+    cache = VerdictCache(max_size=10, ttl=60)
+    key = cache.Key("hello   world")
+    assert key == cache.Key("hello world") and key != cache.Key("Hello world")
+
+    cache.Put(key, 1, True)
+    assert cache.Get(key, 1) is True
+    assert cache.Get(key, 2) is None
+    assert (cache.Stats()['hits'], cache.Stats()['misses']) == (1, 1)
+
+
+def _Strings(cache):
+    with cache.lock:
+        entries = list(cache.entries.items())
+    for key, (value, _) in entries:
+        for item in (key, value) + (value if isinstance(value, tuple) else ()):
+            if isinstance(item, str):
+                yield item
+
+
+def test_no_cache_holds_message_text(monkeypatch):
+    monkeypatch.setattr(Models, "Load", lambda self: None)
+    # app.py ile aynı: verdict cache açıkken çeviri cache'i kapalı
+    models = Models(tiers="prefilter,url,spam", blocklist=[], bad_domains=[], translation_cache_size=0)
+    models._ClassifyUrls = lambda urls: ["evil" in url for url in urls]
+    models._Translate = lambda texts: [f"translated {t}" for t in texts]
+    models.SpamBatch = lambda texts: [False for _ in texts]
+    models.ready.set()
+    verdicts = VerdictCache()
+    moderator = BatchModerator(models, window_ms=1, verdicts=verdicts)
+
+    message = "gizli davet https://evil.example.com/join?token=s3cr3t ve https://ok.example.org/p"
+    moderator.IsBadMessage(message, timeout=5)
+    moderator.IsBadMessage("merhaba arkadaşım nasılsın bugün", timeout=5)
+
+    caches = [models.translations, models.url_verdicts, models.bad_url_domains, verdicts.cache]
+    assert sum(cache.Stats()['size'] for cache in caches) > 0
+    for cache in caches:
+        assert list(_Strings(cache)) == []
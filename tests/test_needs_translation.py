@@ -0,0 +1,33 @@
+import pytest
+
+from MessageChecker import NeedsTranslation
+
+
+@pytest.mark.parametrize("text", [
+    "merhaba nasılsın",
+    "selam naber",
+    "you are aptal",
+    "sen bir idiot you are",
+    "I love her",
+    "ÇOK İYİ",
+    "this is gerizekalı",
+])
+def test_turkish_or_mixed_text_is_translated(text):
+    assert NeedsTranslation(text)
+
+
+@pytest.mark.parametrize("text", [
+    "hello how are you",
+    "thanks, see you tomorrow",
+    "https://example.com/a?b=c",
+    "12345 !!!",
+    "😂😂😂",
+    "Привет, как дела?",
+])
+def test_english_and_untranslatable_text_is_skipped(text):
+    assert not NeedsTranslation(text)
+
+
+def test_unknown_word_is_translated_even_among_english_words():
+    assert not NeedsTranslation("what are you up to now")
+    assert NeedsTranslation("what are you up to now salak")
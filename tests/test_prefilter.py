@@ -0,0 +1,31 @@
+from MessageChecker import PreFilter
+
+
+def test_blocklisted_word_is_bad():
+    prefilter = PreFilter(blocklist=["salak"])
+    assert prefilter.Check("sen SALAK mısın") is True
+    # Kelime sınırı: başka kelimenin parçası eşleşmez
+    assert prefilter.Check("salakça bir şaka") is None
+
+
+def test_known_bad_domain_and_its_subdomains_are_bad():
+    prefilter = PreFilter(bad_domains=[".evil.com"])
+    assert prefilter.Check("look http://login.evil.com/x") is True
+    assert prefilter.Check("look www.evil.com") is True
+    assert prefilter.Check("look http://notevil.com/") is None
+
+
+def test_trivially_safe_messages_are_clean():
+    prefilter = PreFilter()
+    assert prefilter.Check("ok") is False
+    assert prefilter.Check("Tamam, teşekkürler!") is False
+    assert prefilter.Check("👍👍") is False
+    assert prefilter.Check("...") is False
+
+
+def test_undecided_messages_go_to_the_next_tier():
+    prefilter = PreFilter()
+    assert prefilter.Check("12345") is None
+    assert prefilter.Check("ok ok ok ok") is None
+    assert prefilter.Check("hello https://example.com") is None
+    assert prefilter.Check("buy cheap watches") is None
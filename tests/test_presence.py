@@ -0,0 +1,73 @@
+import threading
+
+from Presence import PresenceBroadcaster, PresenceRegistry
+from SharedState import MemoryState
+
+
+class FakeDB:
+    def __init__(self, users):
+        self.users = users
+        self.writes = []
+
+    def GetAllUsers(self):
+        return [{'username': u, 'status': s} for u, s in self.users.items()]
+
+    def SetUserStatuses(self, changes):
+        self.writes.append(dict(changes))
+
+
+def _Registry(users=None):
+    db = FakeDB(users or {'alice': 'offline', 'bob': 'offline'})
+    return db, PresenceRegistry(db, MemoryState(), persist_interval=0)
+
+
+def test_delta_keeps_only_the_last_status_and_chains_versions():
+    _, registry = _Registry()
+    base, _ = registry.Snapshot()
+    registry.Set("alice", "idle")
+    registry.Set("alice", "busy")
+    registry.Set("bob", "idle")
+
+    delta = registry.TakeDelta()
+    assert delta['from_version'] == base
+    assert {c['username']: c['status'] for c in delta['changes']} == {'alice': 'busy', 'bob': 'idle'}
+    assert registry.TakeDelta() is None
+
+    registry.Set("bob", "offline")
+    second = registry.TakeDelta()
+    assert second['from_version'] == delta['version'] < second['version']
+    assert [c['username'] for c in second['changes']] == ["bob"]
+
+
+def test_unchanged_status_is_not_a_change():
+    _, registry = _Registry()
+    registry.Set("alice", "idle")
+    registry.TakeDelta()
+    assert registry.Set("alice", "idle") is False
+    assert registry.TakeDelta() is None
+
+
+def test_stale_database_statuses_are_persisted_once():
+    db, registry = _Registry({'alice': 'busy', 'bob': 'offline'})
+    registry.Set("bob", "idle")
+    registry.Persist()
+    registry.Persist()
+    assert db.writes == [{'alice': 'offline', 'bob': 'idle'}]
+
+
+def test_broadcaster_coalesces_changes_into_one_event():
+    _, registry = _Registry()
+    emitted = []
+    sent = threading.Event()
+
+    def Emit(delta):
+        emitted.append(delta)
+        sent.set()
+
+    for status in ("idle", "busy", "idle"):
+        registry.Set("alice", status)
+    PresenceBroadcaster(registry, Emit, debounce=0.05)
+
+    assert sent.wait(5)
+    assert len(emitted) == 1
+    assert [(c['username'], c['status']) for c in emitted[0]['changes']] == [("alice", "idle")]
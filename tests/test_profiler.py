@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+from Profiler import StackSampler
+
+
+def _WaitForStatus(profiler):
+    deadline = time.monotonic() + 5
+    while profiler.Status()['running'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return profiler.Status()
+
+
+def test_start_reports_the_profile_it_started(tmp_path):
+    profiler = StackSampler(str(tmp_path), interval=0.001)
+    profile = profiler.Start(0.5)
+
+    assert profile['seconds'] == 0.5 and profile['path'].startswith(str(tmp_path))
+    assert profiler.Start(0.5) is None
+    status = _WaitForStatus(profiler)
+    assert status['last']['error'] is None
+    assert os.path.exists(profile['path'] + ".folded") and os.path.exists(profile['path'] + ".txt")
+
+
+def test_waiting_threads_are_skipped_as_idle(tmp_path):
+    stop = threading.Event()
+    idle = threading.Thread(target=stop.wait, name="idle-waiter")
+    idle.start()
+
+    def Spin():
+        while not stop.is_set():
+            sum(range(1000))
+
+    busy = threading.Thread(target=Spin, name="busy-spinner")
+    busy.start()
+    try:
+        profiler = StackSampler(str(tmp_path), interval=0.002)
+        profile = profiler.Start(0.3)
+        _WaitForStatus(profiler)
+    finally:
+        stop.set()
+        idle.join()
+        busy.join()
+
+    with open(profile['path'] + ".folded", encoding="utf-8") as f:
+        threads = {line.split(";")[0] for line in f}
+    assert "busy-spinner" in threads
+    assert "idle-waiter" not in threads
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from SharedState import MemoryState, SQLiteState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemoryState()
+    return SQLiteState(str(tmp_path / "state.db"))
+
+
+def test_set_session_rebinds_the_sid(state):
+    assert state.SetSession("alice", "sid1", "w1") is None
+    state.SetChat("alice", 7, "bob")
+    assert state.ChatOfSid("sid1")['chat_id'] == "7"
+
+    assert state.SetSession("alice", "sid2", "w2") == "sid1"
+    assert state.GetSession("alice") == {'sid': "sid2", 'connected': True, 'worker': "w2"}
+    assert state.ChatOfSid("sid1") is None
+    assert state.ChatOfSid("sid2") == {'username': "alice", 'chat_id': "7", 'other_user': "bob"}
+
+    # Eski sid'in kopması yeni oturumu etkilemez
+    assert state.SetDisconnected("alice", "sid1") is False
+    assert state.GetSession("alice")['connected'] is True
+    assert state.SetDisconnected("alice", "sid2") is True
+    assert state.ChatOfSid("sid2") is None
+
+
+def test_claim_chat_takes_both_users_or_neither(state):
+    assert state.ClaimChat("alice", "bob", 1)
+    assert not state.ClaimChat("bob", "carol", 2)
+    assert state.GetChat("carol") is None
+    assert state.Counts() == (1, 0)
+
+    assert state.ReleaseChat("bob") == "alice"
+    assert state.GetChat("alice") is None and state.GetChat("bob") is None
+    assert state.ReleaseChat("bob") is None
+    assert state.ClaimChat("bob", "carol", 2)
+
+
+def test_concurrent_claims_give_a_user_one_chat(state):
+    start = threading.Barrier(8)
+    results = []
+
+    def Claim(i):
+        start.wait()
+        results.append(state.ClaimChat("alice", f"user{i}", i))
+
+    threads = [threading.Thread(target=Claim, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert state.Counts() == (1, 0)
+
+
+def test_expiry_drops_due_requests_and_skips_taken_ones(state):
+    now = time.time()
+    state.AddRequest("taken", "alice", "bob", now + 10)
+    state.AddRequest("due", "carol", "bob", now + 20)
+    state.AddRequest("later", "dave", "bob", now + 30)
+
+    assert state.TakeRequest("taken", "carol") is None
+    assert state.TakeRequest("taken", "bob") == {'sender': "alice", 'target': "bob"}
+    assert state.TakeRequest("taken", "bob") is None
+    assert state.NextRequestExpiry() == now + 20
+
+    assert state.ExpireRequests(now + 25) == 1
+    assert state.TakeRequest("due", "bob") is None
+    assert state.NextRequestExpiry() == now + 30
+    assert state.Counts() == (0, 1)
+
+    assert state.ExpireRequests(now + 30) == 1
+    assert state.NextRequestExpiry() is None
+
+
+def test_expired_request_cannot_be_taken_before_the_sweep(state):
+    state.AddRequest("r", "alice", "bob", time.time() - 1)
+    assert state.TakeRequest("r", "bob") is None
+
+
+def test_backends_agree(tmp_path):
+    states = [MemoryState(), SQLiteState(str(tmp_path / "state.db"))]
+    now = time.time()
+    steps = [
+        lambda s: s.SetSession("alice", "a1", "w1"),
+        lambda s: s.SetSession("bob", "b1", "w1"),
+        lambda s: s.SetSession("alice", "a2", "w2"),
+        lambda s: s.ClaimChat("alice", "bob", 3),
+        lambda s: s.ClaimChat("alice", "carol", 4),
+        lambda s: s.ChatOfSid("a1"),
+        lambda s: s.ChatOfSid("a2"),
+        lambda s: s.SetDisconnected("bob", "b1"),
+        lambda s: s.GetSession("bob"),
+        lambda s: s.AddRequest("r1", "carol", "dave", now + 5),
+        lambda s: s.AddRequest("r2", "erin", "dave", now + 1),
+        lambda s: s.NextRequestExpiry(),
+        lambda s: s.TakeRequest("r2", "dave"),
+        lambda s: s.ExpireRequests(now + 5),
+        lambda s: s.Counts(),
+        lambda s: s.ReleaseChat("alice"),
+        lambda s: s.SetStatus("alice", "idle"),
+        lambda s: s.SetStatus("alice", "idle"),
+        lambda s: s.SetStatus("alice", "busy"),
+        lambda s: s.GetStatus("alice"),
+        lambda s: s.StatusesSince(1),
+        lambda s: s.Counts(),
+    ]
+    for step in steps:
+        assert step(states[0]) == step(states[1])
+
+
+def test_earlier_request_wakes_the_waiter(state):
+    woke = threading.Event()
+
+    def Wait():
+        state.WaitForRequests(10)
+        woke.set()
+
+    waiter = threading.Thread(target=Wait, daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    assert not woke.is_set()
+
+    state.AddRequest("r", "alice", "bob", time.time() + 60)
+    assert woke.wait(2)
+
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from SocketIdentity import SocketIdentities
+
+SECRET = "test-secret"
+
+
+def _Token(username, expires_in, secret=SECRET):
+    return jwt.encode({'username': username, 'exp': int(time.time()) + expires_in}, secret, algorithm="HS256")
+
+
+def test_bound_sid_resolves_without_the_token():
+    identities = SocketIdentities(SECRET)
+    assert identities.Bind("sid1", _Token("alice", 60)) == "alice"
+    assert identities.Get("sid1") == "alice"
+    assert len(identities) == 1
+
+
+def test_bad_token_is_not_bound():
+    identities = SocketIdentities(SECRET)
+    with pytest.raises(JWTError):
+        identities.Bind("sid1", _Token("alice", 60, secret="other"))
+    with pytest.raises(JWTError):
+        identities.Get("sid1")
+
+
+def test_token_expiring_after_connect_is_refused_per_event():
+    identities = SocketIdentities(SECRET)
+    identities.Bind("sid1", _Token("alice", 60))
+    # Bağlantıdan sonra süre dolmuş gibi
+    identities.by_sid["sid1"] = ("alice", time.time() - 1)
+
+    with pytest.raises(ExpiredSignatureError):
+        identities.Get("sid1")
+    assert identities.Unbind("sid1") == "alice"
+    assert identities.Unbind("sid1") is None
+    assert len(identities) == 0
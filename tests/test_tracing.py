@@ -0,0 +1,40 @@
+import threading
+
+from Tracing import NULL_TRACE, Tracer
+
+
+def test_unsampled_requests_get_the_null_trace():
+    tracer = Tracer(sample_rate=0.0)
+    assert tracer.Start('send_message') is NULL_TRACE
+    assert tracer.sampled == 0
+
+
+def test_sampled_count_is_exact_across_threads():
+    tracer = Tracer(sample_rate=1.0)
+    start = threading.Barrier(8)
+
+    def Run():
+        start.wait()
+        for _ in range(2000):
+            tracer.Start('send_message')
+
+    threads = [threading.Thread(target=Run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracer.sampled == 8 * 2000
+
+
+def test_only_slow_traces_are_kept(tmp_path):
+    log = tmp_path / "slow.jsonl"
+    tracer = Tracer(sample_rate=1.0, slow_ms=0, slow_log=str(log))
+    trace = tracer.Start('send_message', sender="alice")
+    trace.Lap('handler')
+    tracer.Finish(trace)
+    tracer.Finish(NULL_TRACE)
+
+    slow = tracer.RecentSlow()
+    assert [s['spans'][0]['span'] for s in slow] == ['handler']
+    assert slow[0]['attributes'] == {'sender': "alice"}
+    assert len(log.read_text().splitlines()) == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from MessageChecker import Models, NormalizeUrl, RegistrableDomain
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM", "http://example.com/"),
+    ("www.example.com/a?b=1", "http://www.example.com/a?b=1"),
+    ("https://example.com:443/x#frag", "https://example.com/x"),
+    ("http://example.com:8080/x", "http://example.com:8080/x"),
+    ("https://example.com/path).", "https://example.com/path"),
+])
+def test_normalize_url(url, expected):
+    assert NormalizeUrl(url) == expected
+
+
+@pytest.mark.parametrize("host, expected", [
+    ("login.evil.com", "evil.com"),
+    ("evil.com", "evil.com"),
+    ("a.b.example.com.tr", "example.com.tr"),
+    ("shop.example.co.uk", "example.co.uk"),
+    ("192.168.0.1", "192.168.0.1"),
+])
+def test_registrable_domain(host, expected):
+    assert RegistrableDomain(host) == expected
+
+
+@pytest.fixture
+def models(monkeypatch):
+    monkeypatch.setattr(Models, "Load", lambda self: None)
+    models = Models(tiers="prefilter,url", blocklist=[], bad_domains=[], translation_cache_size=0)
+    models.classified = []
+
+    def Classify(urls):
+        models.classified.append(list(urls))
+        return ["evil" in url for url in urls]
+
+    models._ClassifyUrls = Classify
+    return models
+
+
+def test_urls_are_classified_once_per_normalized_form(models):
+    assert models.UrlBatch(["http://ok.com/a", "HTTP://OK.COM/a", "http://evil.net/x"]) == [False, False, True]
+    assert models.classified == [["http://ok.com/a", "http://evil.net/x"]]
+
+    assert models.UrlBatch(["http://ok.com/a."]) == [False]
+    assert len(models.classified) == 1
+
+
+def test_bad_domain_marks_other_urls_of_the_domain_bad(models):
+    assert models.UrlBatch(["http://evil.net/x"]) == [True]
+    assert models.UrlBatch(["http://cdn.evil.net/other"]) == [True]
+    assert len(models.classified) == 1
+
+
+def test_shared_domains_are_judged_per_url(models):
+    assert models.UrlBatch(["https://bit.ly/evil1"]) == [True]
+    assert models.UrlBatch(["https://bit.ly/fine"]) == [False]
+    assert models.classified == [["https://bit.ly/evil1"], ["https://bit.ly/fine"]]